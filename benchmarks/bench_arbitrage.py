@@ -0,0 +1,38 @@
+"""
+Time to scan every exchange couple of the configured pairs for arbitrage, on 100-level books
+
+Run from the repository root:
+    python3 -m benchmarks.bench_arbitrage
+"""
+import random
+import timeit
+
+from common import arbitrage
+from common import orderbook
+from common import snapshot
+import strategy_config
+
+LEVELS = 100
+NUMBER = 2000
+
+
+def random_book(mid):
+    bids = [(mid - 0.00001 * (i + 1), random.uniform(0.1, 50)) for i in range(LEVELS)]
+    asks = [(mid + 0.00001 * (i + 1), random.uniform(0.1, 50)) for i in range(LEVELS)]
+    return orderbook.OrderBook.from_levels(bids, asks)
+
+
+if __name__ == "__main__":
+    random.seed(1)
+    scanner = arbitrage.Scanner(strategy_config.currency_pairs, strategy_config.fees, strategy_config.one_bp_in_pourcent)
+    venues = [venue for currency_pair in strategy_config.currency_pairs for venue in snapshot.pair_exchanges(currency_pair)]
+
+    # Books on top of each other: every couple is rejected at the top of book
+    quiet = {venue: random_book(0.0841) for venue in venues}
+    # One venue far above the others: its bids are walked against the asks of the others
+    crossed = dict(quiet)
+    crossed[venues[0]] = random_book(0.0870)
+
+    for name, books in [("no crossing", quiet), ("crossed books", crossed)]:
+        seconds = min(timeit.repeat(lambda: scanner.scan(books), number=NUMBER, repeat=5)) / NUMBER
+        print("%-14s %d venues: %8.1f us/scan, %d opportunities" % (name, len(books), seconds * 1e6, len(scanner.scan(books))))
@@ -0,0 +1,35 @@
+"""
+Decode throughput of recorded Bittrex getorderbook and Gatecoin MarketDepth payloads per numeric policy
+
+Run from the repository root:
+    python3 -m benchmarks.bench_decoding
+"""
+import decimal
+import json
+import os
+import timeit
+
+from common import decoding
+
+RECORDED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recorded')
+PAYLOADS = ['bittrex_getorderbook.json', 'gatecoin_marketdepth.json']
+NUMBER = 500
+
+POLICIES = [
+    ("legacy json.loads Decimal", lambda content: json.loads(content.decode(), parse_float=decimal.Decimal, parse_int=decimal.Decimal)),
+    ("Decoder(Decimal)", decoding.Decoder(decimal.Decimal).loads),
+    ("Decoder(Scaled(8))", decoding.Decoder(decoding.Scaled(8)).loads),
+    ("Decoder(float) stdlib", json.loads),
+    ("Decoder(float)", decoding.Decoder(float).loads),
+]
+
+
+if __name__ == "__main__":
+    print("fast parser: %s" % (decoding.fast_json.__name__ if decoding.fast_json else None))
+    for payload in PAYLOADS:
+        with open(os.path.join(RECORDED, payload), 'rb') as f:
+            content = f.read()
+        print("%s (%d bytes)" % (payload, len(content)))
+        for name, loads in POLICIES:
+            seconds = min(timeit.repeat(lambda: loads(content), number=NUMBER, repeat=5)) / NUMBER
+            print("  %-28s %8.1f us/payload %8.1f MB/s" % (name, seconds * 1e6, len(content) / seconds / 1e6))
@@ -0,0 +1,52 @@
+"""
+VWAP of many candidate sizes on a 100-level book: OrderedDict walk versus BookSide walk versus DepthProfile prefix sums
+
+Run from the repository root:
+    python3 -m benchmarks.bench_execution
+"""
+import random
+import timeit
+
+from common import execution
+from common import orderbook
+
+LEVELS = 100
+CANDIDATES = 100
+NUMBER = 200
+
+
+def legacy_vwap(side, size):
+    # Walk of the {Price: Amount} OrderedDict of the former clean_orderbook
+    remaining = size
+    notional = 0.0
+    for price, level_size in side.items():
+        if level_size >= remaining:
+            notional += price * remaining
+            return notional / size
+        notional += price * level_size
+        remaining -= level_size
+    return None
+
+
+def per_call(function, number=NUMBER):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+
+if __name__ == "__main__":
+    random.seed(1)
+    book = orderbook.OrderBook.from_levels(
+        [(0.05 - i * 0.00001, random.uniform(0.1, 50)) for i in range(LEVELS)],
+        [(0.0501 + i * 0.00001, random.uniform(0.1, 50)) for i in range(LEVELS)])
+    legacy_side = book.to_dict()[orderbook.SELL]
+    total = sum(book.sell.sizes)
+    sizes = [random.uniform(0, total) for _ in range(CANDIDATES)]
+    profile = execution.DepthProfile(book.sell)
+
+    print("%d candidate sizes on %d levels" % (CANDIDATES, LEVELS))
+    print("  %-32s %8.1f us" % ("OrderedDict walk", per_call(lambda: [legacy_vwap(legacy_side, size) for size in sizes]) * 1e6))
+    print("  %-32s %8.1f us" % ("BookSide.vwap walk", per_call(lambda: [book.sell.vwap(size) for size in sizes]) * 1e6))
+    print("  %-32s %8.1f us" % ("DepthProfile build", per_call(lambda: execution.DepthProfile(book.sell)) * 1e6))
+    print("  %-32s %8.1f us" % ("DepthProfile.vwap", per_call(lambda: [profile.vwap(size) for size in sizes]) * 1e6))
+    print("  %-32s %8.1f us" % ("DepthProfile.vwaps (batch)", per_call(lambda: profile.vwaps(sizes)) * 1e6))
+    print("  %-32s %8.1f us" % ("size_for_slippage x 10", per_call(
+        lambda: profile.sizes_for_slippages([i / 1000 for i in range(10)])) * 1e6))
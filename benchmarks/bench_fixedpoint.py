@@ -0,0 +1,71 @@
+"""
+Depth walk and spread of a 100-level book: Decimal levels versus float OrderBook versus int64 FixedOrderBook
+
+The FixedOrderBook vwap is a binary search over prefix sums built on the first query
+of each book: the "first query" line includes building them.
+
+Run from the repository root:
+    python3 -m benchmarks.bench_fixedpoint
+"""
+import decimal
+import random
+import timeit
+
+from common import fixedpoint
+from common import orderbook
+
+LEVELS = 100
+NUMBER = 2000
+# Size filled by the depth walk: about half of the side
+SIZE = '1200.5'
+
+
+def levels(nums):
+    random.seed(1)
+    bids = [(nums('%.8f' % (0.05 - i * 0.00001)), nums('%.8f' % random.uniform(0.1, 50))) for i in range(LEVELS)]
+    asks = [(nums('%.8f' % (0.0501 + i * 0.00001)), nums('%.8f' % random.uniform(0.1, 50))) for i in range(LEVELS)]
+    return bids, asks
+
+
+def decimal_vwap(levels, size):
+    # Depth walk over Decimal levels, as with the default json_nums
+    remaining = size
+    notional = decimal.Decimal(0)
+    for price, level_size in levels:
+        if level_size >= remaining:
+            notional += price * remaining
+            return notional / size
+        notional += price * level_size
+        remaining -= level_size
+    return None
+
+
+def decimal_spread_bps(bids, asks):
+    return (asks[0][0] - bids[0][0]) * 10000 / bids[0][0]
+
+
+if __name__ == "__main__":
+    scale = fixedpoint.PairScale(8, 8)
+    decimal_bids, decimal_asks = levels(decimal.Decimal)
+    float_book = orderbook.OrderBook.from_levels(*levels(float))
+    fixed_book = fixedpoint.FixedOrderBook.from_levels(decimal_bids, decimal_asks, scale)
+    size = decimal.Decimal(SIZE)
+    fixed_size = scale.size_to_int(size)
+
+    print("vwap of %s on the asks" % SIZE)
+    for name, function in [
+            ("Decimal levels", lambda: decimal_vwap(decimal_asks, size)),
+            ("OrderBook (float)", lambda: float_book.sell.vwap(float(size))),
+            ("FixedOrderBook (int64)", lambda: fixed_book.sell.vwap(fixed_size)),
+            # Prefix sums built again on every call, as for the first query of a new book
+            ("FixedOrderBook first query", lambda: fixedpoint.FixedBookSide(fixed_book.sell.prices, fixed_book.sell.sizes).vwap(fixed_size))]:
+        seconds = min(timeit.repeat(function, number=NUMBER, repeat=5)) / NUMBER
+        print("  %-24s %8.2f us  %s" % (name, seconds * 1e6, function()))
+    print("spread in bps")
+    for name, function in [
+            ("Decimal levels", lambda: decimal_spread_bps(decimal_bids, decimal_asks)),
+            ("OrderBook (float)", lambda: float_book.spread / float_book.best_bid[0] * 10000),
+            ("FixedOrderBook (int64)", fixed_book.spread_bps)]:
+        seconds = min(timeit.repeat(function, number=NUMBER * 10, repeat=5)) / (NUMBER * 10)
+        print("  %-24s %8.2f us  %s" % (name, seconds * 1e6, function()))
+    print("exact vwap as Decimal: %s" % scale.price(fixed_book.sell.vwap(fixed_size)))
@@ -0,0 +1,55 @@
+"""
+Per-call cost of a new connection per request versus a pooled keep-alive session
+
+Run from the repository root:
+    python3 -m benchmarks.bench_http_session
+"""
+import json
+import time
+
+import requests
+
+from benchmarks import stub_server
+from common import transport
+from gatecoin import gatecoin
+
+CALLS = 200
+
+ORDERBOOK = json.dumps({
+    'bids': [{'price': 0.05 - i * 0.0001, 'volume': 1.5} for i in range(20)],
+    'asks': [{'price': 0.0501 + i * 0.0001, 'volume': 1.5} for i in range(20)],
+    'responseStatus': {'message': 'OK'},
+}).encode()
+
+
+def per_call(function, calls=CALLS):
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - start) / calls
+
+
+if __name__ == "__main__":
+    server = stub_server.StubServer(ORDERBOOK).start()
+    url = server.url + '/Public/MarketDepth/ETHBTC'
+    try:
+        # One TCP + TLS handshake per request, as with the module-level requests.get
+        no_pool = per_call(lambda: requests.get(url, verify=server.certificate, timeout=10))
+
+        # Pooled keep-alive session
+        session = transport.create_session()
+        session.verify = server.certificate
+        # Ignore CA bundles from the environment, they would override the stub certificate
+        session.trust_env = False
+        pooled = per_call(lambda: session.get(url, timeout=10))
+
+        # Full client call on the pooled session: signature, request and decode
+        client = gatecoin.Gatecoin(server.url, 'PublicKey', 'PrivateKey', session=session)
+        client_call = per_call(lambda: client.get_orderbook('ETHBTC'))
+    finally:
+        server.stop()
+
+    print("requests.get (new connection): %8.3f ms/call" % (no_pool * 1000))
+    print("pooled session:                %8.3f ms/call" % (pooled * 1000))
+    print("Gatecoin.get_orderbook pooled: %8.3f ms/call" % (client_call * 1000))
+    print("saving per call:               %8.3f ms (%.1fx)" % ((no_pool - pooled) * 1000, no_pool / pooled))
@@ -0,0 +1,91 @@
+"""
+Normalization time and memory of a 100-level book: former OrderedDict versus OrderBook, Decimal and float payloads
+
+Run from the repository root:
+    python3 -m benchmarks.bench_orderbook
+"""
+from collections import OrderedDict
+import decimal
+import random
+import timeit
+import tracemalloc
+
+from common import orderbook
+
+LEVELS = 100
+NUMBER = 2000
+
+
+def raw_bittrex_book(nums):
+    random.seed(1)
+    return {
+        'buy': [{'Rate': nums('%.8f' % (0.05 - i * 0.00001)), 'Quantity': nums('%.8f' % random.uniform(0.1, 50))} for i in range(LEVELS)],
+        'sell': [{'Rate': nums('%.8f' % (0.0501 + i * 0.00001)), 'Quantity': nums('%.8f' % random.uniform(0.1, 50))} for i in range(LEVELS)],
+    }
+
+
+def legacy_clean_orderbook(raw_orderbook):
+    # clean_orderbook as it was before OrderBook
+    orderbook_unordered = {'buy': {}, 'sell': {}}
+    orderbook_cleaned = {'buy': {}, 'sell': {}}
+    for buy in raw_orderbook['buy']:
+        orderbook_unordered['buy'][buy['Rate']] = buy['Quantity']
+    orderbook_cleaned['buy'] = OrderedDict(sorted(orderbook_unordered['buy'].items(), key=lambda t: t[0], reverse=True))
+    for sell in raw_orderbook['sell']:
+        orderbook_unordered['sell'][sell['Rate']] = sell['Quantity']
+    orderbook_cleaned['sell'] = OrderedDict(sorted(orderbook_unordered['sell'].items(), key=lambda t: t[0]))
+    return orderbook_cleaned
+
+
+def clean_orderbook(raw_orderbook):
+    bids = [(buy['Rate'], buy['Quantity']) for buy in raw_orderbook['buy']]
+    asks = [(sell['Rate'], sell['Quantity']) for sell in raw_orderbook['sell']]
+    return orderbook.OrderBook.from_levels(bids, asks)
+
+
+def retained_memory(build, raw_orderbook):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    book = build(raw_orderbook)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del book
+    return after - before
+
+
+def timing(function, *args):
+    return min(timeit.repeat(lambda: function(*args), number=NUMBER, repeat=5)) / NUMBER
+
+
+if __name__ == "__main__":
+    raw_decimal = raw_bittrex_book(decimal.Decimal)
+    raw_float = raw_bittrex_book(float)
+    book = clean_orderbook(raw_float)
+
+    rows = [
+        ("legacy OrderedDict, Decimal payload", timing(legacy_clean_orderbook, raw_decimal), retained_memory(legacy_clean_orderbook, raw_decimal)),
+        ("legacy OrderedDict, float payload", timing(legacy_clean_orderbook, raw_float), retained_memory(legacy_clean_orderbook, raw_float)),
+        ("OrderBook, Decimal payload", timing(clean_orderbook, raw_decimal), retained_memory(clean_orderbook, raw_decimal)),
+        ("OrderBook, float payload", timing(clean_orderbook, raw_float), retained_memory(clean_orderbook, raw_float)),
+    ]
+    for name, seconds, memory in rows:
+        print("%-38s %8.1f us/book %8d bytes retained" % (name, seconds * 1e6, memory))
+
+    print("%-38s %8.3f us" % ("best bid + best ask", timing(lambda: (book.best_bid, book.best_ask)) * 1e6))
+    print("%-38s %8.3f us" % ("volume to price", timing(book.sell.volume_to, 0.0506) * 1e6))
+    print("%-38s %8.3f us" % ("vwap for size 500", timing(book.sell.vwap, 500) * 1e6))
+
+    # Repeated polls where only the best bid size moves
+    bids = [(buy['Rate'], buy['Quantity']) for buy in raw_float['buy']]
+    asks = [(sell['Rate'], sell['Quantity']) for sell in raw_float['sell']]
+    moved_bids = [(bids[0][0], bids[0][1] + 1)] + bids[1:]
+    incremental = orderbook.IncrementalOrderBook()
+    incremental.apply_snapshot(bids, asks)
+    snapshots = [moved_bids, bids]
+
+    def poll():
+        snapshots.reverse()
+        return incremental.apply_snapshot(snapshots[0], asks)
+
+    print("%-38s %8.1f us/book" % ("rebuild OrderBook from levels", timing(orderbook.OrderBook.from_levels, bids, asks) * 1e6))
+    print("%-38s %8.1f us/book" % ("incremental snapshot, 1 change", timing(poll) * 1e6))
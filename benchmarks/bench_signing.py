@@ -0,0 +1,100 @@
+"""
+Signing overhead per request of each client: HMAC created per request (legacy) vs keyed once and copied
+
+Run from the repository root:
+    python3 -m benchmarks.bench_signing
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+import timeit
+from urllib.parse import urlencode
+
+from bittrex import bittrex
+from gatecoin import gatecoin
+from liqui import liqui
+
+NUMBER = 20000
+BATCH = 100
+KEY = 'a' * 32
+SECRET = 's' * 64
+GATECOIN_URL = 'https://api.gatecoin.com'
+
+
+def legacy_gatecoin(client, method, command, args):
+    # Gatecoin.sign_request before the keyed signer
+    content_type = '' if method == 'Get' else 'application/json'
+    now = client.nonce
+    message_to_encrypt = (method + client.url + command + content_type + now).lower()
+    signature = hmac.new(client.secret.encode(), msg=message_to_encrypt.encode(), digestmod=hashlib.sha256).digest()
+    headers = {
+        'API_PUBLIC_KEY': client.key,
+        'API_REQUEST_SIGNATURE': base64.b64encode(signature, altchars=None).decode(),
+        'API_REQUEST_DATE': now,
+        'Content-Type': content_type
+    }
+    url = client.url + command
+    data = json.dumps(args)
+    gatecoin.logger.debug("Gatecoin - Request %s: %s with %s", method, url, data)
+    return method.upper(), url, data, headers
+
+
+def legacy_bittrex(client, method, options):
+    # Bittrex.sign_request before the keyed signer
+    method_set = client.endpoint_class(method)
+    nonce = str(int(time.time() * 1000))
+    request_url = (bittrex.BASE_URL % method_set) + method + '?'
+    if method_set != 'public':
+        request_url += 'apikey=' + client.api_key + "&nonce=" + nonce + '&'
+    request_url += urlencode(options)
+    bittrex.logger.debug("Bittrex - Request Get: %s", request_url)
+    headers = {"apisign": hmac.new(client.api_secret.encode(), request_url.encode(), hashlib.sha512).hexdigest()}
+    return request_url, headers
+
+
+def legacy_liqui(client, method, command, args):
+    # Liqui.sign_request before the keyed signer
+    args = dict(args)
+    args['method'] = command
+    args['nonce'] = client.nonce
+    data = urlencode(args)
+    signature = hmac.new(client.api_secret.encode(), msg=data.encode(), digestmod=hashlib.sha512).hexdigest()
+    headers = {
+        'Key': client.api_key,
+        'Sign': signature,
+    }
+    liqui.logger.debug("Liqui - Request Post: %s%s with %s", liqui.BASE_URL_PRIVATE, command, data)
+    return 'POST', liqui.BASE_URL_PRIVATE, data, headers
+
+
+def venues():
+    """
+    (name, legacy sign_request, client, arguments of one request)
+    """
+    gatecoin_client = gatecoin.Gatecoin(GATECOIN_URL, KEY, SECRET)
+    bittrex_client = bittrex.Bittrex(KEY, SECRET)
+    liqui_client = liqui.Liqui(KEY, SECRET)
+    gatecoin_request = ('Post', '/Trade/Orders', {'Code': 'ETHBTC', 'Way': 'Bid', 'Amount': '1.5', 'Price': '0.07'})
+    bittrex_request = ('buylimit', {'market': 'BTC-ETH', 'quantity': '1.5', 'rate': '0.07'})
+    liqui_request = ('Post', 'Trade', {'pair': 'eth_btc', 'type': 'buy', 'rate': '0.07', 'amount': '1.5'})
+    return [
+        ('Gatecoin', legacy_gatecoin, gatecoin_client, gatecoin_request),
+        ('Bittrex', legacy_bittrex, bittrex_client, bittrex_request),
+        ('Liqui', legacy_liqui, liqui_client, liqui_request),
+    ]
+
+
+def per_call(function, number):
+    return min(timeit.repeat(function, number=number, repeat=5)) / number
+
+
+if __name__ == "__main__":
+    for name, legacy, client, request in venues():
+        batch = [request] * BATCH
+        print(name)
+        print("  %-24s %8.2f us/request" % ("legacy sign_request", per_call(lambda: legacy(client, *request), NUMBER) * 1e6))
+        print("  %-24s %8.2f us/request" % ("sign_request", per_call(lambda: client.sign_request(*request), NUMBER) * 1e6))
+        print("  %-24s %8.2f us/request" % ("sign_many (%d)" % BATCH,
+                                            per_call(lambda: client.sign_many(batch), NUMBER // BATCH) / BATCH * 1e6))
@@ -0,0 +1,69 @@
+"""
+Replay of recorded exchange responses, to run the clients without network
+"""
+import os
+import random
+import time
+
+import requests
+from requests.adapters import BaseAdapter
+
+RECORDED = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recorded')
+
+# (url prefix, recorded response file)
+RECORDINGS = [
+    ('https://api.gatecoin.com/Public/MarketDepth/', 'gatecoin_marketdepth.json'),
+    ('https://bittrex.com/api/v1.1/public/getorderbook', 'bittrex_getorderbook.json'),
+    ('https://api.liqui.io/api/3/depth/', 'liqui_depth.json'),
+]
+
+
+def load_recording(file_name):
+    with open(os.path.join(RECORDED, file_name), 'rb') as f:
+        return f.read()
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Transport adapter answering requests with recorded responses
+
+    Mount it on the session of an exchange client. Each response is delayed by
+    `latency` seconds plus a uniform random jitter of +/- `jitter` seconds, as a
+    remote exchange would.
+    Unknown urls get an HTTP 404.
+    """
+    def __init__(self, recordings=RECORDINGS, latency=0.0, jitter=0.0, seed=None):
+        BaseAdapter.__init__(self)
+        self.recordings = [(prefix, load_recording(file_name)) for prefix, file_name in recordings]
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    def mount(self, session):
+        session.mount('https://', self)
+        session.mount('http://', self)
+        return session
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        self.calls += 1
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter) if self.jitter else self.latency
+        if delay > 0:
+            time.sleep(delay)
+
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.encoding = 'utf-8'
+        response.headers['Content-Type'] = 'application/json'
+        response.status_code = 404
+        response._content = b'{}'
+        for prefix, content in self.recordings:
+            if request.url.startswith(prefix):
+                response.status_code = 200
+                response._content = content
+                break
+        return response
+
+    def close(self):
+        pass
@@ -0,0 +1,80 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    Answer every request with the body configured on the server, keeping the connection alive
+    """
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, avoid the delayed ACK stall
+    disable_nagle_algorithm = True
+
+    def reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        body = self.server.body_for(self.command, self.path)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = reply
+    do_POST = reply
+    do_PUT = reply
+    do_DELETE = reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local HTTPS server answering with a fixed body, to measure the client side of a request
+    """
+    daemon_threads = True
+
+    def __init__(self, body=b'{}', use_ssl=True):
+        ThreadingHTTPServer.__init__(self, ('localhost', 0), StubHandler)
+        self.body = body
+        self.certificate = None
+        self._tempdir = None
+        if use_ssl:
+            self._tempdir = tempfile.TemporaryDirectory()
+            self.certificate = os.path.join(self._tempdir.name, 'cert.pem')
+            key = os.path.join(self._tempdir.name, 'key.pem')
+            # Self-signed certificate for localhost, the clients verify against it
+            subprocess.check_call(
+                ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                 '-subj', '/CN=localhost', '-addext', 'subjectAltName=DNS:localhost',
+                 '-keyout', key, '-out', self.certificate],
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.certificate, key)
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+        self._thread = None
+
+    @property
+    def url(self):
+        scheme = 'https' if self.certificate else 'http'
+        return '%s://localhost:%d' % (scheme, self.server_address[1])
+
+    def body_for(self, method, path):
+        return self.body
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._tempdir is not None:
+            self._tempdir.cleanup()
@@ -0,0 +1,132 @@
+"""
+Latency benchmark suite over recorded responses, with machine-readable (JSON) output
+
+Measures the end-to-end cycle of trading_bot.py, the per-call overhead of each client
+transport, the JSON decode time and the clean_orderbook normalization time.
+
+Run from the repository root:
+    python3 -m benchmarks.suite --latency 0.05 --jitter 0.01 --output bench_output.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+
+from benchmarks import replay
+from common import arbitrage
+from common import decoding
+from common import orderbook
+from common import registry
+import strategy_config
+import trading_bot
+
+# No client-side throttling while benchmarking
+UNLIMITED = {'rate': 1e9, 'burst': 1e9}
+
+# Exchange name: (recorded orderbook, currency pair)
+ORDERBOOKS = {
+    'Gatecoin': ('gatecoin_marketdepth.json', 'ETHBTC'),
+    'Bittrex': ('bittrex_getorderbook.json', 'BTC-ETH'),
+    'Liqui': ('liqui_depth.json', 'eth_btc'),
+}
+
+
+def create_exchanges(latency=0.0, jitter=0.0, seed=None):
+    """
+    Exchange clients of trading_bot.py answered by a ReplayAdapter
+    """
+    exchange = registry.create_exchanges(strategy_config, list(ORDERBOOKS), rate_limits=UNLIMITED)
+    for exchange_client in exchange.values():
+        replay.ReplayAdapter(latency=latency, jitter=jitter, seed=seed).mount(exchange_client.session)
+    return exchange
+
+
+def measure(function, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def stats(samples):
+    """
+    Summary of timing samples, in microseconds
+    """
+    ordered = sorted(samples)
+    n = len(ordered)
+
+    def percentile(p):
+        return ordered[min(n - 1, int(p * n))] * 1e6
+
+    return {
+        'n': n,
+        'mean_us': sum(ordered) / n * 1e6,
+        'min_us': ordered[0] * 1e6,
+        'p50_us': percentile(0.50),
+        'p90_us': percentile(0.90),
+        'p99_us': percentile(0.99),
+        'max_us': ordered[-1] * 1e6,
+    }
+
+
+def run(latency, jitter, iterations, micro_iterations, seed=None):
+    results = {}
+    currency_pairs = strategy_config.currency_pairs
+    scanner = arbitrage.Scanner(currency_pairs, strategy_config.fees, strategy_config.one_bp_in_pourcent, strategy_config.min_spread_bps)
+
+    # End-to-end cycle of trading_bot.py with the injected exchange latency
+    exchange = create_exchanges(latency, jitter, seed)
+    for name, concurrent in [('cycle.concurrent', True), ('cycle.sequential', False)]:
+        results[name] = stats(measure(lambda: trading_bot.run_cycle(exchange, currency_pairs, scanner, concurrent, verbose=False), iterations))
+
+    # Client side of a call: signature, transport, decode and checks, without latency
+    exchange = create_exchanges()
+    for exchange_name, (file_name, currency_pair) in ORDERBOOKS.items():
+        exchange_client = exchange[exchange_name]
+        content = replay.load_recording(file_name)
+        raw_orderbook = exchange_client.market_data_decoder.loads(content)
+
+        results['call_overhead.' + exchange_name] = stats(measure(lambda: exchange_client.get_orderbook(currency_pair), micro_iterations))
+        results['decode.' + exchange_name] = stats(measure(lambda: exchange_client.market_data_decoder.loads(content), micro_iterations))
+        results['normalize.' + exchange_name] = stats(measure(
+            lambda: orderbook.OrderBook.from_levels(*exchange_client.parse_orderbook(raw_orderbook, currency_pair)),
+            micro_iterations))
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument('--latency', type=float, default=0.05, help="Injected exchange latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.01, help="Uniform jitter around the latency in seconds")
+    parser.add_argument('--iterations', type=int, default=20, help="Number of trading_bot cycles")
+    parser.add_argument('--micro-iterations', type=int, default=2000, help="Number of calls for the micro benchmarks")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Write the JSON results to this file instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        'timestamp': time.time(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'fast_json': decoding.fast_json.__name__ if decoding.fast_json else None,
+        },
+        'parameters': {
+            'latency': args.latency,
+            'jitter': args.jitter,
+            'iterations': args.iterations,
+            'micro_iterations': args.micro_iterations,
+        },
+        'results': run(args.latency, args.jitter, args.iterations, args.micro_iterations, args.seed),
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
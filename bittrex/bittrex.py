@@ -17,17 +17,19 @@ FITNESS FOR A PARTICULAR PURPOSE.
 
 See https://bittrex.com/Home/Api for more details
 """
+import calendar
+import datetime
 import time
-import hmac
 import hashlib
-from collections import OrderedDict
 try:
     from urllib import urlencode
 except ImportError:
     from urllib.parse import urlencode
-import requests
+from common import adapter
+from common import fixedpoint
+from common import orderbook
+from common import signing
 import decimal
-import json
 # logger
 import logging
 logger = logging.getLogger("TradingBot")
@@ -37,6 +39,8 @@ SELL_ORDERBOOK = 'sell'
 BOTH_ORDERBOOK = 'both'
 
 BASE_URL = 'https://bittrex.com/api/v1.1/%s/'
+# Decimals of the rates and quantities: the same for every market, getmarkets gives no tick nor lot size
+PLACES = 8
 
 MARKET_SET = {'getopenorders', 'cancel', 'sellmarket', 'selllimit', 'buymarket', 'buylimit'}
 
@@ -44,25 +48,54 @@ ACCOUNT_SET = {'getbalances', 'getbalance', 'getdepositaddress', 'withdraw', 'ge
 
 sleep_time_in_second = 5
 
+# Client-side request budget: requests per second, requests at once and endpoint classes
+# (the method sets). The reserves keep requests available for the market (order) endpoints
+RATE_LIMITS = {
+    'rate': 1,
+    'burst': 10,
+    'classes': {
+        'market': {'reserve': 0},
+        'account': {'reserve': 2},
+        'public': {'reserve': 4},
+    },
+}
+
+# Time-to-live in seconds of the cached responses, by query method
+CACHE_TTLS = {
+    'getmarkets': 3600,
+    'getcurrencies': 3600,
+    'getmarketsummaries': 10,
+}
+
+
+def parse_timestamp(timestamp):
+    """
+    Unix time of a Bittrex UTC timestamp (ex: 2014-07-09T03:21:20.08)
+    """
+    moment = datetime.datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S.%f' if '.' in timestamp else '%Y-%m-%dT%H:%M:%S')
+    return calendar.timegm(moment.timetuple()) + moment.microsecond / 1e6
+
 
-class Bittrex(object):
+class Bittrex(adapter.ExchangeAdapter):
     """
     Used for requesting Bittrex with API key and API secret
+
+    Transport, rate limiting, caching and metrics: see adapter.ExchangeAdapter
     """
-    def __init__(self, api_key, api_secret, json_nums=decimal.Decimal, timeout=10):
+    name = 'Bittrex'
+    default_rate_limits = RATE_LIMITS
+    default_cache_ttls = CACHE_TTLS
+    # getmarkets has no tick nor lot size, see parse_market_scales
+    guessed_scales = True
+
+    def __init__(self, api_key, api_secret, json_nums=decimal.Decimal, timeout=10, market_data_nums=float, **kwargs):
+        adapter.ExchangeAdapter.__init__(self, timeout=timeout, json_nums=json_nums, market_data_nums=market_data_nums, **kwargs)
         # Keys
         self.api_key = str(api_key) if api_key is not None else ''
         self.api_secret = str(api_secret) if api_secret is not None else ''
-        # Logger
-        self.logger = logger
-        # json number datatypes
-        self.jsonNums = json_nums
-        # Set time-out
-        self.timeout = timeout
-        # Set time labels
-        self.MINUTE, self.HOUR, self.DAY, self.WEEK, self.MONTH, self.YEAR = \
-            60, 60 * 60, 60 * 60 * 24, 60 * 60 * 24 * \
-            7, 60 * 60 * 24 * 30, 60 * 60 * 24 * 365
+        # HMAC keyed once with the secret, and the static start of the url of each method: (prefix, private)
+        self.signer = signing.Signer(self.api_secret, hashlib.sha512)
+        self.url_prefixes = {}
 
     def __call__(self, method, options=None):
         """
@@ -77,50 +110,68 @@ class Bittrex(object):
         :return: JSON response from Bittrex
         :rtype : dict
         """
-        if not options:
-            options = {}
-        nonce = str(int(time.time() * 1000))
-        method_set = 'public'
+        return self.cached((method, urlencode(options or {})), self.cache_ttls.get(method), self.query, method, options)
 
+    def query(self, method, options=None):
+        # Uncached query
+        method_set = self.endpoint_class(method)
+        return self.send(method_set, method, method_set == 'public', self.sign_request, method, options)
+
+    def endpoint_class(self, method):
+        """
+        Method set of a query method: market, account or public
+        """
         if method in MARKET_SET:
-            method_set = 'market'
+            return 'market'
         elif method in ACCOUNT_SET:
-            method_set = 'account'
+            return 'account'
+        return 'public'
 
-        request_url = (BASE_URL % method_set) + method + '?'
+    def sign_request(self, method, options=None):
+        """
+        Build the signed request as (HTTP method, url, body, headers)
 
-        if method_set != 'public':
-            request_url += 'apikey=' + self.api_key + "&nonce=" + nonce + '&'
+        Shared by the blocking client and the asyncio one.
+        """
+        request_url = self.request_url(method, options)
+        return 'GET', request_url, None, {"apisign": self.signer.hexdigest(request_url.encode())}
 
-        request_url += urlencode(options)
+    def request_url(self, method, options=None):
+        # Url of a request, which is also the message signed
+        if not options:
+            options = {}
+        if method not in self.url_prefixes:
+            method_set = self.endpoint_class(method)
+            prefix = (BASE_URL % method_set) + method + '?'
+            if method_set != 'public':
+                prefix += 'apikey=' + self.api_key + "&nonce="
+            self.url_prefixes[method] = (prefix, method_set != 'public')
+        prefix, private = self.url_prefixes[method]
+
+        if private:
+            request_url = prefix + str(int(time.time() * 1000)) + '&' + urlencode(options)
+        else:
+            request_url = prefix + urlencode(options)
 
         logger.debug("Bittrex - Request Get: %s", request_url)
-        response = requests.get(
-            request_url,
-            headers={"apisign": hmac.new(self.api_secret.encode(), request_url.encode(), hashlib.sha512).hexdigest()},
-            timeout=self.timeout
-        )
-
-        if response.status_code != 200:
-            logger.error("Bittrex - Response error: HTTP " + str(response.status_code) + " returned with the content " + str(response.text) + ".")
-            raise Exception("Bittrex - Response error: HTTP " + str(response.status_code) + " returned.")
-
-        # decode json
-        if not self.jsonNums:
-            response_json = json.loads(response.text, parse_float=str)
-        else:
-            response_json = json.loads(
-                response.text,
-                parse_float=self.jsonNums,
-                parse_int=self.jsonNums)
+        return request_url
 
-        logger.debug("Bittrex - Response content: " + str(response_json))
+    def sign_many(self, requests):
+        """
+        Sign several requests at once, their urls digested in one batch
+
+        :param requests: (method, options) tuples
+        :type requests: list
 
-        if response_json['success'] is not True:
-            logger.error("Bittrex - Response contains a functional error: " + str(response_json))
-            raise Exception("Bittrex - Response contains a functional error: " + str(response_json))
+        :return: (HTTP method, url, body, headers) of each request, see sign_request
+        :rtype : list
+        """
+        request_urls = [self.request_url(*request) for request in requests]
+        signatures = self.signer.hexdigest_many([request_url.encode() for request_url in request_urls])
+        return [('GET', request_url, None, {"apisign": signature}) for request_url, signature in zip(request_urls, signatures)]
 
-        return response_json;
+    def check_response(self, response_json, public):
+        return response_json['success'] is True
 
     def get_markets(self):
         """
@@ -181,7 +232,7 @@ class Bittrex(object):
         :rtype : dict
         """
 
-        logger.debug("Bittrex - Get orderbook for " + str(market))
+        logger.debug("Bittrex - Get orderbook for %s", market)
         return self.__call__('getorderbook', {'market': market, 'type': depth_type, 'depth': depth})
 
     def get_market_history(self, market, count):
@@ -204,12 +255,13 @@ class Bittrex(object):
 
     def place_limit_order(self, market, way, quantity, price):
         if way == 'Ask':
-            self.sell_limit(market, quantity, price)
+            response = self.sell_limit(market, quantity, price)
         elif way == 'Bid':
-            self.buy_limit(market, quantity, price)
+            response = self.buy_limit(market, quantity, price)
         else:
-            logger.error("Bittrex - Unknown order way " + str(way))
-            raise Exception("Bittrex - Unknown order way " + str(way))
+            raise self.invalid("Unknown order way " + str(way))
+        self.record_order(market, way, quantity, price, response)
+        return response
 
     def buy_market(self, market, quantity):
         """
@@ -255,7 +307,7 @@ class Bittrex(object):
         :return:
         :rtype : dict
         """
-        logger.debug("Bittrex - Placed a limit Buy order on " + str(market) + " with quantity: " + str(quantity) + " and price " + str(rate))
+        logger.debug("Bittrex - Placed a limit Buy order on %s with quantity: %s and price %s", market, quantity, rate)
         return self.__call__('buylimit', {'market': market, 'quantity': quantity, 'rate': rate})
 
     def sell_market(self, market, quantity):
@@ -279,7 +331,7 @@ class Bittrex(object):
         :return:
         :rtype : dict
         """
-        logger.debug("Bittrex - Placed a limit Sell order on " + str(market) + " with quantity: " + str(quantity) + " and price " + str(rate))
+        logger.debug("Bittrex - Placed a limit Sell order on %s with quantity: %s and price %s", market, quantity, rate)
         return self.__call__('sellmarket', {'market': market, 'quantity': quantity})
 
     def sell_limit(self, market, quantity, rate):
@@ -319,19 +371,29 @@ class Bittrex(object):
         """
         return self.__call__('cancel', {'uuid': uuid})
 
-    def get_open_orders(self, market):
+    def cancel_order(self, order_id):
+        # Same name on every exchange client
+        response = self.cancel(order_id)
+        self.record_cancel(order_id)
+        return response
+
+    def order_id(self, response):
+        # Exchange order id from the response of place_limit_order
+        return response['result']['uuid']
+
+    def get_open_orders(self, market=None):
         """
         Get all orders that you currently have opened. A specific market can be requested
 
         /market/getopenorders
 
-        :param market: String literal for the market (ie. BTC-LTC)
+        :param market: String literal for the market (ie. BTC-LTC), every market when None
         :type market: str
 
         :return: Open orders info in JSON
         :rtype : dict
         """
-        return self.__call__('getopenorders', {'market': market}, True)
+        return self.__call__('getopenorders', {'market': market} if market else {})
 
     def get_balances(self):
         """
@@ -342,7 +404,7 @@ class Bittrex(object):
         :return: Balances info in JSON
         :rtype : dict
         """
-        return self.__call__('getbalances', {}, True)
+        return self.__call__('getbalances', {})
 
     def get_balance(self, currency):
         """
@@ -356,7 +418,7 @@ class Bittrex(object):
         :return: Balance info in JSON
         :rtype : dict
         """
-        return self.__call__('getbalance', {'currency': currency}, True)
+        return self.__call__('getbalance', {'currency': currency})
 
     def get_deposit_address(self, currency):
         """
@@ -426,27 +488,44 @@ class Bittrex(object):
             balances[balance_currency['Currency']]['Pending'] = balance_currency['Pending']
         return balances
 
-    def clean_orderbook(self, market):
-        # Output a cleaned dictionnary:
-        # {'buy': {Price: Amount, Price: Amount, ...},
-        # 'sell' {Price: Amount, Price: Amount, ...}}
-
-        raw_orderbook = self.get_orderbook(market)
+    def parse_orderbook(self, raw_orderbook, market):
+        # Extract the unsorted (Price, Amount) bid and ask levels from a raw orderbook
         raw_orderbook = raw_orderbook['result']
 
-        orderbook_unordered = {'buy': {}, 'sell': {}}
-        orderbook_cleaned = {'buy': {}, 'sell': {}}
-
-        for buy in raw_orderbook['buy']:
-            quantity = buy['Quantity']
-            price = buy['Rate']
-            orderbook_unordered['buy'][price] = quantity
-        orderbook_cleaned['buy'] = OrderedDict(sorted(orderbook_unordered['buy'].items(), key=lambda t: t[0], reverse=True))
-
-        for sell in raw_orderbook['sell']:
-            quantity = sell['Quantity']
-            price = sell['Rate']
-            orderbook_unordered['sell'][price] = quantity
-        orderbook_cleaned['sell'] = OrderedDict(sorted(orderbook_unordered['sell'].items(), key=lambda t: t[0]))
-
-        return orderbook_cleaned
+        bids = [(buy['Rate'], buy['Quantity']) for buy in raw_orderbook['buy']]
+        asks = [(sell['Rate'], sell['Quantity']) for sell in raw_orderbook['sell']]
+        return bids, asks
+
+    def parse_open_orders(self, raw_orders):
+        # Extract the open orders as [{'OrderId', 'Market', 'Way', 'Quantity', 'Remaining', 'Price'}, ...]
+        return [{'OrderId': order['OrderUuid'],
+                 'Market': order['Exchange'],
+                 'Way': 'Bid' if order['OrderType'] == 'LIMIT_BUY' else 'Ask',
+                 'Quantity': order['Quantity'],
+                 'Remaining': order['QuantityRemaining'],
+                 'Price': order['Limit']} for order in raw_orders['result']]
+
+    def clean_open_orders(self, market=None):
+        raw_orders = self.get_open_orders(market)
+        return self.parse_open_orders(raw_orders)
+
+    def parse_trades(self, raw_trades):
+        # Extract the trades as [(Timestamp, Way, Price, Quantity), ...],
+        # Way being the side of the taker: 'buy' or 'sell'
+        return [(parse_timestamp(trade['TimeStamp']),
+                 orderbook.BUY if trade['OrderType'] == 'BUY' else orderbook.SELL,
+                 float(trade['Price']),
+                 float(trade['Quantity'])) for trade in raw_trades['result']]
+
+    def clean_trades(self, market, count=100):
+        raw_trades = self.get_market_history(market, count)
+        return self.parse_trades(raw_trades)
+
+    def get_market_metadata(self):
+        return self.get_markets()
+
+    def parse_market_scales(self, raw_markets):
+        # Extract {market: PairScale} of the markets listed by getmarkets. Their metadata has no tick nor
+        # lot size (MinTradeSize is a minimum, not an increment): every market gets the fixed PLACES scale,
+        # checked against the levels of each orderbook (guessed_scales)
+        return {market['MarketName']: fixedpoint.PairScale(PLACES, PLACES) for market in raw_markets['result']}
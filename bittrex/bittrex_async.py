@@ -0,0 +1,45 @@
+from common import aio
+from bittrex import bittrex
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+class AsyncBittrex(aio.AsyncClient, bittrex.Bittrex):
+    """
+    Bittrex client for asyncio: every public method returns an awaitable
+
+    Signing and response handling are the ones of bittrex.Bittrex, the request pipeline
+    is the one of aio.AsyncClient: requests go through an aiohttp connection pool that
+    can be shared between clients.
+    """
+    def __init__(self, api_key, api_secret, async_session=None, connection_limit=aio.DEFAULT_CONNECTION_LIMIT, **kwargs):
+        bittrex.Bittrex.__init__(self, api_key, api_secret, **kwargs)
+        aio.AsyncClient.__init__(self, async_session, connection_limit)
+
+    async def place_limit_order(self, market, way, quantity, price):
+        if way == 'Ask':
+            response = await self.sell_limit(market, quantity, price)
+        elif way == 'Bid':
+            response = await self.buy_limit(market, quantity, price)
+        else:
+            raise self.invalid("Unknown order way " + str(way))
+        self.record_order(market, way, quantity, price, response)
+        return response
+
+    async def cancel_order(self, order_id):
+        response = await self.cancel(order_id)
+        self.record_cancel(order_id)
+        return response
+
+    async def clean_open_orders(self, market=None):
+        raw_orders = await self.get_open_orders(market)
+        return self.parse_open_orders(raw_orders)
+
+    async def get_clean_balance(self):
+        raw_balance = await self.get_balances()
+        return self.clean_balances(raw_balance)
+
+    async def clean_trades(self, market, count=100):
+        raw_trades = await self.get_market_history(market, count)
+        return self.parse_trades(raw_trades)
@@ -0,0 +1,328 @@
+import abc
+import decimal
+import time
+from common import cache as ttlcache
+from common import decoding
+from common import fixedpoint
+from common import orderbook
+from common import ratelimit
+from common import transport
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+class ExchangeError(Exception):
+    """
+    Error raised by an exchange client, the message starting with the exchange name
+    """
+    def __init__(self, exchange_name, message):
+        super().__init__(exchange_name + " - " + message)
+        self.exchange_name = exchange_name
+
+
+class MissingCredentials(ExchangeError):
+    """
+    Private endpoint called without an API key and secret
+    """
+
+
+class InvalidRequest(ExchangeError):
+    """
+    Request refused before being sent (unknown HTTP method, order way...)
+    """
+
+
+class TransportError(ExchangeError):
+    """
+    No response: connection error, timeout
+    """
+
+
+class HttpError(ExchangeError):
+    """
+    Response with an HTTP status other than 200
+    """
+    def __init__(self, exchange_name, status_code, content):
+        super().__init__(exchange_name, "Response error: HTTP " + str(status_code) + " returned with the content "
+                         + content.decode(errors='replace') + ".")
+        self.status_code = status_code
+        self.content = content
+
+
+class RateLimitError(HttpError):
+    """
+    HTTP 429: the exchange throttled the client
+    """
+
+
+class Rejected(ExchangeError):
+    """
+    Response decoded but reporting a functional error (insufficient funds, unknown order...)
+    """
+    def __init__(self, exchange_name, response_json):
+        super().__init__(exchange_name, "Response contains a functional error: " + str(response_json))
+        self.response = response_json
+
+
+class ExchangeAdapter(object, metaclass=abc.ABCMeta):
+    """
+    Base of the exchange clients: transport, decoding, rate limiting, caching, metrics and error mapping
+
+    A client only describes its venue: how to sign a request (a prepare function given
+    to send), how to classify its endpoints and how to spot a functional error in a
+    decoded response (check_response). Every request then goes through send, which
+    waits for the rate limiter, prepares the request, sends it over the pooled session,
+    records it in the metrics and decodes the response. Public responses are decoded
+    with the market data number type. Errors are raised as ExchangeError subclasses.
+    The asyncio clients get the same pipeline from aio.AsyncClient.
+    Every client implements the abstract endpoints: order_id, get_orderbook,
+    parse_orderbook, get_market_metadata and parse_market_scales.
+
+    :param rate_limits: Request budget, see ratelimit.RateLimiter (default: default_rate_limits of the client)
+    :type rate_limits: dict
+
+    :param cache_ttls: Time-to-live of the cached responses (default: default_cache_ttls of the client)
+    :type cache_ttls: dict
+
+    :param order_store: Optional orders.OrderStore recording the orders placed and cancelled
+    :type order_store: OrderStore
+
+    :param metrics: Optional metrics.Metrics recording every request
+    :type metrics: Metrics
+    """
+    name = None
+    # Whether requests go through the requests session, False for the asyncio clients
+    blocking = True
+    # Whether the market scales are assumed rather than read from the metadata: the fixed
+    # orderbooks then check every level against them instead of rounding
+    guessed_scales = False
+    default_rate_limits = {'rate': 1, 'burst': 1}
+    default_cache_ttls = {}
+
+    def __init__(self, timeout=10, json_nums=decimal.Decimal, market_data_nums=float, session=None,
+                 pool_size=transport.DEFAULT_POOL_SIZE, max_retries=transport.DEFAULT_MAX_RETRIES,
+                 rate_limits=None, cache=None, cache_ttls=None, order_store=None, metrics=None):
+        # Logger
+        self.logger = logger
+        # json number datatypes: json_nums for private endpoints, market_data_nums for public market data
+        self.jsonNums = json_nums
+        self.decoder = decoding.Decoder(json_nums)
+        self.market_data_decoder = decoding.Decoder(market_data_nums)
+        # Set time-out
+        self.timeout = timeout
+        # Keep-alive HTTP session shared by the public and private endpoints
+        if session is None and self.blocking:
+            session = transport.create_session(pool_size, max_retries)
+        self.session = session
+        # Request budget per endpoint class
+        self.rate_limiter = ratelimit.RateLimiter.from_config(rate_limits or self.default_rate_limits, self.name)
+        # Cache of the slowly changing public endpoints, shared by the concurrent callers
+        self.cache = cache if cache is not None else ttlcache.TTLCache()
+        self.cache_ttls = cache_ttls if cache_ttls is not None else self.default_cache_ttls
+        # Incremental orderbooks maintained by poll_orderbook
+        self.orderbooks = {}
+        # {market: fixedpoint.PairScale}, loaded by market_scale on first use
+        self.market_scales = None
+        self.order_store = order_store
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.watch_rate_limiter(self.name, self.rate_limiter)
+        # Set time labels
+        self.MINUTE, self.HOUR, self.DAY, self.WEEK, self.MONTH, self.YEAR = \
+            60, 60 * 60, 60 * 60 * 24, 60 * 60 * 24 * \
+            7, 60 * 60 * 24 * 30, 60 * 60 * 24 * 365
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        """
+        Client from its strategy_config entry ({'public': key, 'private': secret})
+        """
+        return cls(config['public'], config['private'], **kwargs)
+
+    def cached(self, key, ttl, load, *args):
+        """
+        load(*args), answered from the cache for ttl seconds when ttl is set
+        """
+        if ttl:
+            return self.cache.get_or_load(key, ttl, lambda: load(*args))
+        return load(*args)
+
+    def send(self, endpoint_class, endpoint, public, prepare, *args):
+        """
+        Send one request and return its decoded response
+
+        :param endpoint_class: Rate limit class of the endpoint
+        :param endpoint: Name of the endpoint in the metrics
+        :param public: Whether the response is public market data
+        :param prepare: Called with args once the rate limiter allows the request, returns
+            (HTTP method, url, body, headers): the signing hook
+        """
+        # Wait for the request budget before preparing: nonces and signature dates must stay fresh
+        waited = self.rate_limiter.acquire(endpoint_class)
+
+        http_method, url, data, headers = prepare(*args)
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                http_method,
+                url,
+                data=data,
+                headers=headers,
+                timeout=self.timeout)
+        except Exception as e:
+            raise self.transport_error(endpoint, e) from e
+
+        if response is None:
+            raise self.transport_error(endpoint, "Request not succesful")
+
+        if self.metrics is not None:
+            return self.metrics.handle(self.name, endpoint, start, waited, response.content,
+                                       self.handle_response, response.status_code, response.content, public)
+        return self.handle_response(response.status_code, response.content, public)
+
+    def transport_error(self, endpoint, error):
+        # Count a request without response and build its error
+        if self.metrics is not None:
+            self.metrics.observe_error(self.name, endpoint)
+        return TransportError(self.name, "Request to " + endpoint + " failed: " + str(error))
+
+    def handle_response(self, status_code, content, public=False):
+        """
+        Check the HTTP status, decode the content and check the functional status of a response
+        """
+        if status_code != 200:
+            error_class = RateLimitError if status_code == 429 else HttpError
+            error = error_class(self.name, status_code, content)
+            logger.error("%s", error)
+            raise error
+
+        # decode json
+        if public:
+            response_json = self.market_data_decoder.loads(content)
+        else:
+            response_json = self.decoder.loads(content)
+
+        logger.debug("%s - Response content: %s", self.name, response_json)
+
+        if not self.check_response(response_json, public):
+            error = Rejected(self.name, response_json)
+            logger.error("%s", error)
+            raise error
+        return response_json
+
+    def check_response(self, response_json, public):
+        """
+        Whether a decoded response reports a success, to be overridden by the clients
+        """
+        return True
+
+    def require_credentials(self, key, secret):
+        if not key or not secret:
+            raise MissingCredentials(self.name, "A Key and Secret needed!")
+
+    def invalid(self, message):
+        # Error of a request that cannot be sent
+        logger.error("%s - %s", self.name, message)
+        return InvalidRequest(self.name, message)
+
+    # --ORDER STORE-------------------------------------------------------
+    def record_order(self, market, way, quantity, price, response):
+        # Keep the order placed in the order store, if any
+        if self.order_store is not None:
+            order_id = self.order_id(response)
+            # Filled at once: never open, the next balance refresh settles it
+            if order_id is None:
+                logger.info("%s - %s order on %s filled at once", self.name, way, market)
+                return
+            self.order_store.add(self.name, order_id, market, way, quantity, price)
+
+    def record_cancel(self, order_id):
+        if self.order_store is not None:
+            self.order_store.cancelled(self.name, order_id)
+
+    @abc.abstractmethod
+    def order_id(self, response):
+        # Exchange order id from the response of place_limit_order, None for an order filled at once
+        pass
+
+    # --ORDERBOOK-------------------------------------------------------
+    @abc.abstractmethod
+    def get_orderbook(self, market):
+        # Raw orderbook of a market
+        pass
+
+    @abc.abstractmethod
+    def parse_orderbook(self, raw_orderbook, market):
+        # Extract the unsorted (Price, Amount) bid and ask levels from a raw orderbook
+        pass
+
+    def clean_orderbook(self, market):
+        # Output a cleaned OrderBook:
+        # buy: [(Price, Amount), ...] best bid first,
+        # sell: [(Price, Amount), ...] best ask first
+        raw_orderbook = self.get_orderbook(market)
+        bids, asks = self.parse_orderbook(raw_orderbook, market)
+        return orderbook.OrderBook.from_levels(bids, asks)
+
+    def incremental_orderbook(self, market):
+        book = self.orderbooks.get(market)
+        if book is None:
+            book = self.orderbooks[market] = orderbook.IncrementalOrderBook()
+        return book
+
+    def poll_orderbook(self, market):
+        """
+        Refresh the incremental orderbook kept for the market with a new snapshot
+
+        Only the levels that changed since the previous poll are applied; the returned
+        BookUpdate lists them and tells whether the top of book moved.
+        """
+        book = self.incremental_orderbook(market)
+        raw_orderbook = self.get_orderbook(market)
+        bids, asks = self.parse_orderbook(raw_orderbook, market)
+        return book.apply_snapshot(bids, asks, time.time())
+
+    # --FIXED POINT-------------------------------------------------------
+    @abc.abstractmethod
+    def get_market_metadata(self):
+        # Raw trading rules of every market
+        pass
+
+    @abc.abstractmethod
+    def parse_market_scales(self, raw_markets):
+        # Extract {market: fixedpoint.PairScale} from the raw trading rules
+        pass
+
+    def clean_market_scales(self):
+        raw_markets = self.get_market_metadata()
+        return self.parse_market_scales(raw_markets)
+
+    def market_scale(self, market):
+        """
+        Tick and lot size of a market, the trading rules being requested once
+
+        :rtype : fixedpoint.PairScale
+        """
+        if self.market_scales is None:
+            self.market_scales = self.clean_market_scales()
+        return self.market_scales.get(market) or fixedpoint.PairScale()
+
+    def clean_fixed_orderbook(self, market):
+        """
+        Orderbook of a market with integer prices and sizes, see fixedpoint.FixedOrderBook
+
+        The levels are converted exactly from the market data numbers (float, Decimal).
+        With guessed_scales, a level finer than the scale raises ValueError.
+        """
+        scale = self.market_scale(market)
+        raw_orderbook = self.get_orderbook(market)
+        bids, asks = self.parse_orderbook(raw_orderbook, market)
+        return fixedpoint.FixedOrderBook.from_levels(bids, asks, scale, time.time(), self.guessed_scales)
+
+    def place_fixed_order(self, market, way, quantity, price):
+        """
+        place_limit_order with an integer quantity and price of the market scale, sent as exact Decimals
+        """
+        scale = self.market_scale(market)
+        return self.place_limit_order(market, way, scale.size(quantity), scale.price(price))
@@ -0,0 +1,127 @@
+import time
+from common import fixedpoint
+from common import orderbook
+# Optional dependency of the asyncio exchange clients
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Connections kept open by an asyncio client, all hosts together
+DEFAULT_CONNECTION_LIMIT = 100
+
+
+def create_async_session(connection_limit=DEFAULT_CONNECTION_LIMIT):
+    """
+    Create an aiohttp session with a keep-alive connection pool
+
+    Must be called from a running event loop. Pass the same session to several
+    clients to share the pool between exchanges.
+    """
+    if aiohttp is None:
+        raise Exception("aiohttp is needed for the asyncio exchange clients: pip install aiohttp")
+    connector = aiohttp.TCPConnector(limit=connection_limit)
+    return aiohttp.ClientSession(connector=connector)
+
+
+class AsyncClient(object):
+    """
+    Transport of the asyncio exchange clients
+
+    The exchange classes inherit from it and from their blocking counterpart: the
+    request signing and the response handling are reused as they are, only the
+    HTTP round trip is awaited. send and cached return awaitables here, so the
+    endpoint methods of the blocking client return awaitables as they are.
+    No requests session is created for them.
+    """
+    blocking = False
+
+    def __init__(self, async_session=None, connection_limit=DEFAULT_CONNECTION_LIMIT):
+        self.async_session = async_session
+        self.connection_limit = connection_limit
+        # Only close the sessions created by the client itself
+        self.owns_async_session = async_session is None
+
+    async def request(self, method, url, data=None, headers=None):
+        """
+        Send a request over the pooled session
+
+        :return: (HTTP status, body)
+        :rtype : tuple
+        """
+        if self.async_session is None:
+            self.async_session = create_async_session(self.connection_limit)
+        async with self.async_session.request(
+                method,
+                url,
+                data=data,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)) as response:
+            return response.status, await response.read()
+
+    def cached(self, key, ttl, load, *args):
+        """
+        Awaitable of load(*args), answered from the cache for ttl seconds when ttl is set
+        """
+        if ttl:
+            return self.cache.get_or_load_async(key, ttl, lambda: load(*args))
+        return load(*args)
+
+    async def send(self, endpoint_class, endpoint, public, prepare, *args):
+        """
+        Same as ExchangeAdapter.send, waiting for the rate limiter and the response without blocking the event loop
+        """
+        waited = await self.rate_limiter.acquire_async(endpoint_class)
+
+        http_method, url, data, headers = prepare(*args)
+        start = time.perf_counter()
+        try:
+            status_code, content = await self.request(http_method, url, data, headers)
+        except Exception as e:
+            raise self.transport_error(endpoint, e) from e
+
+        if self.metrics is not None:
+            return self.metrics.handle(self.name, endpoint, start, waited, content,
+                                       self.handle_response, status_code, content, public)
+        return self.handle_response(status_code, content, public)
+
+    async def clean_orderbook(self, market):
+        raw_orderbook = await self.get_orderbook(market)
+        bids, asks = self.parse_orderbook(raw_orderbook, market)
+        return orderbook.OrderBook.from_levels(bids, asks)
+
+    async def poll_orderbook(self, market):
+        book = self.incremental_orderbook(market)
+        raw_orderbook = await self.get_orderbook(market)
+        bids, asks = self.parse_orderbook(raw_orderbook, market)
+        return book.apply_snapshot(bids, asks, time.time())
+
+    async def clean_market_scales(self):
+        raw_markets = await self.get_market_metadata()
+        return self.parse_market_scales(raw_markets)
+
+    async def market_scale(self, market):
+        if self.market_scales is None:
+            self.market_scales = await self.clean_market_scales()
+        return self.market_scales.get(market) or fixedpoint.PairScale()
+
+    async def clean_fixed_orderbook(self, market):
+        scale = await self.market_scale(market)
+        raw_orderbook = await self.get_orderbook(market)
+        bids, asks = self.parse_orderbook(raw_orderbook, market)
+        return fixedpoint.FixedOrderBook.from_levels(bids, asks, scale, time.time(), self.guessed_scales)
+
+    async def place_fixed_order(self, market, way, quantity, price):
+        scale = await self.market_scale(market)
+        return await self.place_limit_order(market, way, scale.size(quantity), scale.price(price))
+
+    async def close(self):
+        if self.owns_async_session and self.async_session is not None:
+            await self.async_session.close()
+            self.async_session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,142 @@
+from common import snapshot
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+class Opportunity(object):
+    """
+    Buy on one exchange at its asks and sell on another at its bids, after fees
+    """
+    __slots__ = ('pair', 'buy_exchange', 'sell_exchange', 'buy_currencypair', 'sell_currencypair',
+                 'best_ask', 'best_bid', 'spread_bps', 'size', 'buy_limit', 'sell_limit',
+                 'average_buy', 'average_sell', 'profit', 'profit_bps', 'timestamp')
+
+    def __init__(self, **kwargs):
+        for key in self.__slots__:
+            setattr(self, key, kwargs.get(key))
+
+    def __repr__(self):
+        return "Opportunity(%s: buy %s on %s @ %s, sell on %s @ %s, %.1f bps, profit %s)" % (
+            self.pair, self.size, self.buy_exchange, self.buy_limit,
+            self.sell_exchange, self.sell_limit, self.spread_bps, self.profit)
+
+
+def walk_depth(asks, ask_fee, bids, bid_fee):
+    """
+    Walk the asks of one book against the bids of another while the next unit is profitable after fees
+
+    :return: (size, cost, proceeds, last ask price, last bid price), the cost and proceeds including fees
+    :rtype : tuple
+    """
+    ask_prices, ask_sizes = asks.prices, asks.sizes
+    bid_prices, bid_sizes = bids.prices, bids.sizes
+    buy_factor, sell_factor = 1 + ask_fee, 1 - bid_fee
+    i = j = 0
+    ask_left = ask_sizes[0]
+    bid_left = bid_sizes[0]
+    size = cost = proceeds = 0.0
+    ask_limit = bid_limit = None
+    n_asks, n_bids = len(ask_prices), len(bid_prices)
+    while i < n_asks and j < n_bids and bid_prices[j] * sell_factor > ask_prices[i] * buy_factor:
+        quantity = ask_left if ask_left < bid_left else bid_left
+        size += quantity
+        cost += quantity * ask_prices[i] * buy_factor
+        proceeds += quantity * bid_prices[j] * sell_factor
+        ask_limit, bid_limit = ask_prices[i], bid_prices[j]
+        ask_left -= quantity
+        bid_left -= quantity
+        if ask_left <= 0:
+            i += 1
+            if i < n_asks:
+                ask_left = ask_sizes[i]
+        if bid_left <= 0:
+            j += 1
+            if j < n_bids:
+                bid_left = bid_sizes[j]
+    return size, cost, proceeds, ask_limit, bid_limit
+
+
+class Scanner(object):
+    """
+    Cross-exchange arbitrage scanner over normalized orderbooks
+
+    For every configured currency pair and every ordered couple of exchanges quoting
+    it, compares the best ask of the first with the best bid of the second after the
+    taker fees. Couples with a positive net spread get their depth walked to find the
+    maximum profitable size.
+
+    :param currency_pairs: Currency pairs of strategy_config
+    :type currency_pairs: list
+
+    :param fees: Taker fee of each exchange as a ratio (ex: {'Bittrex': 0.0025})
+    :type fees: dict
+
+    :param one_bp_in_pourcent: Number of basis points in 100%
+    :type one_bp_in_pourcent: int
+
+    :param min_spread_bps: Net spread below which opportunities are dropped
+    :type min_spread_bps: float
+    """
+    def __init__(self, currency_pairs, fees, one_bp_in_pourcent=10000, min_spread_bps=0):
+        self.fees = fees
+        self.one_bp_in_pourcent = one_bp_in_pourcent
+        self.min_spread_bps = min_spread_bps
+        # [(pair name, [(exchange_name, currency_pair), ...]), ...]
+        self.pairs = [(currency_pair['Name'], snapshot.pair_exchanges(currency_pair)) for currency_pair in currency_pairs]
+
+    def scan(self, orderbooks, timestamp=None):
+        """
+        Find the arbitrage opportunities in a set of books
+
+        :param orderbooks: {(exchange_name, currency_pair): OrderBook}, as in Snapshot.orderbooks,
+            books of Decimal levels being compared as floats
+        :type orderbooks: dict
+
+        :return: Opportunities, most profitable first
+        :rtype : list
+        """
+        opportunities = []
+        for pair, venues in self.pairs:
+            books = [(venue, orderbooks[venue].to_float()) for venue in venues if venue in orderbooks]
+            for buy_venue, buy_book in books:
+                if not buy_book.sell:
+                    continue
+                ask_fee = self.fees.get(buy_venue[0], 0)
+                net_ask = buy_book.sell.prices[0] * (1 + ask_fee)
+                for sell_venue, sell_book in books:
+                    if sell_venue[0] == buy_venue[0] or not sell_book.buy:
+                        continue
+                    bid_fee = self.fees.get(sell_venue[0], 0)
+                    net_bid = sell_book.buy.prices[0] * (1 - bid_fee)
+                    # Most couples stop here: no crossing at the top of book after fees
+                    if net_bid <= net_ask:
+                        continue
+                    spread_bps = (net_bid - net_ask) / net_ask * self.one_bp_in_pourcent
+                    if spread_bps < self.min_spread_bps:
+                        continue
+
+                    size, cost, proceeds, buy_limit, sell_limit = walk_depth(buy_book.sell, ask_fee, sell_book.buy, bid_fee)
+                    # Empty crossing levels: nothing to trade
+                    if size <= 0:
+                        continue
+                    opportunities.append(Opportunity(
+                        pair=pair,
+                        buy_exchange=buy_venue[0],
+                        sell_exchange=sell_venue[0],
+                        buy_currencypair=buy_venue[1],
+                        sell_currencypair=sell_venue[1],
+                        best_ask=buy_book.sell.prices[0],
+                        best_bid=sell_book.buy.prices[0],
+                        spread_bps=spread_bps,
+                        size=size,
+                        buy_limit=buy_limit,
+                        sell_limit=sell_limit,
+                        average_buy=cost / size,
+                        average_sell=proceeds / size,
+                        profit=proceeds - cost,
+                        profit_bps=(proceeds - cost) / cost * self.one_bp_in_pourcent,
+                        timestamp=timestamp))
+
+        opportunities.sort(key=lambda opportunity: opportunity.profit, reverse=True)
+        return opportunities
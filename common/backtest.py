@@ -0,0 +1,491 @@
+"""
+Backtesting over the orderbooks and trades recorded by common/recorder.py
+
+Run from the repository root, with the pairs of strategy_config.py:
+    python3 -m common.backtest --directory records --balance ETH=10 --balance BTC=1 --latencies 0 0.1 0.5
+"""
+from array import array
+import argparse
+import bisect
+import heapq
+import itertools
+import json
+import math
+import os
+from common import arbitrage
+from common import orderbook
+from common import recorder
+from common import snapshot
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+def exchange_markets(exchange_name, currency_pairs):
+    """
+    {market: (base currency, quoted currency)} of one exchange in strategy_config.currency_pairs
+    """
+    markets = {}
+    for currency_pair in currency_pairs:
+        for venue_name, market in snapshot.pair_exchanges(currency_pair):
+            if venue_name == exchange_name:
+                markets[market] = (currency_pair['Base_currency'], currency_pair['Quoted_currency'])
+    return markets
+
+
+def column(view):
+    # Copy of a float64 memoryview column in one memcpy
+    values = array('d')
+    values.frombytes(view.cast('B'))
+    return values
+
+
+class SimulatedExchange(object):
+    """
+    Exchange client replaying the recorded orderbooks and trades of one exchange
+
+    It answers clean_orderbook, place_limit_order, cancel_order and get_clean_balance
+    like the real clients, at the time of the Backtester clock (self.now).
+    An order reaches the matching engine `latency` seconds after it was placed. It
+    then takes the recorded book levels up to its limit price (taker) and rests for
+    the remaining quantity. A resting order is filled again when a later book crosses
+    its limit, or at its limit price by the recorded trades going through it (maker).
+    The recorded liquidity is not consumed by the simulated fills.
+
+    :param markets: {market: (base currency, quoted currency)}, see exchange_markets
+    :type markets: dict
+
+    :param balances: Starting balance of each currency (ex: {'BTC': 1.5})
+    :type balances: dict
+
+    :param fee: Fee ratio of every fill, paid in the quoted currency
+    :type fee: float
+    """
+    def __init__(self, name, directory, markets, balances=None, fee=0.0, latency=0.0):
+        self.name = name
+        self.markets = markets
+        self.fee = fee
+        self.latency = latency
+        self.now = 0.0
+        # market: Reader of its recorded books / trades (None when no trade was recorded)
+        self.books = {}
+        self.trades = {}
+        # market: index of the current book chunk (-1 before the first one), of the next trade chunk
+        self.cursors = {}
+        self.trade_cursors = {}
+        # market: TradeCursor of the trades used, recorded trade lists overlapping each other
+        self.last_trades = {}
+        # market: (chunk index, OrderBook)
+        self.current_books = {}
+        for market in markets:
+            self.cursors[market] = -1
+            path = recorder.stream_path(directory, name, market, recorder.BOOK)
+            if not os.path.exists(path):
+                # Its books stay empty
+                logger.warning("Backtest - No book recorded for %s on %s", market, name)
+                continue
+            self.books[market] = recorder.Reader(path)
+            path = recorder.stream_path(directory, name, market, recorder.TRADES)
+            self.trades[market] = recorder.Reader(path) if os.path.exists(path) else None
+            self.trade_cursors[market] = 0
+            self.last_trades[market] = recorder.TradeCursor()
+        self.initial_balances = dict(balances or {})
+        self.balances = dict(self.initial_balances)
+        # currency: amount held by the open orders
+        self.reserved = {}
+        self.orders = {}
+        # market: [order, ...]
+        self.open_orders = {}
+        self.fills = []
+        self.next_order_id = 1
+
+    def orderbook_at(self, market, index):
+        chunk = self.books[market].chunk(index)
+        # Bids are recorded first
+        n_buy = bisect.bisect_left(chunk.sides, recorder.SIDE_SELL)
+        return orderbook.OrderBook(
+            orderbook.BookSide(column(chunk.prices[:n_buy]), column(chunk.sizes[:n_buy]), descending=True),
+            orderbook.BookSide(column(chunk.prices[n_buy:]), column(chunk.sizes[n_buy:])),
+            chunk.timestamp)
+
+    def clean_orderbook(self, market):
+        index = self.cursors[market]
+        if index < 0:
+            return orderbook.OrderBook(timestamp=self.now)
+        current = self.current_books.get(market)
+        if current is None or current[0] != index:
+            current = self.current_books[market] = (index, self.orderbook_at(market, index))
+        return current[1]
+
+    def top_of_book(self, market):
+        """
+        Best bid and ask of every recorded book of the market, for batch computations
+
+        :return: (timestamps, best bids, best asks) arrays, nan for an empty side
+        :rtype : tuple
+        """
+        reader = self.books.get(market)
+        best_bids, best_asks = array('d'), array('d')
+        if reader is None:
+            return array('d'), best_bids, best_asks
+        for chunk in reader:
+            n_buy = bisect.bisect_left(chunk.sides, recorder.SIDE_SELL)
+            best_bids.append(chunk.prices[0] if n_buy else math.nan)
+            best_asks.append(chunk.prices[n_buy] if n_buy < len(chunk) else math.nan)
+        return array('d', reader.timestamps), best_bids, best_asks
+
+    def mid(self, market):
+        book = self.clean_orderbook(market)
+        return book.mid
+
+    def available(self, currency):
+        return self.balances.get(currency, 0.0) - self.reserved.get(currency, 0.0)
+
+    def get_clean_balance(self):
+        balances = {}
+        for currency, balance in self.balances.items():
+            reserved = self.reserved.get(currency, 0.0)
+            balances[currency] = {}
+            balances[currency]['Balance'] = balance
+            balances[currency]['AvailableBalance'] = balance - reserved
+            balances[currency]['OpenOrder'] = reserved
+            balances[currency]['Pending'] = 0
+        return balances
+
+    def place_limit_order(self, market, way, quantity, price):
+        if way not in ('Bid', 'Ask'):
+            raise Exception("Backtest - Unknown order way " + str(way))
+        base, quote = self.markets[market]
+        quantity, price = float(quantity), float(price)
+        if way == 'Bid':
+            currency, amount = quote, quantity * price * (1 + self.fee)
+        else:
+            currency, amount = base, quantity
+        if self.available(currency) < amount:
+            raise Exception("Backtest - %s: insufficient %s balance for %s %s %s @ %s" % (self.name, currency, way, quantity, market, price))
+        self.reserved[currency] = self.reserved.get(currency, 0.0) + amount
+
+        order = {
+            'OrderId': str(self.next_order_id),
+            'Market': market,
+            'Way': way,
+            'Quantity': quantity,
+            'Price': price,
+            'Remaining': quantity,
+            'Currency': currency,
+            'Reserved': amount,
+            'Status': 'Open',
+            'Timestamp': self.now,
+            'ActiveAt': self.now + self.latency,
+            'CancelAt': None,
+        }
+        self.next_order_id += 1
+        self.orders[order['OrderId']] = order
+        self.open_orders.setdefault(market, []).append(order)
+        if order['ActiveAt'] <= self.now:
+            self.take(order, self.clean_orderbook(market))
+        return dict(order)
+
+    def cancel_order(self, order_id):
+        order = self.orders[order_id]
+        if order['Status'] == 'Open' and order['CancelAt'] is None:
+            order['CancelAt'] = self.now + self.latency
+            if order['CancelAt'] <= self.now:
+                self.close(order, 'Cancelled')
+        return dict(order)
+
+    def order_id(self, response):
+        return response['OrderId']
+
+    def clean_open_orders(self, market=None):
+        markets = [market] if market is not None else list(self.open_orders)
+        return [{key: order[key] for key in ('OrderId', 'Market', 'Way', 'Quantity', 'Remaining', 'Price')}
+                for market in markets for order in self.open_orders.get(market, [])]
+
+    def close(self, order, status):
+        order['Status'] = status
+        self.reserved[order['Currency']] -= order['Reserved']
+        order['Reserved'] = 0.0
+        self.open_orders[order['Market']].remove(order)
+
+    def fill(self, order, price, quantity, liquidity):
+        base, quote = self.markets[order['Market']]
+        notional = price * quantity
+        fee = notional * self.fee
+        if order['Way'] == 'Bid':
+            self.balances[base] = self.balances.get(base, 0.0) + quantity
+            self.balances[quote] = self.balances.get(quote, 0.0) - notional - fee
+            # The reservation was made at the limit price
+            released = quantity * order['Price'] * (1 + self.fee)
+        else:
+            self.balances[base] = self.balances.get(base, 0.0) - quantity
+            self.balances[quote] = self.balances.get(quote, 0.0) + notional - fee
+            released = quantity
+        released = min(released, order['Reserved'])
+        order['Reserved'] -= released
+        self.reserved[order['Currency']] -= released
+        order['Remaining'] -= quantity
+        self.fills.append({
+            'Exchange': self.name,
+            'OrderId': order['OrderId'],
+            'Market': order['Market'],
+            'Way': order['Way'],
+            'Price': price,
+            'Quantity': quantity,
+            'Fee': fee,
+            'Liquidity': liquidity,
+            'Timestamp': self.now,
+            'Latency': self.now - order['Timestamp'],
+        })
+        if order['Remaining'] <= 1e-12:
+            self.close(order, 'Filled')
+
+    def take(self, order, book):
+        # Fill against the book levels at or better than the limit price
+        side = book.sell if order['Way'] == 'Bid' else book.buy
+        for i in range(side.levels_through(order['Price'])):
+            self.fill(order, side.prices[i], min(order['Remaining'], side.sizes[i]), 'Taker')
+            if order['Status'] != 'Open':
+                break
+
+    def new_trades(self, market):
+        # Recorded trades not used yet, up to the clock: [(timestamp, side, price, size), ...]
+        reader = self.trades.get(market)
+        if reader is None:
+            return []
+        trades = []
+        cursor = self.trade_cursors[market]
+        while cursor < len(reader) and reader.timestamps[cursor] <= self.now:
+            chunk = reader.chunk(cursor)
+            trades.extend(self.last_trades[market].new_trades(chunk.rows()))
+            del chunk
+            cursor += 1
+        self.trade_cursors[market] = cursor
+        return trades
+
+    def rest(self, order, trades):
+        # Fill at the limit price with the trades going through it: sells at or below a bid, buys at or above an ask
+        if order['Way'] == 'Bid':
+            crossing = [size for timestamp, side, price, size in trades
+                        if side == recorder.SIDE_SELL and price <= order['Price'] and timestamp >= order['ActiveAt']]
+        else:
+            crossing = [size for timestamp, side, price, size in trades
+                        if side == recorder.SIDE_BUY and price >= order['Price'] and timestamp >= order['ActiveAt']]
+        volume = sum(crossing)
+        if volume > 0:
+            self.fill(order, order['Price'], min(order['Remaining'], volume), 'Maker')
+
+    def advance(self, market, index):
+        """
+        Move the market to its recorded book of the given index and match its open orders
+        """
+        self.cursors[market] = index
+        trades = self.new_trades(market)
+        orders = self.open_orders.get(market)
+        if not orders:
+            return
+        book = self.clean_orderbook(market)
+        for order in list(orders):
+            if order['CancelAt'] is not None and order['CancelAt'] <= self.now:
+                self.close(order, 'Cancelled')
+            elif order['ActiveAt'] <= self.now:
+                self.take(order, book)
+                if order['Status'] == 'Open' and trades:
+                    self.rest(order, trades)
+
+    def close_readers(self):
+        self.current_books = {}
+        for reader in itertools.chain(self.books.values(), self.trades.values()):
+            if reader is not None:
+                reader.close()
+
+
+class Backtester(object):
+    """
+    Replay the recorded books of several SimulatedExchange in timestamp order
+
+    After each recorded book, the strategy is called as strategy(exchange, timestamp)
+    with the simulated clients by name, the same dictionary trading_bot.py builds
+    with create_exchanges.
+
+    :param exchange: SimulatedExchange by name
+    :type exchange: dict
+    """
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.steps = 0
+
+    def timeline(self):
+        # (timestamp, exchange_name, market, chunk index) of every recorded book, oldest first
+        streams = []
+        for exchange_name, exchange_client in self.exchange.items():
+            for market, reader in exchange_client.books.items():
+                streams.append(zip(reader.timestamps, itertools.repeat(exchange_name), itertools.repeat(market), itertools.count()))
+        return heapq.merge(*streams)
+
+    def run(self, strategy, start=None, end=None, valuation_currency=None):
+        """
+        Replay the books between start and end (timestamps) through the strategy
+
+        :return: See report
+        :rtype : dict
+        """
+        clients = list(self.exchange.values())
+        for timestamp, exchange_name, market, index in self.timeline():
+            if end is not None and timestamp > end:
+                break
+            for exchange_client in clients:
+                exchange_client.now = timestamp
+            self.exchange[exchange_name].advance(market, index)
+            if start is not None and timestamp < start:
+                continue
+            strategy(self.exchange, timestamp)
+            self.steps += 1
+        return self.report(valuation_currency)
+
+    def price(self, currency, valuation_currency):
+        # Last mid price of the currency in the valuation currency, None if no market quotes it
+        if currency == valuation_currency:
+            return 1.0
+        for exchange_client in self.exchange.values():
+            for market, (base, quote) in exchange_client.markets.items():
+                mid = exchange_client.mid(market)
+                if mid is None:
+                    continue
+                if (base, quote) == (currency, valuation_currency):
+                    return mid
+                if (base, quote) == (valuation_currency, currency):
+                    return 1 / mid
+        return None
+
+    def report(self, valuation_currency=None):
+        """
+        {'Steps', 'Fills': [fill, ...] oldest first, 'Volume': {quoted currency: traded notional},
+         'Fees': {quoted currency: fees}, 'PnL': {currency: balance change over every exchange},
+         'PnLValue': PnL in the valuation currency at the last mid prices, when one is given}
+        """
+        fills = sorted((fill for exchange_client in self.exchange.values() for fill in exchange_client.fills),
+                       key=lambda fill: fill['Timestamp'])
+        volume, fees, pnl = {}, {}, {}
+        for exchange_client in self.exchange.values():
+            for fill in exchange_client.fills:
+                quote = exchange_client.markets[fill['Market']][1]
+                volume[quote] = volume.get(quote, 0.0) + fill['Price'] * fill['Quantity']
+                fees[quote] = fees.get(quote, 0.0) + fill['Fee']
+            for currency in set(exchange_client.balances) | set(exchange_client.initial_balances):
+                change = exchange_client.balances.get(currency, 0.0) - exchange_client.initial_balances.get(currency, 0.0)
+                pnl[currency] = pnl.get(currency, 0.0) + change
+
+        report = {'Steps': self.steps, 'Fills': fills, 'Volume': volume, 'Fees': fees, 'PnL': pnl}
+        if valuation_currency is not None:
+            value = 0.0
+            for currency, change in pnl.items():
+                price = self.price(currency, valuation_currency)
+                if price is None:
+                    logger.warning("Backtest - No price of %s in %s", currency, valuation_currency)
+                    continue
+                value += change * price
+            report['PnLValue'] = value
+        return report
+
+    def close(self):
+        for exchange_client in self.exchange.values():
+            exchange_client.close_readers()
+
+
+class ArbitrageStrategy(object):
+    """
+    Take the most profitable arbitrage opportunity found by the Scanner, both legs at once
+
+    An opportunity is taken once per couple of books and is sized by the available
+    balances and max_size.
+    """
+    def __init__(self, currency_pairs, fees, one_bp_in_pourcent=10000, min_spread_bps=0, max_size=None):
+        self.scanner = arbitrage.Scanner(currency_pairs, fees, one_bp_in_pourcent, min_spread_bps)
+        self.book_requests = snapshot.snapshot_requests(currency_pairs)
+        self.currencies = {currency_pair['Name']: (currency_pair['Base_currency'], currency_pair['Quoted_currency'])
+                           for currency_pair in currency_pairs}
+        self.max_size = max_size
+        self.traded = set()
+
+    def __call__(self, exchange, timestamp):
+        orderbooks = {book_request: exchange[book_request[0]].clean_orderbook(book_request[1])
+                      for book_request in self.book_requests if book_request[0] in exchange}
+        for opportunity in self.scanner.scan(orderbooks, timestamp):
+            buy_book = orderbooks[(opportunity.buy_exchange, opportunity.buy_currencypair)]
+            sell_book = orderbooks[(opportunity.sell_exchange, opportunity.sell_currencypair)]
+            books = (opportunity.buy_exchange, opportunity.sell_exchange, buy_book.timestamp, sell_book.timestamp)
+            if books in self.traded:
+                continue
+            self.traded.add(books)
+
+            base, quote = self.currencies[opportunity.pair]
+            buy_client, sell_client = exchange[opportunity.buy_exchange], exchange[opportunity.sell_exchange]
+            size = min(opportunity.size,
+                       buy_client.available(quote) / (opportunity.buy_limit * (1 + buy_client.fee)),
+                       sell_client.available(base))
+            if self.max_size is not None:
+                size = min(size, self.max_size)
+            if size <= 0:
+                continue
+            buy_client.place_limit_order(opportunity.buy_currencypair, 'Bid', size, opportunity.buy_limit)
+            sell_client.place_limit_order(opportunity.sell_currencypair, 'Ask', size, opportunity.sell_limit)
+            return
+
+
+def create_exchanges(directory, currency_pairs, balances, fees, latency=0.0):
+    """
+    SimulatedExchange of every exchange of the configured currency pairs, each starting with the same balances
+    """
+    exchange = {}
+    for exchange_name, market in snapshot.snapshot_requests(currency_pairs):
+        if exchange_name not in exchange:
+            exchange[exchange_name] = SimulatedExchange(
+                exchange_name, directory, exchange_markets(exchange_name, currency_pairs),
+                balances, fees.get(exchange_name, 0.0), latency)
+    return exchange
+
+
+def latency_sensitivity(create_exchanges, create_strategy, latencies, valuation_currency=None):
+    """
+    Replay the same recordings with each order latency
+
+    :param create_exchanges: Called with a latency, returns the SimulatedExchange by name
+    :type create_exchanges: function
+
+    :param create_strategy: Called without argument, returns a new strategy
+    :type create_strategy: function
+
+    :return: {latency: {'Fills', 'Volume', 'Fees', 'PnL', 'PnLValue'}}
+    :rtype : dict
+    """
+    results = {}
+    for latency in latencies:
+        backtester = Backtester(create_exchanges(latency))
+        try:
+            report = backtester.run(create_strategy(), valuation_currency=valuation_currency)
+        finally:
+            backtester.close()
+        results[latency] = {key: value for key, value in report.items() if key not in ('Steps', 'Fills')}
+        results[latency]['Fills'] = len(report['Fills'])
+    return results
+
+
+if __name__ == "__main__":
+    import strategy_config
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument('--directory', default=strategy_config.record_directory, help="Directory of the recordings")
+    parser.add_argument('--balance', action='append', default=[], help="Starting balance on each exchange, as CURRENCY=AMOUNT")
+    parser.add_argument('--latencies', type=float, nargs='+', default=[0.0], help="Order latencies to replay, in seconds")
+    parser.add_argument('--max-size', type=float, help="Largest size of an arbitrage")
+    parser.add_argument('--valuation', help="Currency the PnL is valued in")
+    args = parser.parse_args()
+
+    starting_balances = {currency: float(amount) for currency, amount in (balance.split('=') for balance in args.balance)}
+    print(json.dumps(latency_sensitivity(
+        lambda latency: create_exchanges(args.directory, strategy_config.currency_pairs, starting_balances, strategy_config.fees, latency),
+        lambda: ArbitrageStrategy(strategy_config.currency_pairs, strategy_config.fees, strategy_config.one_bp_in_pourcent,
+                                  strategy_config.min_spread_bps, args.max_size),
+        args.latencies,
+        args.valuation), indent=2, sort_keys=True))
@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+def order_result(order, response, error, latency, exchange_client):
+    """
+    Result of one order or cancel of a batch
+
+    {'Exchange', 'Market', 'Way', 'Quantity', 'Price' or 'OrderId' as requested,
+     'OrderId': exchange order id, 'Filled': whether the order was filled at once,
+     'Response': raw response, 'Error': exception or None, 'Latency': seconds}
+    An order filled at once has no order id (ex: Liqui answers 0): it was never open.
+    """
+    result = dict(order)
+    result['Response'] = response
+    result['Error'] = error
+    result['Latency'] = latency
+    if 'OrderId' not in order:
+        result['OrderId'] = None
+        result['Filled'] = False
+        if error is None:
+            try:
+                result['OrderId'] = exchange_client.order_id(response)
+                result['Filled'] = result['OrderId'] is None
+            except (KeyError, TypeError):
+                logger.error("Batch - No order id in the response %s", response)
+    return result
+
+
+def send(exchange, order):
+    # Place the order, or cancel it when it carries an OrderId
+    exchange_client = exchange[order['Exchange']]
+    start = time.time()
+    try:
+        if 'OrderId' in order:
+            response = exchange_client.cancel_order(order['OrderId'])
+        else:
+            response = exchange_client.place_limit_order(order['Market'], order['Way'], order['Quantity'], order['Price'])
+        return order_result(order, response, None, time.time() - start, exchange_client)
+    except Exception as e:
+        logger.error("Batch - %s failed on %s: %s", order, order['Exchange'], e)
+        return order_result(order, None, e, time.time() - start, exchange_client)
+
+
+class BatchDispatcher(object):
+    """
+    Send lists of orders and cancels across exchanges concurrently
+
+    An order is {'Exchange': ..., 'Market': ..., 'Way': 'Bid' or 'Ask', 'Quantity': ..., 'Price': ...},
+    a cancel is {'Exchange': ..., 'OrderId': ...}.
+    Requests wait for the rate limiter of their exchange client, where orders and
+    cancels have priority over market data. Both legs of a cross-exchange trade are
+    sent at the same time: the batch takes the wall time of the slowest exchange.
+
+    :param exchange: Exchange clients by name (ex: {'Bittrex': Bittrex(...)})
+    :type exchange: dict
+    """
+    def __init__(self, exchange, max_workers=16):
+        self.exchange = exchange
+        # Threads are kept between batches, no start-up cost on the order path
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def dispatch(self, orders):
+        """
+        Send orders and cancels concurrently
+
+        :return: One result per order, in the same order (see order_result)
+        :rtype : list
+        """
+        start = time.time()
+        results = list(self.executor.map(lambda order: send(self.exchange, order), orders))
+        logger.info("Batch - %d requests sent in %.3f seconds", len(orders), time.time() - start)
+        return results
+
+    def place_orders(self, orders):
+        return self.dispatch(orders)
+
+    def cancel_orders(self, cancels):
+        return self.dispatch(cancels)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+async def dispatch_async(exchange, orders):
+    """
+    Send orders and cancels concurrently with asyncio exchange clients, see BatchDispatcher.dispatch
+    """
+    # Not imported with the module: the blocking dispatch does not need it
+    import asyncio
+
+    async def send_async(order):
+        exchange_client = exchange[order['Exchange']]
+        start = time.time()
+        try:
+            if 'OrderId' in order:
+                response = await exchange_client.cancel_order(order['OrderId'])
+            else:
+                response = await exchange_client.place_limit_order(order['Market'], order['Way'], order['Quantity'], order['Price'])
+            return order_result(order, response, None, time.time() - start, exchange_client)
+        except Exception as e:
+            logger.error("Batch - %s failed on %s: %s", order, order['Exchange'], e)
+            return order_result(order, None, e, time.time() - start, exchange_client)
+
+    return await asyncio.gather(*[send_async(order) for order in orders])
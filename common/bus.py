@@ -0,0 +1,273 @@
+from collections import OrderedDict
+import threading
+import time
+from common import poller
+from common import recorder
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+# Message kinds
+BOOK = 'book'
+TRADES = 'trades'
+
+DEFAULT_MAX_SIZE = 1000
+
+
+class Message(object):
+    """
+    Market data update published on the Bus, shared by every subscriber: never modify it
+
+    A BOOK message carries the OrderBook of a market, top_changed telling whether its
+    best bid or ask moved since the previous book (or since any book it conflated).
+    A TRADES message carries the new trades as [(Timestamp, Way, Price, Quantity), ...].
+    """
+    __slots__ = ('kind', 'exchange_name', 'market', 'data', 'top_changed', 'timestamp', 'sequence')
+
+    def __init__(self, kind, exchange_name, market, data, top_changed, timestamp, sequence):
+        self.kind = kind
+        self.exchange_name = exchange_name
+        self.market = market
+        self.data = data
+        self.top_changed = top_changed
+        self.timestamp = timestamp
+        self.sequence = sequence
+
+    def __repr__(self):
+        return "Message(%s %s %s #%d)" % (self.kind, self.exchange_name, self.market, self.sequence)
+
+
+class Subscription(object):
+    """
+    Bounded queue of the messages matching a subscription
+
+    With conflate, a BOOK message replaces the book of the same market still waiting in
+    the queue: a lagging consumer only gets the latest book of each market, at the place
+    of the first one. TRADES messages are never conflated. When the queue is full the
+    oldest message is dropped; conflated and dropped messages are counted.
+
+    Filters are sets of kinds, exchange names and markets, None matching everything.
+    """
+    def __init__(self, kinds=None, exchange_names=None, markets=None, max_size=DEFAULT_MAX_SIZE, conflate=True):
+        self.kinds = set(kinds) if kinds is not None else None
+        self.exchange_names = set(exchange_names) if exchange_names is not None else None
+        self.markets = set(markets) if markets is not None else None
+        self.max_size = max_size
+        self.conflate = conflate
+        # key: Message, oldest first; the key of a conflated book is its market
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.closed = False
+        self.delivered = 0
+        self.conflated = 0
+        self.dropped = 0
+        self.thread = None
+
+    def matches(self, kind, exchange_name, market):
+        return ((self.kinds is None or kind in self.kinds)
+                and (self.exchange_names is None or exchange_name in self.exchange_names)
+                and (self.markets is None or market in self.markets))
+
+    def offer(self, message):
+        # Called by Bus.publish, never blocks
+        if self.conflate and message.kind == BOOK:
+            key = (BOOK, message.exchange_name, message.market)
+        else:
+            key = message.sequence
+        with self.condition:
+            if self.closed:
+                return
+            previous = self.pending.get(key)
+            if previous is not None:
+                self.conflated += 1
+                if previous.top_changed and not message.top_changed:
+                    # Keep the top move of the book replaced
+                    message = Message(message.kind, message.exchange_name, message.market, message.data, True,
+                                      message.timestamp, message.sequence)
+                self.pending[key] = message
+            else:
+                if len(self.pending) >= self.max_size:
+                    self.pending.popitem(last=False)
+                    self.dropped += 1
+                self.pending[key] = message
+            self.condition.notify()
+
+    def get(self, timeout=None):
+        """
+        Next message, waiting up to timeout seconds (forever when None)
+
+        :return: None on timeout or once closed
+        :rtype : Message
+        """
+        with self.condition:
+            if not self.pending and not self.closed:
+                self.condition.wait(timeout)
+            if not self.pending:
+                return None
+            self.delivered += 1
+            return self.pending.popitem(last=False)[1]
+
+    def drain(self):
+        """
+        Every waiting message at once, oldest first
+        """
+        with self.condition:
+            messages = list(self.pending.values())
+            self.pending.clear()
+            self.delivered += len(messages)
+            return messages
+
+    def __len__(self):
+        return len(self.pending)
+
+    def consume(self, handler):
+        # Call handler(message) for every message until closed
+        while True:
+            message = self.get()
+            if message is None:
+                if self.closed:
+                    return
+                continue
+            try:
+                handler(message)
+            except Exception as e:
+                logger.error("Bus - Handler failed on %r: %s", message, e)
+
+    def start(self, handler, name="BusConsumer"):
+        """
+        Consume the messages with handler(message) in a background thread, until closed
+        """
+        self.thread = threading.Thread(target=self.consume, args=(handler,), name=name, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self, timeout=None):
+        with self.condition:
+            self.closed = True
+            self.pending.clear()
+            self.condition.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+            self.thread = None
+
+    def statistics(self):
+        return {'Pending': len(self.pending), 'Delivered': self.delivered, 'Conflated': self.conflated, 'Dropped': self.dropped}
+
+
+class Bus(object):
+    """
+    In-process publish/subscribe of market data updates
+
+    Publishers (see MarketDataFeed) never wait for the consumers: each subscription has
+    its own bounded queue. Subscribing does not cost any exchange request.
+    """
+    def __init__(self):
+        # Replaced, never modified, so that publish iterates without the lock
+        self.subscriptions = ()
+        self.sequence = 0
+        self.published = 0
+        self.lock = threading.Lock()
+
+    def subscribe(self, kinds=None, exchange_names=None, markets=None, max_size=DEFAULT_MAX_SIZE, conflate=True):
+        """
+        New Subscription to the matching messages, see Subscription
+        """
+        subscription = Subscription(kinds, exchange_names, markets, max_size, conflate)
+        with self.lock:
+            self.subscriptions = self.subscriptions + (subscription,)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions = tuple(s for s in self.subscriptions if s is not subscription)
+        subscription.close()
+
+    def publish(self, kind, exchange_name, market, data, top_changed=True, timestamp=None):
+        """
+        Offer a message to every matching subscription
+
+        :return: Number of subscriptions it was offered to
+        :rtype : int
+        """
+        with self.lock:
+            self.sequence += 1
+            sequence = self.sequence
+        message = Message(kind, exchange_name, market, data, top_changed,
+                          timestamp if timestamp is not None else time.time(), sequence)
+        offered = 0
+        for subscription in self.subscriptions:
+            if subscription.matches(kind, exchange_name, market):
+                subscription.offer(message)
+                offered += 1
+        self.published += 1
+        return offered
+
+    def publish_book(self, exchange_name, market, book, top_changed=True, timestamp=None):
+        return self.publish(BOOK, exchange_name, market, book, top_changed, timestamp)
+
+    def publish_trades(self, exchange_name, market, trades, timestamp=None):
+        return self.publish(TRADES, exchange_name, market, trades, False, timestamp)
+
+    def statistics(self):
+        return {'Published': self.published, 'Subscriptions': [subscription.statistics() for subscription in self.subscriptions]}
+
+
+class MarketDataFeed(object):
+    """
+    Single poller of every (exchange, market) publishing its books, and optionally its trades, on a Bus
+
+    Books are polled by an AdaptivePoller and published when they changed. With
+    trade_interval, the trades of every market of the exchanges having clean_trades
+    are polled every trade_interval seconds and the new ones published.
+    """
+    def __init__(self, exchange, book_requests, bus, min_interval=0.5, max_interval=30, trade_interval=None):
+        self.exchange = exchange
+        self.bus = bus
+        self.trade_interval = trade_interval
+        self.book_poller = poller.AdaptivePoller(exchange, book_requests, min_interval, max_interval, on_update=self.on_update)
+        self.trade_requests = [(exchange_name, market) for exchange_name, market in book_requests
+                               if hasattr(exchange[exchange_name], 'clean_trades')]
+        # (exchange_name, market): TradeCursor of the trades published
+        self.last_trades = {book_request: recorder.TradeCursor() for book_request in self.trade_requests}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    @property
+    def books(self):
+        # Latest OrderBook of each (exchange_name, market)
+        return self.book_poller.books
+
+    def on_update(self, exchange_name, market, update, book):
+        self.bus.publish_book(exchange_name, market, book, update.top_changed, book.timestamp)
+
+    def poll_trades(self):
+        for exchange_name, market in self.trade_requests:
+            try:
+                trades = self.exchange[exchange_name].clean_trades(market)
+            except Exception as e:
+                logger.error("Bus - Failed to poll the trades of %s on %s: %s", market, exchange_name, e)
+                continue
+            # Several fills may share the timestamp of the last trade published
+            new_trades = self.last_trades[(exchange_name, market)].new_trades(trades)
+            if new_trades:
+                self.bus.publish_trades(exchange_name, market, new_trades)
+
+    def run_trades(self):
+        while not self.stop_event.is_set():
+            self.poll_trades()
+            self.stop_event.wait(self.trade_interval)
+
+    def start(self):
+        self.stop_event.clear()
+        self.book_poller.start()
+        if self.trade_interval and self.trade_requests:
+            self.thread = threading.Thread(target=self.run_trades, name="TradePoller", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        self.book_poller.stop(timeout)
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
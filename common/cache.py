@@ -0,0 +1,180 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class Flight(object):
+    """
+    A load in progress, waited for by the callers asking for the same key meanwhile
+    """
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache(object):
+    """
+    Cache with a time-to-live per entry, LRU eviction and request coalescing
+
+    get_or_load runs the loader once for concurrent callers of the same missing key
+    (single-flight): the others wait for its result instead of sending the same request.
+    Values are shared between callers and must not be modified.
+
+    :param maxsize: Number of entries kept, the least recently used being evicted first
+    :type maxsize: int
+    """
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        # key: (expiry, value), least recently used first
+        self.entries = OrderedDict()
+        self.in_flight = {}
+        self.async_in_flight = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def lookup(self, key, now):
+        # Value of a fresh entry, the entry being marked as recently used; call with the lock held
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= now:
+            del self.entries[key]
+            self.expirations += 1
+            return False, None
+        self.entries.move_to_end(key)
+        return True, entry[1]
+
+    def get(self, key, default=None):
+        with self.lock:
+            found, value = self.lookup(key, time.monotonic())
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key=None):
+        """
+        Drop an entry, or every entry when no key is given
+        """
+        with self.lock:
+            if key is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def get_or_load(self, key, ttl, loader):
+        """
+        Cached value of the key, else the result of loader() stored for ttl seconds
+
+        Errors of the loader are raised to every caller waiting for it and are not cached.
+        """
+        with self.lock:
+            found, value = self.lookup(key, time.monotonic())
+            if found:
+                self.hits += 1
+                return value
+            flight = self.in_flight.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                flight = self.in_flight[key] = Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+            self.set(key, flight.value, ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        except BaseException as e:
+            # KeyboardInterrupt, SystemExit...: the waiters must not take the missing value for a result
+            flight.error = Exception("Cache - Load of %r interrupted: %r" % (key, e))
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            flight.done.set()
+
+    async def get_or_load_async(self, key, ttl, loader):
+        """
+        Same as get_or_load for coroutines: loader() returns an awaitable
+        """
+        # Imported by the asyncio callers only: the blocking clients start without it
+        import asyncio
+        while True:
+            with self.lock:
+                found, value = self.lookup(key, time.monotonic())
+                if found:
+                    self.hits += 1
+                    return value
+                future = self.async_in_flight.get(key)
+                if future is not None:
+                    self.coalesced += 1
+                else:
+                    self.misses += 1
+
+            if future is None:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    # This caller was cancelled
+                    raise
+                # The leading caller was cancelled: load again
+
+        future = self.async_in_flight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await loader()
+            self.set(key, value, ttl)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here so that an error nobody else waited for is not reported as lost
+            future.exception()
+            raise
+        except BaseException:
+            # Cancelled: the waiting callers load the value again
+            future.cancel()
+            raise
+        finally:
+            self.async_in_flight.pop(key, None)
+
+    def statistics(self):
+        with self.lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'Size': len(self.entries),
+                'Hits': self.hits,
+                'Misses': self.misses,
+                'Coalesced': self.coalesced,
+                'Evictions': self.evictions,
+                'Expirations': self.expirations,
+                'HitRatio': (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
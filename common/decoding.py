@@ -0,0 +1,69 @@
+import decimal
+import json
+# Optional fast JSON parser, used when installed
+try:
+    import orjson as fast_json
+except ImportError:
+    try:
+        import ujson as fast_json
+    except ImportError:
+        fast_json = None
+
+
+class Scaled(object):
+    """
+    Numeric policy turning JSON numbers into integers scaled by 10 ** places
+
+    Ex: with places=8, 0.0841 becomes 8410000. The conversion is exact: numbers with
+    more decimals than places are rounded half-even through Decimal.
+    """
+    def __init__(self, places=8):
+        self.places = places
+        self.factor = 10 ** places
+
+    def __call__(self, text):
+        integer, dot, fraction = text.partition('.')
+        if 'e' in text or 'E' in text or len(fraction) > self.places:
+            return int((decimal.Decimal(text) * self.factor).to_integral_value(decimal.ROUND_HALF_EVEN))
+        return int(integer + fraction + '0' * (self.places - len(fraction)))
+
+    def scale_int(self, text):
+        return int(text) * self.factor
+
+    def __repr__(self):
+        return "Scaled(%d)" % self.places
+
+
+class Decoder(object):
+    """
+    Decode JSON responses with a numeric policy
+
+    :param nums: Type of the numbers in the decoded response:
+        decimal.Decimal (or any callable taking the number string) for exact values,
+        float for speed, a Scaled instance for scaled integers,
+        None to keep floats as strings.
+    """
+    def __init__(self, nums=decimal.Decimal):
+        self.nums = nums
+        if nums is float and fast_json is not None:
+            self.loads = fast_json.loads
+        elif nums is float:
+            self.loads = json.loads
+        elif isinstance(nums, Scaled):
+            self.loads = self.loads_scaled
+        elif not nums:
+            self.loads = self.loads_str
+        else:
+            self.loads = self.loads_nums
+
+    def loads_scaled(self, content):
+        return json.loads(content, parse_float=self.nums, parse_int=self.nums.scale_int)
+
+    def loads_str(self, content):
+        return json.loads(content, parse_float=str)
+
+    def loads_nums(self, content):
+        return json.loads(content, parse_float=self.nums, parse_int=self.nums)
+
+    def __repr__(self):
+        return "Decoder(%r, fast=%s)" % (self.nums, self.loads is getattr(fast_json, 'loads', None))
@@ -0,0 +1,215 @@
+from array import array
+import bisect
+import itertools
+import operator
+from common import bus
+from common import orderbook
+
+
+class DepthProfile(object):
+    """
+    Prefix sums of the size and notional of one side of a book, best level first
+
+    Built once per book in O(n), then every query is a binary search over the prefix
+    sums: O(log n) instead of walking the levels. Slippage is relative to the best
+    price and positive when the fill is worse than it.
+    Works on a float orderbook.BookSide, on one of Decimal levels and on a
+    fixedpoint.FixedBookSide, the prefix sums of the latter two being exact: query
+    them with sizes of the same type.
+
+    :param side: Side walked by the order: the asks for a buy, the bids for a sell
+    :type side: BookSide
+    """
+    __slots__ = ('prices', 'cumulative_sizes', 'cumulative_notionals', 'descending')
+
+    def __init__(self, side):
+        self.prices = side.prices
+        self.descending = side.descending
+        if isinstance(side.prices, array) and side.prices.typecode == 'd':
+            self.cumulative_sizes = array('d', itertools.accumulate(side.sizes))
+            self.cumulative_notionals = array('d', itertools.accumulate(map(operator.mul, side.prices, side.sizes)))
+        else:
+            # Integer notionals may not fit in 64 bits, Decimals stay exact
+            self.cumulative_sizes = list(itertools.accumulate(side.sizes))
+            self.cumulative_notionals = list(itertools.accumulate(map(operator.mul, side.prices, side.sizes)))
+
+    def __len__(self):
+        return len(self.prices)
+
+    @property
+    def best(self):
+        return self.prices[0] if self.prices else None
+
+    @property
+    def total_size(self):
+        return self.cumulative_sizes[-1] if self.prices else 0
+
+    def fill_level(self, size):
+        # Index of the level completing a fill of the given size, len(self) when too deep
+        return bisect.bisect_left(self.cumulative_sizes, size)
+
+    def cost(self, size):
+        """
+        Notional of filling the given size, None if the side is not deep enough
+        """
+        i = self.fill_level(size)
+        if i == len(self.prices):
+            return None
+        if i == 0:
+            return self.prices[0] * size
+        return self.cumulative_notionals[i - 1] + self.prices[i] * (size - self.cumulative_sizes[i - 1])
+
+    def vwap(self, size):
+        """
+        Average fill price of the given size, None if the side is not deep enough
+        """
+        if size <= 0:
+            return None
+        cost = self.cost(size)
+        return cost / size if cost is not None else None
+
+    def slippage(self, size):
+        """
+        Relative distance from the best price to the average fill price of the given size
+        """
+        vwap = self.vwap(size)
+        if vwap is None:
+            return None
+        best = self.prices[0]
+        return (best - vwap) / best if self.descending else (vwap - best) / best
+
+    def excess(self, k, limit):
+        # Cost of the k first levels beyond the limit price, signed so that it is <= 0 while
+        # their average price is at or better than the limit
+        excess = self.cumulative_notionals[k] - limit * self.cumulative_sizes[k]
+        return -excess if self.descending else excess
+
+    def size_for_slippage(self, max_slippage):
+        """
+        Largest size whose average fill price is within max_slippage of the best price
+
+        The levels up to the limit price only improve the average, the next ones are
+        taken while their cost beyond the limit is covered: both bounds are binary searches.
+        """
+        if not self.prices:
+            return 0
+        best = self.prices[0]
+        limit = best * (1 - max_slippage) if self.descending else best * (1 + max_slippage)
+        n = len(self.prices)
+        if self.descending:
+            through = orderbook.bisect_descending(self.prices, limit)
+        else:
+            through = bisect.bisect_right(self.prices, limit)
+        # Excess is decreasing up to through - 1 and increasing after: first level where it turns positive
+        k, high = through, n
+        while k < high:
+            middle = (k + high) // 2
+            if self.excess(middle, limit) > 0:
+                high = middle
+            else:
+                k = middle + 1
+        if k == n:
+            return self.cumulative_sizes[-1]
+        # Part of level k whose cost brings the excess of the previous levels back to 0
+        previous_excess = self.excess(k - 1, limit) if k > 0 else 0
+        price_excess = (limit - self.prices[k]) if self.descending else (self.prices[k] - limit)
+        previous_size = self.cumulative_sizes[k - 1] if k > 0 else 0
+        return previous_size - previous_excess / price_excess
+
+    def vwaps(self, sizes):
+        """
+        vwap of many candidate sizes at once
+        """
+        prices, cumulative_sizes, cumulative_notionals = self.prices, self.cumulative_sizes, self.cumulative_notionals
+        n = len(prices)
+        vwaps = []
+        for size in sizes:
+            i = bisect.bisect_left(cumulative_sizes, size)
+            if size <= 0 or i == n:
+                vwaps.append(None)
+            elif i == 0:
+                vwaps.append(prices[0])
+            else:
+                vwaps.append((cumulative_notionals[i - 1] + prices[i] * (size - cumulative_sizes[i - 1])) / size)
+        return vwaps
+
+    def slippages(self, sizes):
+        best = self.prices[0] if self.prices else None
+        return [None if vwap is None else ((best - vwap) / best if self.descending else (vwap - best) / best)
+                for vwap in self.vwaps(sizes)]
+
+    def sizes_for_slippages(self, max_slippages):
+        return [self.size_for_slippage(max_slippage) for max_slippage in max_slippages]
+
+
+class ExecutionEstimator(object):
+    """
+    Average fill price and slippage of an order of any size on every book, kept up to date
+
+    Give it each new book with update, or plug it as the on_update callback of a
+    poller.AdaptivePoller or as the handler of a bus subscription. The DepthProfile of a
+    side is only built on the first query after the book changed.
+    """
+    def __init__(self):
+        # (exchange_name, market): latest book
+        self.books = {}
+        # (exchange_name, market, side): (book, DepthProfile)
+        self.profiles = {}
+
+    def update(self, exchange_name, market, book):
+        self.books[(exchange_name, market)] = book
+
+    def on_update(self, exchange_name, market, update, book):
+        self.update(exchange_name, market, book)
+
+    def on_message(self, message):
+        if message.kind == bus.BOOK:
+            self.update(message.exchange_name, message.market, message.data)
+
+    def profile(self, exchange_name, market, way):
+        """
+        DepthProfile walked by an order: the asks for a 'Bid', the bids for an 'Ask'
+
+        :return: None until a book of the market is known
+        :rtype : DepthProfile
+        """
+        book = self.books.get((exchange_name, market))
+        if book is None:
+            return None
+        side = orderbook.SELL if way == 'Bid' else orderbook.BUY
+        key = (exchange_name, market, side)
+        cached = self.profiles.get(key)
+        if cached is not None and cached[0] is book:
+            return cached[1]
+        profile = DepthProfile(book[side])
+        self.profiles[key] = (book, profile)
+        return profile
+
+    def estimate(self, exchange_name, market, way, quantity):
+        """
+        Expected fill of a market order, to check before sending a place_limit_order
+
+        :return: {'Vwap', 'Slippage', 'Cost', 'Available'}, Vwap, Slippage and Cost being None
+            when the book is not deep enough, None until a book of the market is known
+        :rtype : dict
+        """
+        profile = self.profile(exchange_name, market, way)
+        if profile is None:
+            return None
+        vwap = profile.vwap(quantity)
+        return {'Vwap': vwap,
+                'Slippage': profile.slippage(quantity),
+                'Cost': vwap * quantity if vwap is not None else None,
+                'Available': profile.total_size}
+
+    def vwaps(self, exchange_name, market, way, quantities):
+        profile = self.profile(exchange_name, market, way)
+        return profile.vwaps(quantities) if profile is not None else [None] * len(quantities)
+
+    def slippages(self, exchange_name, market, way, quantities):
+        profile = self.profile(exchange_name, market, way)
+        return profile.slippages(quantities) if profile is not None else [None] * len(quantities)
+
+    def sizes_for_slippages(self, exchange_name, market, way, max_slippages):
+        profile = self.profile(exchange_name, market, way)
+        return profile.sizes_for_slippages(max_slippages) if profile is not None else [0] * len(max_slippages)
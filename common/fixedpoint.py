@@ -0,0 +1,278 @@
+from array import array
+import bisect
+import decimal
+import itertools
+import operator
+from common import orderbook
+
+# Decimals of the prices and sizes when the exchange does not tell
+DEFAULT_PLACES = 8
+
+
+def to_int(value, factor):
+    """
+    Value as an integer number of 1 / factor units, rounded half-even
+
+    Floats go through a multiplication: exact for any value with fewer decimals than
+    the scale as long as value * factor stays below 2 ** 53 (ex: 90 million at 8 places).
+    Decimals, strings and ints are converted exactly.
+    """
+    if isinstance(value, float):
+        return round(value * factor)
+    if isinstance(value, int):
+        return value * factor
+    return int((decimal.Decimal(value) * factor).to_integral_value(decimal.ROUND_HALF_EVEN))
+
+
+def to_exact_int(value, factor):
+    """
+    Same as to_int, raising ValueError when the value is not a multiple of 1 / factor
+    """
+    units = to_int(value, factor)
+    if isinstance(value, float):
+        exact = units / factor == value
+    else:
+        exact = decimal.Decimal(units) == decimal.Decimal(value) * factor
+    if not exact:
+        raise ValueError("Fixedpoint - %r is not a multiple of 1/%d" % (value, factor))
+    return units
+
+
+class PairScale(object):
+    """
+    Tick and lot size of a market: prices are integers of 10 ** -price_places,
+    sizes integers of 10 ** -size_places
+    """
+    __slots__ = ('price_places', 'size_places', 'price_factor', 'size_factor')
+
+    def __init__(self, price_places=DEFAULT_PLACES, size_places=DEFAULT_PLACES):
+        self.price_places = int(price_places)
+        self.size_places = int(size_places)
+        self.price_factor = 10 ** self.price_places
+        self.size_factor = 10 ** self.size_places
+
+    @property
+    def tick(self):
+        return decimal.Decimal(1).scaleb(-self.price_places)
+
+    @property
+    def lot(self):
+        return decimal.Decimal(1).scaleb(-self.size_places)
+
+    def price_to_int(self, price, exact=False):
+        return to_exact_int(price, self.price_factor) if exact else to_int(price, self.price_factor)
+
+    def size_to_int(self, size, exact=False):
+        return to_exact_int(size, self.size_factor) if exact else to_int(size, self.size_factor)
+
+    def price(self, ticks):
+        """
+        Exact Decimal price of an integer price, to submit an order
+        """
+        return decimal.Decimal(ticks).scaleb(-self.price_places)
+
+    def size(self, lots):
+        return decimal.Decimal(lots).scaleb(-self.size_places)
+
+    def __eq__(self, other):
+        return (isinstance(other, PairScale) and self.price_places == other.price_places
+                and self.size_places == other.size_places)
+
+    def __repr__(self):
+        return "PairScale(%d, %d)" % (self.price_places, self.size_places)
+
+
+class FixedBookSide(object):
+    """
+    One side of an orderbook as parallel int64 price/size arrays, best level first
+
+    Same interface as orderbook.BookSide, every value being an integer of the PairScale:
+    comparisons and sums are exact without any Decimal arithmetic. The arrays expose the
+    buffer protocol (ex: numpy.frombuffer(side.prices, dtype=numpy.int64)); do not modify
+    them once the side is queried.
+    The prefix sums of the sizes and notionals are built on the first depth query, then
+    vwap, notional and volume_to are binary searches: repeated queries on the same book
+    are cheap, while the first one costs more than walking Decimal levels once.
+    """
+    __slots__ = ('prices', 'sizes', 'descending', 'prefix_sums')
+
+    def __init__(self, prices=None, sizes=None, descending=False):
+        self.prices = prices if prices is not None else array('q')
+        self.sizes = sizes if sizes is not None else array('q')
+        self.descending = descending
+        self.prefix_sums = None
+
+    @classmethod
+    def from_side(cls, side, scale):
+        """
+        Convert a float orderbook.BookSide
+        """
+        price_factor, size_factor = scale.price_factor, scale.size_factor
+        return cls(array('q', [round(price * price_factor) for price in side.prices]),
+                   array('q', [round(size * size_factor) for size in side.sizes]),
+                   side.descending)
+
+    @classmethod
+    def from_levels(cls, levels, scale, descending=False, exact=False):
+        """
+        Build a side from (price, size) levels in any order and any numeric type, merging
+        the levels with the same integer price
+
+        :param exact: Raise ValueError for a price or size finer than the scale instead of rounding it
+        """
+        levels = sorted(((scale.price_to_int(price, exact), scale.size_to_int(size, exact)) for price, size in levels),
+                        key=operator.itemgetter(0), reverse=descending)
+        prices, sizes = orderbook.aggregate_levels([level[0] for level in levels], [level[1] for level in levels])
+        return cls(array('q', prices), array('q', sizes), descending)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __iter__(self):
+        return zip(self.prices, self.sizes)
+
+    def __bool__(self):
+        return len(self.prices) > 0
+
+    def best(self):
+        if not self.prices:
+            return None
+        return self.prices[0], self.sizes[0]
+
+    def levels_through(self, price):
+        """
+        Number of levels priced at or better than the given integer price
+        """
+        if self.descending:
+            return orderbook.bisect_descending(self.prices, price)
+        return bisect.bisect_right(self.prices, price)
+
+    def prefix(self):
+        # (cumulative sizes, cumulative notionals) lists, notionals may not fit in 64 bits
+        if self.prefix_sums is None:
+            self.prefix_sums = (list(itertools.accumulate(self.sizes)),
+                                list(itertools.accumulate(map(operator.mul, self.prices, self.sizes))))
+        return self.prefix_sums
+
+    def volume_to(self, price):
+        """
+        Exact cumulative size available at or better than the given integer price
+        """
+        through = self.levels_through(price)
+        return self.prefix()[0][through - 1] if through else 0
+
+    def cumulative_sizes(self):
+        return array('q', self.prefix()[0])
+
+    def notional(self, size):
+        """
+        Exact cost of filling the given integer size, in units of price x size, None if the side is not deep enough
+        """
+        cumulative_sizes, cumulative_notionals = self.prefix()
+        i = bisect.bisect_left(cumulative_sizes, size)
+        if i == len(cumulative_sizes):
+            return None
+        if i == 0:
+            return self.prices[0] * size
+        return cumulative_notionals[i - 1] + self.prices[i] * (size - cumulative_sizes[i - 1])
+
+    def vwap(self, size):
+        """
+        Volume weighted average integer price to fill the given integer size, rounded half-even,
+        None if the side is not deep enough
+        """
+        if size <= 0:
+            return None
+        notional = self.notional(size)
+        if notional is None:
+            return None
+        quotient, remainder = divmod(notional, size)
+        if 2 * remainder > size or (2 * remainder == size and quotient & 1):
+            quotient += 1
+        return quotient
+
+    def to_side(self, scale):
+        """
+        Float orderbook.BookSide
+        """
+        price_factor, size_factor = float(scale.price_factor), float(scale.size_factor)
+        return orderbook.BookSide(array('d', [price / price_factor for price in self.prices]),
+                                  array('d', [size / size_factor for size in self.sizes]),
+                                  self.descending)
+
+    def __repr__(self):
+        return "FixedBookSide(%s)" % list(zip(self.prices, self.sizes))
+
+
+class FixedOrderBook(object):
+    """
+    Orderbook of a market in the integer units of its PairScale, see FixedBookSide
+
+    Convert back with scale.price / scale.size only to submit an order
+    (see adapter.ExchangeAdapter.place_fixed_order).
+    """
+    __slots__ = ('buy', 'sell', 'scale', 'timestamp')
+
+    def __init__(self, buy=None, sell=None, scale=None, timestamp=None):
+        self.buy = buy if buy is not None else FixedBookSide(descending=True)
+        self.sell = sell if sell is not None else FixedBookSide()
+        self.scale = scale if scale is not None else PairScale()
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_levels(cls, bids, asks, scale, timestamp=None, exact=False):
+        return cls(FixedBookSide.from_levels(bids, scale, True, exact), FixedBookSide.from_levels(asks, scale, False, exact),
+                   scale, timestamp)
+
+    @classmethod
+    def from_orderbook(cls, book, scale):
+        """
+        Convert a float orderbook.OrderBook
+        """
+        return cls(FixedBookSide.from_side(book.buy, scale), FixedBookSide.from_side(book.sell, scale),
+                   scale, book.timestamp)
+
+    def __getitem__(self, side):
+        if side == orderbook.BUY:
+            return self.buy
+        if side == orderbook.SELL:
+            return self.sell
+        raise KeyError(side)
+
+    @property
+    def best_bid(self):
+        return self.buy.best()
+
+    @property
+    def best_ask(self):
+        return self.sell.best()
+
+    @property
+    def spread(self):
+        """
+        Best ask minus best bid in ticks, None if a side is empty
+        """
+        if not self.buy or not self.sell:
+            return None
+        return self.sell.prices[0] - self.buy.prices[0]
+
+    def spread_bps(self):
+        """
+        Spread over the best bid in basis points, the float nearest to the exact ratio of the integer prices
+        """
+        bids, asks = self.buy.prices, self.sell.prices
+        if not bids or not asks:
+            return None
+        return (asks[0] - bids[0]) * 10000 / bids[0]
+
+    def to_orderbook(self):
+        return orderbook.OrderBook(self.buy.to_side(self.scale), self.sell.to_side(self.scale), self.timestamp)
+
+    def to_float(self):
+        """
+        Float OrderBook in the units of the exchange, as orderbook.OrderBook.to_float
+        """
+        return self.to_orderbook()
+
+    def __repr__(self):
+        return "FixedOrderBook(buy=%r, sell=%r, %r)" % (list(self.buy), list(self.sell), self.scale)
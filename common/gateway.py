@@ -0,0 +1,351 @@
+"""
+Market data gateway: polls every configured orderbook once and serves it to the local bots
+
+Run from the repository root:
+    python3 -m common.gateway --socket ./gateway.sock
+
+The bots connect to the Unix socket with GatewayClient (or set gateway_socket in
+strategy_config.py) instead of polling the exchanges themselves, so that together
+they use the request budget of a single client. The protocol is one JSON object per
+line in each direction:
+    {"Command": "Layout"}  ->  {"Table": name, "Books": [[exchange_name, currency_pair], ...], "Pid": pid}
+    {"Command": "Book", "Exchange": exchange_name, "Market": currency_pair, "Depth": n}
+                           ->  {"Exchange": ..., "Market": ..., "Timestamp": t, "Buy": side, "Sell": side}
+    {"Command": "Subscribe", "Exchanges": [...], "Markets": [...]}
+                           ->  one book as above, with "TopChanged", each time a book changes
+"Depth", "Exchanges" and "Markets" are optional (null: every level, exchange or market).
+A side is {"Prices": [...], "Sizes": [...]}, best level first. Errors are answered as {"Error": message}.
+
+The top of every book is also published in a shared memory sharding.TopOfBookTable, named
+in the layout: readers attach it with GatewayClient.top_of_book and read the best levels
+without any system call nor lock.
+"""
+from array import array
+from multiprocessing import resource_tracker
+from socketserver import StreamRequestHandler, ThreadingUnixStreamServer
+import argparse
+import json
+import os
+import socket
+import stat
+import threading
+from common import bus
+from common import orderbook
+from common import sharding
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+def encode_side(side):
+    return {'Prices': side.prices.tolist(), 'Sizes': side.sizes.tolist()}
+
+
+def decode_side(side, descending):
+    return orderbook.BookSide(array('d', side['Prices']), array('d', side['Sizes']), descending)
+
+
+def encode_book(exchange_name, currency_pair, book, depth=None):
+    book = book.to_float()
+    buy, sell = book.buy, book.sell
+    if depth is not None:
+        buy = orderbook.BookSide(buy.prices[:depth], buy.sizes[:depth], True)
+        sell = orderbook.BookSide(sell.prices[:depth], sell.sizes[:depth])
+    return {'Exchange': exchange_name, 'Market': currency_pair, 'Timestamp': book.timestamp,
+            'Buy': encode_side(buy), 'Sell': encode_side(sell)}
+
+
+def decode_book(message):
+    """
+    OrderBook of a Book or Subscribe answer
+    """
+    return orderbook.OrderBook(decode_side(message['Buy'], True), decode_side(message['Sell'], False), message['Timestamp'])
+
+
+def names(request, field):
+    # Optional list of exchange names or markets of a request
+    value = request.get(field)
+    if value is not None and (not isinstance(value, list) or not all(isinstance(name, str) for name in value)):
+        raise ValueError("%s must be a list of names" % field)
+    return value
+
+
+class Handler(StreamRequestHandler):
+    """
+    Connection to a Gateway: answer each request line, or stream the books after a Subscribe
+    """
+    def handle(self):
+        gateway = self.server.gateway
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("not a JSON object")
+                command = request.get('Command')
+                if command == 'Subscribe':
+                    gateway.stream(self.wfile, request)
+                    return
+                answer = gateway.answer(command, request)
+            except (ValueError, KeyError, TypeError) as e:
+                answer = {'Error': "Invalid request: " + str(e)}
+            self.wfile.write(json.dumps(answer).encode() + b'\n')
+            self.wfile.flush()
+
+
+class Gateway(object):
+    """
+    Single poller of the books of every (exchange, currency pair), served over a Unix socket
+
+    The books are polled by a bus.MarketDataFeed. Each time a book changes its top is
+    written in the shared TopOfBookTable, by the polling thread, before the book is
+    published to the subscribed connections: each has its own conflating bus
+    subscription, a slow reader only gets the latest book of each market.
+
+    :param exchange: Exchange clients by name
+    :type exchange: dict
+
+    :param book_requests: (exchange_name, currency_pair) books to poll
+    :type book_requests: list
+    """
+    def __init__(self, exchange, book_requests, socket_path, min_interval=0.5, max_interval=30, max_size=bus.DEFAULT_MAX_SIZE):
+        self.socket_path = socket_path
+        self.max_size = max_size
+        self.bus = bus.Bus()
+        self.feed = bus.MarketDataFeed(exchange, book_requests, self.bus, min_interval, max_interval)
+        # Write the top of book before publishing, from the polling thread
+        self.feed.book_poller.on_update = self.on_update
+        self.table = sharding.TopOfBookTable(book_requests)
+        # Process owning the table, told to the clients in the layout
+        self.pid = os.getpid()
+        self.stop_event = threading.Event()
+        self.remove_socket()
+        self.server = ThreadingUnixStreamServer(socket_path, Handler)
+        self.server.daemon_threads = True
+        self.server.gateway = self
+        self.thread = None
+
+    def remove_socket(self):
+        # Socket file left by a previous run
+        try:
+            if stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    def on_update(self, exchange_name, currency_pair, update, book):
+        if update.top_changed:
+            self.table.write((exchange_name, currency_pair), book)
+        self.feed.on_update(exchange_name, currency_pair, update, book)
+
+    def layout(self):
+        return {'Table': self.table.name, 'Books': [list(book_request) for book_request in self.table.book_requests],
+                'Pid': self.pid}
+
+    def answer(self, command, request):
+        if command == 'Layout':
+            return self.layout()
+        if command == 'Book':
+            book_request = (request['Exchange'], request['Market'])
+            depth = request.get('Depth')
+            if depth is not None and (not isinstance(depth, int) or isinstance(depth, bool) or depth < 0):
+                return {'Error': "Invalid depth: %r" % (depth,)}
+            if not all(isinstance(name, str) for name in book_request) or book_request not in self.table.slots:
+                return {'Error': "Unknown book: %s on %s" % (book_request[1], book_request[0])}
+            book = self.feed.books.get(book_request)
+            if book is None:
+                return {'Error': "No book yet for %s on %s" % (book_request[1], book_request[0])}
+            return encode_book(book_request[0], book_request[1], book, depth)
+        return {'Error': "Unknown command: " + str(command)}
+
+    def stream(self, wfile, request):
+        # Send every book update matching the request until the connection or the gateway closes
+        subscription = self.bus.subscribe((bus.BOOK,), names(request, 'Exchanges'), names(request, 'Markets'), self.max_size)
+        try:
+            while not self.stop_event.is_set():
+                message = subscription.get(timeout=1)
+                if message is None:
+                    continue
+                answer = encode_book(message.exchange_name, message.market, message.data)
+                answer['TopChanged'] = message.top_changed
+                wfile.write(json.dumps(answer).encode() + b'\n')
+                wfile.flush()
+        except OSError as e:
+            logger.debug("Gateway - Subscriber disconnected: %s", e)
+        finally:
+            self.bus.unsubscribe(subscription)
+
+    def start(self):
+        self.stop_event.clear()
+        self.feed.start()
+        self.thread = threading.Thread(target=self.server.serve_forever, name="Gateway", daemon=True)
+        self.thread.start()
+        logger.info("Gateway - Serving %d books on %s, top of book in %s",
+                    len(self.table.book_requests), self.socket_path, self.table.name)
+        return self
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        self.feed.stop(timeout)
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        self.remove_socket()
+        self.table.close()
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self.stop_event.wait(1):
+                pass
+        except KeyboardInterrupt:
+            logger.info("Gateway - Interrupted")
+        finally:
+            self.stop()
+
+
+class GatewayClient(object):
+    """
+    Connection of a bot to a Gateway, see the module documentation for the protocol
+    """
+    def __init__(self, socket_path, timeout=10):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.connection, self.file = self.connect()
+        # Connections of the running subscriptions
+        self.subscriptions = []
+
+    def connect(self):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        connection.connect(self.socket_path)
+        return connection, connection.makefile('rwb')
+
+    def request(self, command, **fields):
+        fields['Command'] = command
+        self.file.write(json.dumps(fields).encode() + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise Exception("Gateway - Connection closed")
+        answer = json.loads(line)
+        if 'Error' in answer:
+            raise Exception("Gateway - " + answer['Error'])
+        return answer
+
+    def layout(self):
+        """
+        :return: (name of the shared TopOfBookTable, [(exchange_name, currency_pair), ...] in slot order)
+        :rtype : tuple
+        """
+        answer = self.request('Layout')
+        return answer['Table'], [tuple(book_request) for book_request in answer['Books']]
+
+    def orderbook(self, exchange_name, currency_pair, depth=None):
+        """
+        Latest OrderBook of a market, depth levels per side at most
+        """
+        return decode_book(self.request('Book', Exchange=exchange_name, Market=currency_pair, Depth=depth))
+
+    def top_of_book(self):
+        """
+        Attach the shared TopOfBookTable of the gateway, read it with read() or orderbooks()
+
+        The table stays owned by the gateway: closing it only detaches this process.
+        """
+        answer = self.request('Layout')
+        table = sharding.TopOfBookTable([tuple(book_request) for book_request in answer['Books']], answer['Table'])
+        # The gateway frees the memory: the resource tracker of another process must not unlink it at exit
+        if answer['Pid'] != os.getpid():
+            resource_tracker.unregister(table.memory._name, 'shared_memory')
+        return table
+
+    def subscribe(self, exchange_names=None, currency_pairs=None):
+        """
+        Yield (exchange_name, currency_pair, top_changed, OrderBook) each time a matching book
+        changes, over a dedicated connection, until it closes
+        """
+        connection, file = self.connect()
+        # Updates may be far apart
+        connection.settimeout(None)
+        self.subscriptions.append(connection)
+        try:
+            file.write(json.dumps({'Command': 'Subscribe', 'Exchanges': exchange_names, 'Markets': currency_pairs}).encode() + b'\n')
+            file.flush()
+            for line in file:
+                answer = json.loads(line)
+                if 'Error' in answer:
+                    raise Exception("Gateway - " + answer['Error'])
+                yield answer['Exchange'], answer['Market'], answer['TopChanged'], decode_book(answer)
+        finally:
+            self.subscriptions.remove(connection)
+            file.close()
+            connection.close()
+
+    def close(self):
+        # Also ends the subscriptions waiting for a book
+        for connection in list(self.subscriptions):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.file.close()
+        self.connection.close()
+
+
+class GatewayFeed(object):
+    """
+    Publish the books of a Gateway on a local Bus, in place of a bus.MarketDataFeed
+    """
+    def __init__(self, socket_path, bus, exchange_names=None, currency_pairs=None):
+        self.client = GatewayClient(socket_path)
+        self.bus = bus
+        self.exchange_names = exchange_names
+        self.currency_pairs = currency_pairs
+        # Latest OrderBook of each (exchange_name, currency_pair)
+        self.books = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def run(self):
+        try:
+            for exchange_name, currency_pair, top_changed, book in self.client.subscribe(self.exchange_names, self.currency_pairs):
+                if self.stop_event.is_set():
+                    return
+                self.books[(exchange_name, currency_pair)] = book
+                self.bus.publish_book(exchange_name, currency_pair, book, top_changed, book.timestamp)
+        except Exception as e:
+            if not self.stop_event.is_set():
+                logger.error("Gateway - Subscription lost: %s", e)
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="GatewayFeed", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        self.client.close()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+
+if __name__ == "__main__":
+    import strategy_config
+    import trading_bot
+    from common import snapshot
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument('--socket', default=strategy_config.gateway_socket or './gateway.sock', help="Path of the Unix socket")
+    args = parser.parse_args()
+
+    trading_bot.setup_logging('_gateway')
+    Gateway(trading_bot.create_exchanges(),
+            snapshot.snapshot_requests(strategy_config.currency_pairs),
+            args.socket,
+            strategy_config.poll_min_interval,
+            strategy_config.poll_max_interval,
+            strategy_config.bus_queue_size).run_forever()
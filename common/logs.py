@@ -0,0 +1,132 @@
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import atexit
+import copy
+import json
+import logging
+import queue
+import threading
+
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 10
+DEFAULT_QUEUE_SIZE = 100000
+# Messages logging whole response bodies, kept one time out of DEFAULT_RESPONSE_SAMPLE
+RESPONSE_MESSAGES = ('Response content',)
+DEFAULT_RESPONSE_SAMPLE = 100
+
+# Attributes of every LogRecord, the others come from the `extra` argument
+RECORD_ATTRIBUTES = set(logging.LogRecord('', 0, '', 0, '', None, None).__dict__) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, logger, thread, component, message, extra fields, exception
+    """
+    def format(self, record):
+        message = record.getMessage()
+        # "Bittrex - Response content: ..." -> component Bittrex
+        component, separator, text = message.partition(' - ')
+        entry = {
+            'Time': record.created,
+            'Level': record.levelname,
+            'Logger': record.name,
+            'Thread': record.threadName,
+            'Component': component if separator and ' ' not in component else None,
+            'Message': text if separator and ' ' not in component else message,
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry['Exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['Exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one record out of `every` among those whose message template contains one of the markers
+
+    The template is checked, not the formatted message: nothing is formatted to decide.
+    """
+    def __init__(self, markers=RESPONSE_MESSAGES, every=DEFAULT_RESPONSE_SAMPLE):
+        super().__init__()
+        self.markers = markers
+        self.every = every
+        self.seen = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        template = record.msg
+        if not isinstance(template, str) or not any(marker in template for marker in self.markers):
+            return True
+        if self.every <= 0:
+            return False
+        with self.lock:
+            self.seen += 1
+            return self.seen % self.every == 1 or self.every == 1
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    QueueHandler that does not wait when the queue is full
+
+    The message is built in the caller thread, as the arguments (response dicts...) may
+    be modified once logged; the JSON line is written by the listener thread. Records
+    that do not fit in the queue are dropped and counted.
+    """
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Same as QueueHandler.prepare without the final formatting, done by the listener
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class Listener(QueueListener):
+    """
+    QueueListener that can be stopped more than once (explicitly, then at exit)
+    """
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+def setup_pipeline(logger, path, level=logging.INFO, max_bytes=DEFAULT_MAX_BYTES, backup_count=DEFAULT_BACKUP_COUNT,
+                   response_sample=DEFAULT_RESPONSE_SAMPLE, queue_size=DEFAULT_QUEUE_SIZE, handlers=None):
+    """
+    Send the records of a logger through a queue to a writer thread
+
+    The writer appends JSON lines to `path`, rotated every `max_bytes` with `backup_count`
+    files kept, and to the extra `handlers` if any. Response bodies are logged one time
+    out of `response_sample` (0 to never log them).
+    The listener is stopped, and the queue flushed, at interpreter exit.
+
+    :return: The Listener, see QueueListener.stop
+    :rtype : Listener
+    """
+    file_handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(JsonFormatter())
+
+    queue_handler = NonBlockingQueueHandler(queue.Queue(queue_size))
+    queue_handler.addFilter(SamplingFilter(every=response_sample))
+    logger.addHandler(queue_handler)
+    logger.setLevel(level)
+
+    listener = Listener(queue_handler.queue, file_handler, *(handlers or []))
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
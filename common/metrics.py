@@ -0,0 +1,274 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import bisect
+import json
+import threading
+import time
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+# Upper bounds of the histogram buckets: 10us to 84s for durations, 64B to 32MB for payloads
+DURATION_BOUNDS = [1e-5 * 2 ** i for i in range(24)]
+SIZE_BOUNDS = [64 * 2 ** i for i in range(20)]
+
+
+class Histogram(object):
+    """
+    Fixed-bucket histogram: observing a value is one bisect and a few additions
+    """
+    __slots__ = ('bounds', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # The last bucket counts the values above every bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, ratio):
+        """
+        Upper bound of the bucket holding the given ratio of the values (ex: 0.99)
+        """
+        if not self.count:
+            return None
+        rank = ratio * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'Count': self.count,
+            'Sum': self.total,
+            'Mean': self.total / self.count if self.count else None,
+            'Max': self.max,
+            'P50': self.percentile(0.5),
+            'P90': self.percentile(0.9),
+            'P99': self.percentile(0.99),
+            # [(upper bound, count), ...] of the non-empty buckets, None for the overflow one
+            'Buckets': [(self.bounds[i] if i < len(self.bounds) else None, count)
+                        for i, count in enumerate(self.counts) if count],
+        }
+
+
+class EndpointMetrics(object):
+    """
+    Metrics of one endpoint of one exchange
+    """
+    __slots__ = ('requests', 'errors', 'latency', 'decode', 'payload', 'wait', 'lock')
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        # Seconds from sending the request to the response content received
+        self.latency = Histogram(DURATION_BOUNDS)
+        # Seconds spent decoding and checking the response
+        self.decode = Histogram(DURATION_BOUNDS)
+        # Response content bytes
+        self.payload = Histogram(SIZE_BOUNDS)
+        # Seconds waited for the rate limiter
+        self.wait = Histogram(DURATION_BOUNDS)
+        self.lock = threading.Lock()
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'Requests': self.requests,
+                'Errors': self.errors,
+                'Latency': self.latency.to_dict(),
+                'Decode': self.decode.to_dict(),
+                'Payload': self.payload.to_dict(),
+                'RateLimitWait': self.wait.to_dict(),
+            }
+
+
+class Metrics(object):
+    """
+    Request metrics of the exchange clients, per exchange and endpoint
+
+    Clients created with metrics record the latency, payload size, decode time,
+    rate limiter wait and errors of every request, and register their rate limiter
+    so that its headroom is read when a snapshot is taken. Nothing is formatted on
+    the request path: snapshot builds the report when it is pulled (MetricsServer)
+    or dumped (MetricsDumper).
+    A client without metrics only pays an `is None` check; setting enabled to False
+    stops the recording at run time.
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        # (exchange_name, endpoint): EndpointMetrics
+        self.endpoints = {}
+        # exchange_name: RateLimiter
+        self.rate_limiters = {}
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def endpoint(self, exchange_name, endpoint):
+        endpoint_metrics = self.endpoints.get((exchange_name, endpoint))
+        if endpoint_metrics is None:
+            with self.lock:
+                endpoint_metrics = self.endpoints.setdefault((exchange_name, endpoint), EndpointMetrics())
+        return endpoint_metrics
+
+    def watch_rate_limiter(self, exchange_name, rate_limiter):
+        self.rate_limiters[exchange_name] = rate_limiter
+
+    def observe(self, exchange_name, endpoint, latency, size, decode_time, waited, error):
+        endpoint_metrics = self.endpoint(exchange_name, endpoint)
+        with endpoint_metrics.lock:
+            endpoint_metrics.requests += 1
+            if error:
+                endpoint_metrics.errors += 1
+            endpoint_metrics.latency.observe(latency)
+            endpoint_metrics.decode.observe(decode_time)
+            endpoint_metrics.payload.observe(size)
+            endpoint_metrics.wait.observe(waited)
+
+    def observe_error(self, exchange_name, endpoint):
+        """
+        Count a request that got no response (connection error, timeout)
+        """
+        if not self.enabled:
+            return
+        endpoint_metrics = self.endpoint(exchange_name, endpoint)
+        with endpoint_metrics.lock:
+            endpoint_metrics.requests += 1
+            endpoint_metrics.errors += 1
+
+    def handle(self, exchange_name, endpoint, start, waited, content, handle_response, *args):
+        """
+        Call handle_response(*args) on a response received now, recording the request
+
+        :param start: time.perf_counter() when the request was sent
+        :param waited: Seconds waited for the rate limiter before sending it
+        """
+        if not self.enabled:
+            return handle_response(*args)
+        received = time.perf_counter()
+        error = True
+        try:
+            response_json = handle_response(*args)
+            error = False
+            return response_json
+        finally:
+            self.observe(exchange_name, endpoint, received - start, len(content), time.perf_counter() - received, waited, error)
+
+    def headroom(self):
+        # {exchange_name: {endpoint class: requests that can be sent now, 'All': any class}}
+        headroom = {}
+        for exchange_name, rate_limiter in list(self.rate_limiters.items()):
+            classes = set(rate_limiter.reserves) | set(rate_limiter.class_buckets)
+            headroom[exchange_name] = {endpoint_class: rate_limiter.headroom(endpoint_class) for endpoint_class in classes}
+            headroom[exchange_name]['All'] = rate_limiter.headroom()
+        return headroom
+
+    def snapshot(self):
+        """
+        {'Timestamp', 'Uptime', 'Endpoints': {exchange_name: {endpoint: metrics}}, 'RateLimitHeadroom': see headroom}
+        """
+        endpoints = {}
+        for (exchange_name, endpoint), endpoint_metrics in list(self.endpoints.items()):
+            endpoints.setdefault(exchange_name, {})[endpoint] = endpoint_metrics.to_dict()
+        now = time.time()
+        return {
+            'Timestamp': now,
+            'Uptime': now - self.started,
+            'Endpoints': endpoints,
+            'RateLimitHeadroom': self.headroom(),
+        }
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+            self.started = time.time()
+
+
+class MetricsServer(object):
+    """
+    Pull endpoint: GET http://host:port/metrics answers Metrics.snapshot as JSON
+
+    Served by a background thread; port 0 picks a free port (see self.port).
+    """
+    def __init__(self, metrics, host='127.0.0.1', port=9100):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] != '/metrics':
+                    handler.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot()).encode()
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'application/json')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True)
+        self.thread.start()
+        logger.info("Metrics - Serving on port %d", self.port)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+
+class MetricsDumper(object):
+    """
+    Periodic dump of Metrics.snapshot as one JSON line, appended to a file or logged at INFO level
+    """
+    def __init__(self, metrics, interval=60, path=None):
+        self.metrics = metrics
+        self.interval = interval
+        self.path = path
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def dump(self):
+        line = json.dumps(self.metrics.snapshot())
+        if self.path is None:
+            logger.info("Metrics - %s", line)
+        else:
+            with open(self.path, 'a') as dump_file:
+                dump_file.write(line + "\n")
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.dump()
+            except Exception as e:
+                logger.error("Metrics - Failed to dump the metrics: %s", e)
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="MetricsDumper", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
@@ -0,0 +1,429 @@
+from array import array
+from collections import OrderedDict
+import bisect
+import itertools
+import operator
+
+BUY = 'buy'
+SELL = 'sell'
+
+
+def bisect_descending(prices, price):
+    """
+    Number of leading prices of a decreasing sequence at or above the given price
+
+    bisect.bisect_right for decreasing sequences, without the key argument of Python 3.10.
+    """
+    low, high = 0, len(prices)
+    while low < high:
+        middle = (low + high) // 2
+        if prices[middle] < price:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def columns(prices, sizes):
+    """
+    Price and size columns of a BookSide: float arrays for float levels, lists otherwise
+
+    Decimal (or integer) levels are kept as they are: converting each Decimal to float
+    costs more than the whole normalization and loses its exactness.
+    """
+    if prices and isinstance(prices[0], float):
+        return array('d', prices), array('d', sizes)
+    return list(prices), list(sizes)
+
+
+def aggregate_levels(prices, sizes):
+    """
+    Sum the sizes of the consecutive levels with the same price
+
+    :return: (prices, sizes) lists
+    :rtype : tuple
+    """
+    aggregated_prices, aggregated_sizes = [], []
+    for price, size in zip(prices, sizes):
+        if aggregated_prices and aggregated_prices[-1] == price:
+            aggregated_sizes[-1] += size
+        else:
+            aggregated_prices.append(price)
+            aggregated_sizes.append(size)
+    return aggregated_prices, aggregated_sizes
+
+
+class BookSide(object):
+    """
+    One side of an orderbook stored as parallel price/size arrays, best level first
+
+    Bids are sorted by decreasing price, asks by increasing price. The columns are
+    array('d') for float levels; Decimal levels are kept exact in lists (see columns),
+    to_float converts them for the consumers of floats.
+    """
+    __slots__ = ('prices', 'sizes', 'descending')
+
+    def __init__(self, prices=None, sizes=None, descending=False):
+        self.prices = prices if prices is not None else array('d')
+        self.sizes = sizes if sizes is not None else array('d')
+        self.descending = descending
+
+    @classmethod
+    def from_levels(cls, levels, descending=False):
+        """
+        Build a side from (price, size) levels, sorting them only when needed
+
+        Levels with the same price are merged, their sizes summed.
+        """
+        if not levels:
+            return cls(descending=descending)
+        prices, sizes = zip(*levels)
+        # Exchanges usually send their levels sorted without duplicates: one pass in C checks it
+        better = operator.gt if descending else operator.lt
+        if not all(map(better, prices, itertools.islice(prices, 1, None))):
+            order = sorted(range(len(prices)), key=prices.__getitem__, reverse=descending)
+            prices = [prices[i] for i in order]
+            sizes = [sizes[i] for i in order]
+            if not all(map(operator.ne, prices, itertools.islice(prices, 1, None))):
+                prices, sizes = aggregate_levels(prices, sizes)
+        prices, sizes = columns(prices, sizes)
+        return cls(prices, sizes, descending)
+
+    def __len__(self):
+        return len(self.prices)
+
+    def __iter__(self):
+        return zip(self.prices, self.sizes)
+
+    def __bool__(self):
+        return len(self.prices) > 0
+
+    def items(self):
+        return zip(self.prices, self.sizes)
+
+    def best(self):
+        """
+        Best level as (price, size), None if the side is empty
+        """
+        if not self.prices:
+            return None
+        return self.prices[0], self.sizes[0]
+
+    def levels_through(self, price):
+        """
+        Number of levels priced at or better than the given price
+        """
+        if self.descending:
+            return bisect_descending(self.prices, price)
+        return bisect.bisect_right(self.prices, price)
+
+    def volume_to(self, price):
+        """
+        Cumulative size available at or better than the given price
+        """
+        return sum(self.sizes[:self.levels_through(price)])
+
+    def cumulative_sizes(self):
+        """
+        Cumulative size at each level, best level first
+        """
+        if isinstance(self.sizes, array):
+            return array('d', itertools.accumulate(self.sizes))
+        return list(itertools.accumulate(self.sizes))
+
+    def vwap(self, size):
+        """
+        Volume weighted average price to fill the given size, None if the side is not deep enough
+        """
+        if size <= 0:
+            return None
+        remaining = size
+        notional = 0
+        for price, level_size in zip(self.prices, self.sizes):
+            if level_size >= remaining:
+                notional += price * remaining
+                return notional / size
+            notional += price * level_size
+            remaining -= level_size
+        return None
+
+    def to_float(self):
+        """
+        Side with float array columns: itself when it already has them
+        """
+        if isinstance(self.prices, array):
+            return self
+        return BookSide(array('d', map(float, self.prices)), array('d', map(float, self.sizes)), self.descending)
+
+    def to_dict(self):
+        """
+        Side as the former {Price: Amount, ...} ordered dictionnary
+        """
+        return OrderedDict(zip(self.prices, self.sizes))
+
+    def __repr__(self):
+        return "BookSide(%s)" % list(zip(self.prices, self.sizes))
+
+
+class OrderBook(object):
+    """
+    Normalized orderbook returned by the clean_orderbook method of every exchange
+
+    Sides are reachable as book.buy / book.sell or book['buy'] / book['sell'].
+    """
+    __slots__ = ('buy', 'sell', 'timestamp')
+
+    def __init__(self, buy=None, sell=None, timestamp=None):
+        self.buy = buy if buy is not None else BookSide(descending=True)
+        self.sell = sell if sell is not None else BookSide()
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_levels(cls, bids, asks, timestamp=None):
+        """
+        Build a book from (price, size) bid and ask levels, in any order
+        """
+        return cls(
+            BookSide.from_levels(bids, descending=True),
+            BookSide.from_levels(asks),
+            timestamp)
+
+    def __getitem__(self, side):
+        if side == BUY:
+            return self.buy
+        if side == SELL:
+            return self.sell
+        raise KeyError(side)
+
+    @property
+    def best_bid(self):
+        return self.buy.best()
+
+    @property
+    def best_ask(self):
+        return self.sell.best()
+
+    @property
+    def spread(self):
+        """
+        Best ask minus best bid, None if a side is empty
+        """
+        if not self.buy or not self.sell:
+            return None
+        return self.sell.prices[0] - self.buy.prices[0]
+
+    @property
+    def mid(self):
+        if not self.buy or not self.sell:
+            return None
+        return (self.sell.prices[0] + self.buy.prices[0]) / 2
+
+    def to_float(self):
+        """
+        Book with float array sides (see BookSide.to_float): itself when it already has them
+        """
+        buy, sell = self.buy.to_float(), self.sell.to_float()
+        if buy is self.buy and sell is self.sell:
+            return self
+        return OrderBook(buy, sell, self.timestamp)
+
+    def to_dict(self):
+        """
+        Book as the former {'buy': {Price: Amount, ...}, 'sell': {Price: Amount, ...}} dictionnary
+        """
+        return {BUY: self.buy.to_dict(), SELL: self.sell.to_dict()}
+
+    def __repr__(self):
+        return "OrderBook(buy=%r, sell=%r)" % (list(self.buy), list(self.sell))
+
+
+class IncrementalBookSide(object):
+    """
+    One side of an orderbook kept sorted between updates
+
+    Prices are kept in increasing order in a list maintained with bisect, sizes in a
+    {Price: Amount} dictionnary, so a level update costs O(log n) to find the level
+    instead of a full re-sort.
+    Prices are used as dictionnary keys: feed the side with one numeric type
+    (the json_nums of the client) across updates.
+    """
+    __slots__ = ('prices', 'levels', 'descending')
+
+    def __init__(self, descending=False):
+        self.prices = []
+        self.levels = {}
+        self.descending = descending
+
+    def __len__(self):
+        return len(self.prices)
+
+    def best(self):
+        """
+        Best level as (price, size), None if the side is empty
+        """
+        if not self.prices:
+            return None
+        price = self.prices[-1] if self.descending else self.prices[0]
+        return price, self.levels[price]
+
+    def update(self, price, size):
+        """
+        Insert, modify or delete (size 0) a level
+
+        :return: (price, old_size, new_size), None if nothing changed
+        :rtype : tuple
+        """
+        old_size = self.levels.get(price, 0)
+        if size == old_size:
+            return None
+        if size <= 0:
+            if not old_size:
+                # Deletion of a level not in the book
+                return None
+            del self.levels[price]
+            del self.prices[bisect.bisect_left(self.prices, price)]
+            size = 0
+        else:
+            if not old_size:
+                bisect.insort(self.prices, price)
+            self.levels[price] = size
+        return price, old_size, size
+
+    def apply_snapshot(self, levels):
+        """
+        Bring the side to a full snapshot of (price, size) levels, touching only the levels that differ
+
+        :return: Changed levels as (price, old_size, new_size)
+        :rtype : list
+        """
+        snapshot = dict(levels)
+        current = self.levels
+        # The comparisons run in C: only the levels that differ reach Python code
+        if snapshot == current:
+            return []
+        changes = []
+        if snapshot.keys() != current.keys():
+            for price in current.keys() - snapshot.keys():
+                changes.append(self.update(price, 0))
+        for price in itertools.compress(snapshot, map(operator.ne, map(current.get, snapshot), snapshot.values())):
+            change = self.update(price, snapshot[price])
+            # None for an empty level not in the book
+            if change is not None:
+                changes.append(change)
+        return changes
+
+    def to_side(self):
+        """
+        Current levels as a BookSide, with the columns of BookSide.from_levels
+        """
+        prices = self.prices[::-1] if self.descending else self.prices
+        # Look the sizes up with the original keys: Decimal prices are not equal to their float
+        sizes = [self.levels[price] for price in prices]
+        prices, sizes = columns(prices, sizes)
+        return BookSide(prices, sizes, self.descending)
+
+
+class BookUpdate(object):
+    """
+    Result of an update of an IncrementalOrderBook
+    """
+    __slots__ = ('changes', 'top_changed', 'best_bid', 'best_ask')
+
+    def __init__(self, changes, top_changed, best_bid, best_ask):
+        # [(side, price, old_size, new_size), ...]
+        self.changes = changes
+        self.top_changed = top_changed
+        self.best_bid = best_bid
+        self.best_ask = best_ask
+
+    def __bool__(self):
+        return len(self.changes) > 0
+
+    def __repr__(self):
+        return "BookUpdate(changes=%r, top_changed=%r)" % (self.changes, self.top_changed)
+
+
+class IncrementalOrderBook(object):
+    """
+    Orderbook maintained across polls by applying only the levels that changed
+
+    Listeners registered with on_top_of_book are called with the BookUpdate when the
+    best bid or the best ask (price or size) has changed.
+    """
+    __slots__ = ('buy', 'sell', 'timestamp', 'top_listeners')
+
+    def __init__(self):
+        self.buy = IncrementalBookSide(descending=True)
+        self.sell = IncrementalBookSide()
+        self.timestamp = None
+        self.top_listeners = []
+
+    def __getitem__(self, side):
+        if side == BUY:
+            return self.buy
+        if side == SELL:
+            return self.sell
+        raise KeyError(side)
+
+    @property
+    def best_bid(self):
+        return self.buy.best()
+
+    @property
+    def best_ask(self):
+        return self.sell.best()
+
+    def on_top_of_book(self, callback):
+        self.top_listeners.append(callback)
+
+    def update(self, side, price, size, timestamp=None):
+        """
+        Apply a single level update: insert, modify or delete (size 0)
+        """
+        change = self[side].update(price, size)
+        changes = [(side,) + change] if change is not None else []
+        return self.publish(changes, timestamp)
+
+    def update_levels(self, updates, timestamp=None):
+        """
+        Apply a list of (side, price, size) level updates
+        """
+        changes = []
+        for side, price, size in updates:
+            change = self[side].update(price, size)
+            if change is not None:
+                changes.append((side,) + change)
+        return self.publish(changes, timestamp)
+
+    def apply_snapshot(self, bids, asks, timestamp=None):
+        """
+        Bring the book to a fresh snapshot of (price, size) bid and ask levels
+        """
+        changes = [(BUY,) + change for change in self.buy.apply_snapshot(bids)]
+        changes.extend((SELL,) + change for change in self.sell.apply_snapshot(asks))
+        return self.publish(changes, timestamp)
+
+    def publish(self, changes, timestamp):
+        best_bid, best_ask = self.buy.best(), self.sell.best()
+        top_changed = False
+        for side, price, old_size, new_size in changes:
+            best = best_bid if side == BUY else best_ask
+            # A change at or better than the current best level, or the removal of the former best level
+            if best is None or price == best[0] or (price > best[0] if side == BUY else price < best[0]):
+                top_changed = True
+                break
+        self.timestamp = timestamp
+        book_update = BookUpdate(changes, top_changed, best_bid, best_ask)
+        if top_changed:
+            for callback in self.top_listeners:
+                callback(book_update)
+        return book_update
+
+    def to_orderbook(self):
+        """
+        Current state as an OrderBook
+        """
+        return OrderBook(self.buy.to_side(), self.sell.to_side(), self.timestamp)
+
+    def __repr__(self):
+        return "IncrementalOrderBook(best_bid=%r, best_ask=%r)" % (self.best_bid, self.best_ask)
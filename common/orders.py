@@ -0,0 +1,322 @@
+from collections import deque
+import decimal
+import threading
+import time
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+# Order status
+OPEN = 'Open'
+CANCELLED = 'Cancelled'
+# No longer open on the exchange: filled, or cancelled outside of this process
+CLOSED = 'Closed'
+
+
+def to_decimal(quantity):
+    """
+    Quantity as a Decimal, whether the client returned a Decimal, a float or a string
+
+    Floats go through their shortest repr, so that 0.1 equals Decimal('0.1').
+    """
+    if isinstance(quantity, decimal.Decimal):
+        return quantity
+    if isinstance(quantity, float):
+        return decimal.Decimal(repr(quantity))
+    return decimal.Decimal(quantity)
+
+
+class OrderStore(object):
+    """
+    In-memory state of the orders placed through the exchange clients
+
+    Clients created with an order_store record there every order placed with
+    place_limit_order and every cancel_order. Orders are indexed by (exchange, market)
+    and by status, so open orders and exposure are answered without any request.
+    A Reconciler brings the store in line with the open orders of the exchanges now
+    and then. The latest `max_closed` orders that are no longer open are kept.
+
+    Listeners (ex: portfolio.Portfolio) are told of every change, outside of the lock:
+    on_order_placed(exchange_name, order_id, market, way, quantity, price) when an order
+    opens, on_fill(exchange_name, order_id, quantity, price) when its remaining quantity
+    drops, at its limit price, and on_order_closed(exchange_name, order_id, released) when it
+    is no longer open. released is False for an order closed by a reconciliation: it may
+    have been filled, what it held is only known after a balance refresh.
+
+    An order is {'Exchange', 'OrderId', 'Market', 'Way', 'Quantity', 'Remaining', 'Price',
+    'Status', 'Created', 'Updated'}.
+    """
+    def __init__(self, max_closed=10000):
+        self.max_closed = max_closed
+        # (exchange_name, order_id): order
+        self.orders = {}
+        # (exchange_name, market): {(exchange_name, order_id), ...}
+        self.by_market = {}
+        # status: {(exchange_name, order_id), ...}
+        self.by_status = {}
+        # Keys of the orders no longer open, oldest first
+        self.closed = deque()
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def notify(self, events):
+        # Call the listeners with the (method name, args) events, outside of the lock
+        for listener in self.listeners:
+            for method, args in events:
+                try:
+                    getattr(listener, method)(*args)
+                except Exception as e:
+                    logger.error("OrderStore - %s failed on %s: %s", method, args, e)
+
+    def index(self, key, order):
+        # Call with the lock held
+        self.by_market.setdefault((order['Exchange'], order['Market']), set()).add(key)
+        self.by_status.setdefault(order['Status'], set()).add(key)
+
+    def add(self, exchange_name, order_id, market, way, quantity, price, remaining=None, status=OPEN):
+        """
+        Record a new order, replacing a previous record of the same order
+        """
+        key = (exchange_name, order_id)
+        now = time.time()
+        order = {
+            'Exchange': exchange_name,
+            'OrderId': order_id,
+            'Market': market,
+            'Way': way,
+            'Quantity': quantity,
+            'Remaining': quantity if remaining is None else remaining,
+            'Price': price,
+            'Status': status,
+            'Created': now,
+            'Updated': now,
+        }
+        events = []
+        with self.lock:
+            previous = self.orders.get(key)
+            if previous is not None:
+                self.remove(key)
+                if previous['Status'] == OPEN:
+                    events.append(('on_order_closed', (exchange_name, order_id, True)))
+            self.orders[key] = order
+            self.index(key, order)
+            if status != OPEN:
+                self.close(key)
+            else:
+                events.append(('on_order_placed', (exchange_name, order_id, market, way, order['Remaining'], price)))
+        self.notify(events)
+        return dict(order)
+
+    def remove(self, key):
+        # Call with the lock held
+        order = self.orders.pop(key)
+        self.by_market[(order['Exchange'], order['Market'])].discard(key)
+        self.by_status[order['Status']].discard(key)
+
+    def close(self, key):
+        # Keep the latest closed orders only; call with the lock held
+        self.closed.append(key)
+        while len(self.closed) > self.max_closed:
+            old_key = self.closed.popleft()
+            if old_key in self.orders and self.orders[old_key]['Status'] != OPEN:
+                self.remove(old_key)
+
+    def set_status(self, exchange_name, order_id, status, remaining=None):
+        """
+        Change the status (and remaining quantity) of a known order
+
+        :return: False when the order is unknown
+        :rtype : bool
+        """
+        key = (exchange_name, order_id)
+        events = []
+        with self.lock:
+            order = self.orders.get(key)
+            if order is None:
+                return False
+            was_open = order['Status'] == OPEN
+            if remaining is not None:
+                filled = to_decimal(order['Remaining']) - to_decimal(remaining)
+                if was_open and filled > 0:
+                    events.append(('on_fill', (exchange_name, order_id, filled, order['Price'])))
+                order['Remaining'] = remaining
+            if order['Status'] != status:
+                self.by_status[order['Status']].discard(key)
+                order['Status'] = status
+                self.by_status.setdefault(status, set()).add(key)
+                if status != OPEN:
+                    self.close(key)
+                    events.append(('on_order_closed', (exchange_name, order_id, status != CLOSED)))
+                else:
+                    events.append(('on_order_placed', (exchange_name, order_id, order['Market'], order['Way'],
+                                                       order['Remaining'], order['Price'])))
+            order['Updated'] = time.time()
+        self.notify(events)
+        return True
+
+    def cancelled(self, exchange_name, order_id):
+        return self.set_status(exchange_name, order_id, CANCELLED)
+
+    def get(self, exchange_name, order_id):
+        with self.lock:
+            order = self.orders.get((exchange_name, order_id))
+            return dict(order) if order is not None else None
+
+    def keys(self, exchange_name=None, market=None, status=None):
+        # Keys of the matching orders, from the smallest index; call with the lock held
+        if exchange_name is not None and market is not None:
+            keys = self.by_market.get((exchange_name, market), set())
+            if status is not None:
+                keys = keys & self.by_status.get(status, set())
+        elif market is not None:
+            # Same market on every exchange
+            keys = set().union(*(keys for (_, indexed_market), keys in self.by_market.items() if indexed_market == market))
+            if status is not None:
+                keys = keys & self.by_status.get(status, set())
+        elif status is not None:
+            keys = self.by_status.get(status, set())
+        else:
+            keys = self.orders.keys()
+        if exchange_name is not None and market is None:
+            keys = [key for key in keys if key[0] == exchange_name]
+        return keys
+
+    def find(self, exchange_name=None, market=None, status=None):
+        """
+        Copies of the orders of an exchange, a market (of every exchange unless one is given) and/or a status
+        """
+        with self.lock:
+            return [dict(self.orders[key]) for key in self.keys(exchange_name, market, status)]
+
+    def open_orders(self, exchange_name=None, market=None):
+        return self.find(exchange_name, market, OPEN)
+
+    def exposure(self, exchange_name, market):
+        """
+        Quantity and notional still open on each side of a market
+
+        :return: {'Bid', 'Ask', 'BidNotional', 'AskNotional'}
+        :rtype : dict
+        """
+        exposure = {'Bid': 0.0, 'Ask': 0.0, 'BidNotional': 0.0, 'AskNotional': 0.0}
+        with self.lock:
+            for key in self.keys(exchange_name, market, OPEN):
+                order = self.orders[key]
+                remaining = float(order['Remaining'])
+                exposure[order['Way']] += remaining
+                exposure[order['Way'] + 'Notional'] += remaining * float(order['Price'])
+        return exposure
+
+    def reconcile(self, exchange_name, open_orders, started=None):
+        """
+        Bring the orders of an exchange in line with its open orders, as returned by clean_open_orders
+
+        Open orders missing from the exchange are closed, unless they were recorded after
+        `started` (the time the exchange was asked): their order may not be listed yet.
+        Orders unknown to the store are added.
+
+        :return: {'Added', 'Updated', 'Closed'} counts
+        :rtype : dict
+        """
+        counts = {'Added': 0, 'Updated': 0, 'Closed': 0}
+        listed = {}
+        for order in open_orders:
+            listed[order['OrderId']] = order
+        with self.lock:
+            known = [key for key in self.by_status.get(OPEN, set()) if key[0] == exchange_name]
+        for key in known:
+            order = self.get(*key)
+            if order is None:
+                continue
+            exchange_order = listed.pop(key[1], None)
+            if exchange_order is not None:
+                # Clients may return Decimals while the store holds the floats or strings given to add
+                if to_decimal(exchange_order['Remaining']) != to_decimal(order['Remaining']):
+                    self.set_status(exchange_name, key[1], OPEN, exchange_order['Remaining'])
+                    counts['Updated'] += 1
+            elif started is None or order['Created'] < started:
+                self.set_status(exchange_name, key[1], CLOSED)
+                counts['Closed'] += 1
+        for order_id, exchange_order in listed.items():
+            known_order = self.get(exchange_name, order_id)
+            if known_order is not None:
+                # Closed here but still open on the exchange (ex: cancel not processed)
+                self.set_status(exchange_name, order_id, OPEN, exchange_order['Remaining'])
+                counts['Updated'] += 1
+                continue
+            self.add(exchange_name, order_id, exchange_order['Market'], exchange_order['Way'],
+                     exchange_order['Quantity'], exchange_order['Price'], exchange_order['Remaining'])
+            counts['Added'] += 1
+        return counts
+
+    def statistics(self):
+        with self.lock:
+            statistics = {status: len(keys) for status, keys in self.by_status.items()}
+            statistics['Total'] = len(self.orders)
+            return statistics
+
+
+class Reconciler(object):
+    """
+    Reconcile an OrderStore with the open orders of every exchange at a low frequency
+
+    Exchange clients without clean_open_orders are skipped. When a portfolio.Portfolio
+    is given, the balances of the exchanges reconciled are refreshed right after, which
+    settles the orders closed since the previous reconciliation (filled or cancelled).
+
+    :param exchange: Exchange clients by name (ex: {'Bittrex': Bittrex(...)})
+    :type exchange: dict
+
+    :param interval: Seconds between two reconciliations
+    :type interval: float
+    """
+    def __init__(self, order_store, exchange, interval=60, portfolio=None):
+        self.order_store = order_store
+        self.exchange = exchange
+        self.interval = interval
+        self.portfolio = portfolio
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def reconcile(self):
+        """
+        Reconcile every exchange once
+
+        :return: {exchange_name: {'Added', 'Updated', 'Closed'}}
+        :rtype : dict
+        """
+        results = {}
+        for exchange_name, exchange_client in self.exchange.items():
+            if not hasattr(exchange_client, 'clean_open_orders'):
+                continue
+            started = time.time()
+            try:
+                open_orders = exchange_client.clean_open_orders()
+            except Exception as e:
+                logger.error("Reconciler - Failed to get the open orders of %s: %s", exchange_name, e)
+                continue
+            results[exchange_name] = self.order_store.reconcile(exchange_name, open_orders, started)
+            if results[exchange_name]['Added'] or results[exchange_name]['Closed']:
+                logger.info("Reconciler - %s: %s", exchange_name, results[exchange_name])
+        if self.portfolio is not None and results:
+            self.portfolio.refresh(list(results))
+        return results
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.reconcile()
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="Reconciler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
@@ -0,0 +1,153 @@
+import heapq
+import threading
+import time
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+class PollTask(object):
+    """
+    Polling state of one (exchange, currency pair) orderbook
+    """
+    __slots__ = ('exchange_name', 'currency_pair', 'interval', 'next_poll', 'polls', 'top_changes', 'errors')
+
+    def __init__(self, exchange_name, currency_pair, interval):
+        self.exchange_name = exchange_name
+        self.currency_pair = currency_pair
+        self.interval = interval
+        self.next_poll = 0.0
+        self.polls = 0
+        self.top_changes = 0
+        self.errors = 0
+
+    def __lt__(self, other):
+        return self.next_poll < other.next_poll
+
+
+class AdaptivePoller(object):
+    """
+    Long-running poller of every (exchange, currency pair) orderbook
+
+    Each exchange is polled by its own thread, so a slow exchange never delays the
+    others. The poll interval of a book adapts to the market: it is multiplied by
+    `tighten` when the top of book moved since the previous poll, by `back_off` when
+    it did not, within [min_interval, max_interval].
+    The minimum interval of an exchange is also raised so that its polls use at most
+    `budget_share` of the sustained rate of its rate limiter, the rest being left to
+    orders and cancels.
+
+    :param exchange: Exchange clients by name (ex: {'Bittrex': Bittrex(...)})
+    :type exchange: dict
+
+    :param book_requests: (exchange_name, currency_pair) books to poll
+    :type book_requests: list
+
+    :param on_update: Called with (exchange_name, currency_pair, BookUpdate, OrderBook) when a book changed
+    :type on_update: function
+    """
+    def __init__(self, exchange, book_requests, min_interval=0.5, max_interval=30, tighten=0.5, back_off=1.5,
+                 budget_share=0.5, on_update=None):
+        self.exchange = exchange
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.tighten = tighten
+        self.back_off = back_off
+        self.budget_share = budget_share
+        self.on_update = on_update
+        # Latest OrderBook of each (exchange_name, currency_pair), replaced after every change
+        self.books = {}
+        self.tasks = {}
+        for exchange_name, currency_pair in book_requests:
+            self.tasks.setdefault(exchange_name, []).append(PollTask(exchange_name, currency_pair, min_interval))
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    def exchange_min_interval(self, exchange_name):
+        """
+        Shortest poll interval of a book of the exchange that fits the request budget
+        """
+        min_interval = self.min_interval
+        rate_limiter = getattr(self.exchange[exchange_name], 'rate_limiter', None)
+        if rate_limiter is not None:
+            budget = rate_limiter.bucket.rate * self.budget_share
+            min_interval = max(min_interval, len(self.tasks[exchange_name]) / budget)
+        return min_interval
+
+    def poll(self, task, min_interval):
+        exchange_client = self.exchange[task.exchange_name]
+        task.polls += 1
+        try:
+            update = exchange_client.poll_orderbook(task.currency_pair)
+        except Exception as e:
+            task.errors += 1
+            logger.error("Poller - Failed to poll %s on %s: %s", task.currency_pair, task.exchange_name, e)
+            task.interval = min(self.max_interval, task.interval * self.back_off)
+            return
+
+        if update.top_changed:
+            task.top_changes += 1
+            task.interval = max(min_interval, task.interval * self.tighten)
+        else:
+            task.interval = min(self.max_interval, task.interval * self.back_off)
+
+        if update:
+            book = exchange_client.orderbooks[task.currency_pair].to_orderbook()
+            self.books[(task.exchange_name, task.currency_pair)] = book
+            if self.on_update is not None:
+                try:
+                    self.on_update(task.exchange_name, task.currency_pair, update, book)
+                except Exception as e:
+                    logger.error("Poller - Update handler failed for %s on %s: %s", task.currency_pair, task.exchange_name, e)
+
+    def run_exchange(self, exchange_name):
+        # Poll the books of one exchange, the next due first
+        min_interval = self.exchange_min_interval(exchange_name)
+        queue = list(self.tasks[exchange_name])
+        for task in queue:
+            task.interval = max(task.interval, min_interval)
+        heapq.heapify(queue)
+        while not self.stop_event.is_set():
+            task = heapq.heappop(queue)
+            delay = task.next_poll - time.monotonic()
+            if delay > 0 and self.stop_event.wait(delay):
+                break
+            self.poll(task, min_interval)
+            task.next_poll = time.monotonic() + task.interval
+            heapq.heappush(queue, task)
+
+    def start(self):
+        self.stop_event.clear()
+        for exchange_name in self.tasks:
+            thread = threading.Thread(target=self.run_exchange, args=(exchange_name,), name="Poller-" + exchange_name, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info("Poller - Polling %d orderbooks on %d exchanges", sum(len(tasks) for tasks in self.tasks.values()), len(self.tasks))
+        return self
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        self.threads = []
+
+    def run_forever(self):
+        self.start()
+        try:
+            while not self.stop_event.wait(1):
+                pass
+        except KeyboardInterrupt:
+            logger.info("Poller - Interrupted")
+        finally:
+            self.stop()
+
+    def statistics(self):
+        """
+        {(exchange_name, currency_pair): {'Interval', 'Polls', 'TopChanges', 'Errors'}}
+        """
+        return {(task.exchange_name, task.currency_pair): {
+            'Interval': task.interval,
+            'Polls': task.polls,
+            'TopChanges': task.top_changes,
+            'Errors': task.errors,
+        } for tasks in self.tasks.values() for task in tasks}
@@ -0,0 +1,241 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from common import snapshot
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+BALANCE_FIELDS = ('Balance', 'AvailableBalance', 'OpenOrder', 'Pending')
+
+
+def clean_position(balance):
+    # A get_clean_balance entry as floats
+    return {field: float(balance.get(field, 0)) for field in BALANCE_FIELDS}
+
+
+class Portfolio(object):
+    """
+    Balances of every exchange in one table, kept up to date between refreshes by the local order events
+
+    refresh asks every exchange for its balances at once and replaces their rows.
+    In between, on_order_placed, on_fill and on_order_closed move the amounts between
+    available and held by open orders as the exchanges would, so that pre-trade checks
+    (available, can_place) are answered locally. A refresh replaces the local state:
+    events applied while it was in flight are only reflected once the exchange has
+    processed them.
+    The events come from an orders.OrderStore once the portfolio listens to it
+    (order_store.add_listener(portfolio)), or from apply_results for a batch.
+
+    Amounts are floats. Fees are paid in the quoted currency.
+
+    :param exchange: Exchange clients by name (ex: {'Bittrex': Bittrex(...)})
+    :type exchange: dict
+
+    :param currency_pairs: Currency pairs of strategy_config, giving the currencies of each market
+    :type currency_pairs: list
+
+    :param fees: Fee of each exchange as a ratio (ex: {'Bittrex': 0.0025})
+    :type fees: dict
+    """
+    def __init__(self, exchange, currency_pairs, fees=None, max_workers=None):
+        self.exchange = exchange
+        self.fees = fees or {}
+        # (exchange_name, market): (base currency, quoted currency)
+        self.markets = {}
+        for currency_pair in currency_pairs:
+            for book_request in snapshot.pair_exchanges(currency_pair):
+                self.markets[book_request] = (currency_pair['Base_currency'], currency_pair['Quoted_currency'])
+        # (exchange_name, currency): {'Balance', 'AvailableBalance', 'OpenOrder', 'Pending'}
+        self.positions = {}
+        # (exchange_name, order_id): [market, way, remaining quantity, price]
+        self.open_orders = {}
+        # exchange_name: time of the last successful refresh
+        self.refreshed = {}
+        self.errors = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or max(len(exchange), 1))
+
+    def update_exchange(self, exchange_name, balances):
+        # Replace the rows of one exchange with its get_clean_balance answer
+        with self.lock:
+            for key in [key for key in self.positions if key[0] == exchange_name]:
+                del self.positions[key]
+            for currency, balance in balances.items():
+                self.positions[(exchange_name, currency)] = clean_position(balance)
+            self.refreshed[exchange_name] = time.time()
+            self.errors.pop(exchange_name, None)
+
+    def refresh_error(self, exchange_name, error):
+        logger.error("Portfolio - Failed to refresh the balances of %s: %s", exchange_name, error)
+        self.errors[exchange_name] = error
+
+    def refresh(self, exchange_names=None):
+        """
+        Get the balances of every exchange (or of the given ones) concurrently
+
+        An exchange that fails keeps its previous rows, its error is kept in self.errors.
+
+        :return: Exchanges refreshed
+        :rtype : list
+        """
+        exchange_names = list(exchange_names or self.exchange)
+        futures = [(exchange_name, self.executor.submit(self.exchange[exchange_name].get_clean_balance))
+                   for exchange_name in exchange_names]
+        refreshed = []
+        for exchange_name, future in futures:
+            try:
+                self.update_exchange(exchange_name, future.result())
+                refreshed.append(exchange_name)
+            except Exception as e:
+                self.refresh_error(exchange_name, e)
+        return refreshed
+
+    async def refresh_async(self, exchange_names=None):
+        """
+        Same as refresh with the async clients: every get_clean_balance is awaited at once
+        """
+        import asyncio
+        exchange_names = list(exchange_names or self.exchange)
+        results = await asyncio.gather(*[self.exchange[exchange_name].get_clean_balance() for exchange_name in exchange_names],
+                                       return_exceptions=True)
+        refreshed = []
+        for exchange_name, result in zip(exchange_names, results):
+            if isinstance(result, Exception):
+                self.refresh_error(exchange_name, result)
+            else:
+                self.update_exchange(exchange_name, result)
+                refreshed.append(exchange_name)
+        return refreshed
+
+    def balance(self, exchange_name, currency):
+        """
+        {'Balance', 'AvailableBalance', 'OpenOrder', 'Pending'} of a currency on an exchange
+        """
+        with self.lock:
+            position = self.positions.get((exchange_name, currency))
+            return dict(position) if position is not None else clean_position({})
+
+    def available(self, exchange_name, currency):
+        with self.lock:
+            position = self.positions.get((exchange_name, currency))
+            return position['AvailableBalance'] if position is not None else 0.0
+
+    def total(self, currency):
+        """
+        Balance of a currency summed over every exchange
+        """
+        with self.lock:
+            return sum(position['Balance'] for (exchange_name, position_currency), position in self.positions.items()
+                       if position_currency == currency)
+
+    def table(self):
+        """
+        Cross-exchange position table
+
+        :return: {currency: {exchange_name: balance, ..., 'Total': balance}}, see balance
+        :rtype : dict
+        """
+        table = {}
+        with self.lock:
+            for (exchange_name, currency), position in self.positions.items():
+                row = table.setdefault(currency, {'Total': clean_position({})})
+                row[exchange_name] = dict(position)
+                for field in BALANCE_FIELDS:
+                    row['Total'][field] += position[field]
+        return table
+
+    def order_amount(self, exchange_name, market, way, quantity, price):
+        # Currency and amount held by an order: the quoted currency with fees for a Bid, the base currency for an Ask
+        base, quote = self.markets[(exchange_name, market)]
+        if way == 'Bid':
+            return quote, quantity * price * (1 + self.fees.get(exchange_name, 0))
+        return base, quantity
+
+    def can_place(self, exchange_name, market, way, quantity, price):
+        """
+        Whether the available balance covers a limit order
+        """
+        currency, amount = self.order_amount(exchange_name, market, way, float(quantity), float(price))
+        return self.available(exchange_name, currency) >= amount
+
+    def move(self, exchange_name, currency, balance=0.0, available=0.0, open_order=0.0):
+        # Apply a change to a position; call with the lock held
+        position = self.positions.get((exchange_name, currency))
+        if position is None:
+            position = self.positions[(exchange_name, currency)] = clean_position({})
+        position['Balance'] += balance
+        position['AvailableBalance'] += available
+        position['OpenOrder'] += open_order
+
+    def on_order_placed(self, exchange_name, order_id, market, way, quantity, price):
+        """
+        Hold the amount of a new order
+        """
+        if (exchange_name, market) not in self.markets:
+            # Market outside of the configured currency pairs: left to the next refresh
+            logger.debug("Portfolio - Order %s on the unknown market %s of %s", order_id, market, exchange_name)
+            return
+        quantity, price = float(quantity), float(price)
+        currency, amount = self.order_amount(exchange_name, market, way, quantity, price)
+        with self.lock:
+            self.open_orders[(exchange_name, order_id)] = [market, way, quantity, price]
+            self.move(exchange_name, currency, available=-amount, open_order=amount)
+
+    def on_fill(self, exchange_name, order_id, quantity, price):
+        """
+        Apply a (partial) fill of an order placed through on_order_placed, at the given price
+        """
+        quantity, price = float(quantity), float(price)
+        with self.lock:
+            order = self.open_orders.get((exchange_name, order_id))
+            if order is None:
+                logger.warning("Portfolio - Fill of the unknown order %s on %s", order_id, exchange_name)
+                return
+            market, way, remaining, limit = order
+            quantity = min(quantity, remaining)
+            base, quote = self.markets[(exchange_name, market)]
+            fee = self.fees.get(exchange_name, 0)
+            if way == 'Bid':
+                held = quantity * limit * (1 + fee)
+                cost = quantity * price * (1 + fee)
+                self.move(exchange_name, quote, balance=-cost, available=held - cost, open_order=-held)
+                self.move(exchange_name, base, balance=quantity, available=quantity)
+            else:
+                proceeds = quantity * price * (1 - fee)
+                self.move(exchange_name, base, balance=-quantity, open_order=-quantity)
+                self.move(exchange_name, quote, balance=proceeds, available=proceeds)
+            order[2] = remaining - quantity
+            if order[2] <= 0:
+                del self.open_orders[(exchange_name, order_id)]
+
+    def on_order_closed(self, exchange_name, order_id, released=True):
+        """
+        Release what an order still holds, once cancelled or expired
+
+        With released False (an order no longer listed by the exchange, maybe filled) the
+        order is forgotten but its amount stays held: the next refresh settles it.
+        """
+        with self.lock:
+            order = self.open_orders.pop((exchange_name, order_id), None)
+            if order is None or not released:
+                return
+            market, way, remaining, price = order
+            currency, amount = self.order_amount(exchange_name, market, way, remaining, price)
+            self.move(exchange_name, currency, available=amount, open_order=-amount)
+
+    def apply_results(self, results):
+        """
+        Apply the successful orders and cancels of a BatchDispatcher batch
+        """
+        for result in results:
+            if result['Error'] is not None or result['OrderId'] is None:
+                continue
+            if 'Market' in result:
+                self.on_order_placed(result['Exchange'], result['OrderId'], result['Market'], result['Way'],
+                                     result['Quantity'], result['Price'])
+            else:
+                self.on_order_closed(result['Exchange'], result['OrderId'])
+
+    def close(self):
+        self.executor.shutdown()
@@ -0,0 +1,145 @@
+import threading
+import time
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+class TokenBucket(object):
+    """
+    Token bucket refilled at `rate` tokens per second, holding at most `burst` tokens
+    """
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        # A clock read before the last refill adds nothing
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, needed):
+        """
+        Seconds until the bucket holds `needed` tokens
+        """
+        if self.tokens >= needed:
+            return 0.0
+        return (needed - self.tokens) / self.rate
+
+
+class RateLimiter(object):
+    """
+    Client-side request budget of an exchange, split in endpoint classes
+
+    Every request takes a token from the exchange bucket and, when the class has its
+    own limit, from the class bucket.
+    Priorities are enforced with reserves: a class with reserve=n only gets a token
+    while more than n tokens are left in the exchange bucket. Giving market data a
+    reserve keeps that many requests available at any time for orders and cancels.
+
+    :param rate: Sustained requests per second allowed by the exchange
+    :type rate: float
+
+    :param burst: Number of requests that can be sent at once
+    :type burst: int
+
+    :param classes: {class_name: {'reserve': n, 'rate': r, 'burst': b}}, every key being optional,
+        the reserve below the burst of the exchange
+    :type classes: dict
+    """
+    def __init__(self, rate, burst, classes=None, name=''):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.reserves = {}
+        self.class_buckets = {}
+        for class_name, limits in (classes or {}).items():
+            self.reserves[class_name] = limits.get('reserve', 0)
+            # The bucket never holds more than burst tokens: the class would wait forever
+            if self.reserves[class_name] >= burst:
+                raise ValueError("RateLimiter - %s reserve of %s must be below the burst of %s"
+                                 % (class_name, self.reserves[class_name], burst))
+            if 'rate' in limits:
+                self.class_buckets[class_name] = TokenBucket(limits['rate'], limits.get('burst', 1))
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config, name=''):
+        return cls(config['rate'], config['burst'], config.get('classes'), name)
+
+    def take(self, endpoint_class):
+        """
+        Take a token for the endpoint class if the budget allows it
+
+        :return: 0 when the token was taken, else the seconds to wait before retrying
+        :rtype : float
+        """
+        needed = 1 + self.reserves.get(endpoint_class, 0)
+        class_bucket = self.class_buckets.get(endpoint_class)
+        with self.lock:
+            # Read under the lock: refills happen in clock order, even across processes
+            now = time.monotonic()
+            self.bucket.refill(now)
+            wait = self.bucket.wait_time(needed)
+            if class_bucket is not None:
+                class_bucket.refill(now)
+                wait = max(wait, class_bucket.wait_time(1))
+            if wait > 0:
+                return wait
+            self.bucket.tokens -= 1
+            if class_bucket is not None:
+                class_bucket.tokens -= 1
+        return 0.0
+
+    def try_acquire(self, endpoint_class):
+        return self.take(endpoint_class) == 0
+
+    def acquire(self, endpoint_class):
+        """
+        Block until a request of the endpoint class can be sent
+
+        :return: Seconds spent waiting
+        :rtype : float
+        """
+        waited = 0.0
+        wait = self.take(endpoint_class)
+        while wait > 0:
+            logger.debug("%s - Rate limit reached for %s, waiting %.3f seconds", self.name, endpoint_class, wait)
+            time.sleep(wait)
+            waited += wait
+            wait = self.take(endpoint_class)
+        return waited
+
+    async def acquire_async(self, endpoint_class):
+        """
+        Wait without blocking the event loop until a request of the endpoint class can be sent
+
+        :return: Seconds spent waiting
+        :rtype : float
+        """
+        # Imported by the asyncio callers only: the blocking clients start without it
+        import asyncio
+        waited = 0.0
+        wait = self.take(endpoint_class)
+        while wait > 0:
+            logger.debug("%s - Rate limit reached for %s, waiting %.3f seconds", self.name, endpoint_class, wait)
+            await asyncio.sleep(wait)
+            waited += wait
+            wait = self.take(endpoint_class)
+        return waited
+
+    def headroom(self, endpoint_class=None):
+        """
+        Number of requests that can be sent right now, for the endpoint class if given
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.bucket.refill(now)
+            tokens = self.bucket.tokens - self.reserves.get(endpoint_class, 0)
+            class_bucket = self.class_buckets.get(endpoint_class)
+            if class_bucket is not None:
+                class_bucket.refill(now)
+                tokens = min(tokens, class_bucket.tokens)
+        return max(int(tokens), 0)
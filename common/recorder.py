@@ -0,0 +1,357 @@
+from array import array
+import collections
+import math
+import mmap
+import os
+import queue
+import struct
+import sys
+import threading
+import time
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+# Chunk header: magic, byte order marker, number of rows, sequence number, chunk timestamp
+HEADER = struct.Struct('<4sII4xQd')
+MAGIC = b'CBR2'
+# Read back as 0x04030201 from a file written in the other byte order
+BYTE_ORDER_MARK = 0x01020304
+# Header of the chunks written before the byte order marker, still read
+HEADER_V1 = struct.Struct('<4sIQd')
+MAGIC_V1 = b'CBR1'
+# Side column values
+SIDE_BUY = 0
+SIDE_SELL = 1
+SIDES = {'buy': SIDE_BUY, 'sell': SIDE_SELL}
+# Kinds of streams, used as file extension
+BOOK = 'book'
+TRADES = 'trades'
+
+
+def stream_path(directory, exchange_name, currency_pair, kind):
+    safe_pair = ''.join(c if c.isalnum() or c in '-_' else '_' for c in currency_pair)
+    return os.path.join(directory, "%s_%s.%s" % (exchange_name, safe_pair, kind))
+
+
+def little_endian(column):
+    # The files are little-endian whatever the machine
+    if sys.byteorder != 'little':
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column
+
+
+def encode_chunk(sequence, timestamp, timestamps, prices, sizes, sides):
+    """
+    One chunk of a stream file: the header, then the timestamp, price and size float64
+    columns, then the side uint8 column padded to 8 bytes
+    """
+    rows = len(prices)
+    padding = b'\0' * (-rows % 8)
+    return b''.join([
+        HEADER.pack(MAGIC, BYTE_ORDER_MARK, rows, sequence, timestamp),
+        little_endian(timestamps).tobytes(),
+        little_endian(prices).tobytes(),
+        little_endian(sizes).tobytes(),
+        sides.tobytes(),
+        padding])
+
+
+def encode_orderbook(sequence, timestamp, book):
+    # Decimal and fixed-point books are recorded as floats, the columns being written as float64
+    book = book.to_float()
+    for column in (book.buy.prices, book.buy.sizes, book.sell.prices, book.sell.sizes):
+        if getattr(column, 'typecode', None) != 'd':
+            raise TypeError("Recorder - Orderbook columns must be array('d'), not %s" % type(column).__name__)
+    n_buy, n_sell = len(book.buy), len(book.sell)
+    rows = n_buy + n_sell
+    return encode_chunk(
+        sequence,
+        timestamp,
+        array('d', [timestamp]) * rows,
+        book.buy.prices + book.sell.prices,
+        book.buy.sizes + book.sell.sizes,
+        array('B', [SIDE_BUY]) * n_buy + array('B', [SIDE_SELL]) * n_sell)
+
+
+def encode_trades(sequence, timestamp, trades):
+    # trades: [(timestamp, side, price, size), ...]
+    return encode_chunk(
+        sequence,
+        timestamp,
+        array('d', [trade[0] for trade in trades]),
+        array('d', [trade[2] for trade in trades]),
+        array('d', [trade[3] for trade in trades]),
+        array('B', [SIDES[trade[1]] for trade in trades]))
+
+
+class Chunk(object):
+    """
+    Columns of one chunk, as memoryviews on the mapped file (no copy)
+    """
+    __slots__ = ('sequence', 'timestamp', 'timestamps', 'prices', 'sizes', 'sides')
+
+    def __init__(self, sequence, timestamp, timestamps, prices, sizes, sides):
+        self.sequence = sequence
+        self.timestamp = timestamp
+        self.timestamps = timestamps
+        self.prices = prices
+        self.sizes = sizes
+        self.sides = sides
+
+    def __len__(self):
+        return len(self.prices)
+
+    def rows(self):
+        return zip(self.timestamps, self.sides, self.prices, self.sizes)
+
+
+class Reader(object):
+    """
+    Memory-mapped reader of a stream file written by the Recorder
+
+    Chunks are read in place: their columns are memoryviews on the mapping, to be
+    dropped before the reader is closed. On a big-endian machine the columns are
+    byteswapped copies instead. Only complete chunks are returned, so a file being
+    written can be read; self.end is the offset following the last of them.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        size = os.fstat(self.file.fileno()).st_size
+        self.mapping = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        self.view = memoryview(self.mapping) if size else memoryview(b'')
+        self.timestamps = array('d')
+        # Sequence number of the last complete chunk, None for an empty file
+        self.last_sequence = None
+        self.end = 0
+        self.offsets = self.index()
+
+    def header(self, offset):
+        # (header size, rows, sequence, timestamp) of the chunk at offset
+        magic = bytes(self.view[offset:offset + 4])
+        if magic == MAGIC:
+            magic, byte_order_mark, rows, sequence, timestamp = HEADER.unpack_from(self.view, offset)
+            if byte_order_mark != BYTE_ORDER_MARK:
+                raise Exception("Recorder - Unexpected byte order marker %#x in %s at offset %d"
+                                % (byte_order_mark, self.path, offset))
+            return HEADER.size, rows, sequence, timestamp
+        if magic == MAGIC_V1:
+            magic, rows, sequence, timestamp = HEADER_V1.unpack_from(self.view, offset)
+            return HEADER_V1.size, rows, sequence, timestamp
+        raise Exception("Recorder - Corrupted file %s at offset %d" % (self.path, offset))
+
+    def index(self):
+        # Offsets of the complete chunks, their timestamps kept in self.timestamps
+        offsets = []
+        offset, end = 0, len(self.view)
+        while offset + HEADER_V1.size <= end:
+            if bytes(self.view[offset:offset + 4]) == MAGIC and offset + HEADER.size > end:
+                break
+            header_size, rows, sequence, timestamp = self.header(offset)
+            length = header_size + rows * 24 + rows + (-rows % 8)
+            if offset + length > end:
+                break
+            offsets.append(offset)
+            self.timestamps.append(timestamp)
+            self.last_sequence = sequence
+            offset += length
+        self.end = offset
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def chunk(self, index):
+        offset = self.offsets[index]
+        header_size, rows, sequence, timestamp = self.header(offset)
+        start = offset + header_size
+        columns = []
+        for _ in range(3):
+            column = self.view[start:start + 8 * rows].cast('d')
+            columns.append(little_endian(array('d', column)) if sys.byteorder != 'little' else column)
+            start += 8 * rows
+        sides = self.view[start:start + rows]
+        return Chunk(sequence, timestamp, columns[0], columns[1], columns[2], sides)
+
+    def __iter__(self):
+        for index in range(len(self.offsets)):
+            yield self.chunk(index)
+
+    def close(self):
+        self.view.release()
+        if self.mapping is not None:
+            self.mapping.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class TradeCursor(object):
+    """
+    Picks the trades not seen yet in overlapping lists of recent trades
+
+    Trades carry no id: the ones of the latest timestamp seen are counted, so that
+    several fills reported with the same timestamp, even identical ones, are all kept
+    once and only once.
+    """
+    def __init__(self):
+        self.timestamp = -math.inf
+        # Trade: number of times it was seen at self.timestamp
+        self.boundary = collections.Counter()
+
+    def new_trades(self, trades):
+        """
+        :param trades: [(timestamp, side, price, size), ...] in any order
+
+        :return: The trades not returned before, oldest first
+        :rtype : list
+        """
+        trades = sorted(trade for trade in trades if trade[0] >= self.timestamp)
+        if not trades:
+            return []
+        seen = collections.Counter(self.boundary)
+        new_trades = []
+        for trade in trades:
+            if trade[0] == self.timestamp and seen[trade] > 0:
+                seen[trade] -= 1
+            else:
+                new_trades.append(trade)
+        last = trades[-1][0]
+        boundary = collections.Counter(trade for trade in trades if trade[0] == last)
+        self.boundary = self.boundary | boundary if last == self.timestamp else boundary
+        self.timestamp = last
+        return new_trades
+
+
+def open_reader(directory, exchange_name, currency_pair, kind=BOOK):
+    return Reader(stream_path(directory, exchange_name, currency_pair, kind))
+
+
+class Recorder(object):
+    """
+    Append-only recorder of orderbook snapshots and trades, one file per exchange, pair and kind
+
+    record_orderbook and record_trades only queue the data: encoding and writing are
+    done by a background thread, so the polling loop is never blocked on disk. When
+    the queue is full, new records are dropped and counted rather than waited for.
+    An existing file is appended to, its sequence numbers going on from its last
+    complete chunk; an incomplete chunk left by a crash is cut off first.
+
+    :param directory: Directory of the stream files
+    :type directory: str
+    """
+    def __init__(self, directory, max_queue=100000):
+        self.directory = directory
+        self.queue = queue.Queue(max_queue)
+        self.files = {}
+        self.sequences = {}
+        self.recorded = 0
+        self.dropped = 0
+        self.bytes_written = 0
+        self.thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, name="Recorder", daemon=True)
+        self.thread.start()
+        return self
+
+    def put(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def record_orderbook(self, exchange_name, currency_pair, book, timestamp=None):
+        """
+        Queue a snapshot of an OrderBook, its arrays must not be modified afterwards
+
+        A fixedpoint.FixedOrderBook is recorded in floats, in the units of the exchange.
+        """
+        if timestamp is None:
+            timestamp = book.timestamp if book.timestamp is not None else time.time()
+        self.put((BOOK, exchange_name, currency_pair, timestamp, book))
+
+    def record_trades(self, exchange_name, currency_pair, trades, timestamp=None):
+        """
+        Queue trades as returned by clean_trades: [(timestamp, side, price, size), ...]
+        """
+        if not trades:
+            return
+        self.put((TRADES, exchange_name, currency_pair, timestamp if timestamp is not None else time.time(), trades))
+
+    def stream(self, kind, exchange_name, currency_pair):
+        key = (kind, exchange_name, currency_pair)
+        stream_file = self.files.get(key)
+        if stream_file is None:
+            path = stream_path(self.directory, exchange_name, currency_pair, kind)
+            self.sequences[key] = self.resume(path)
+            stream_file = self.files[key] = open(path, 'ab')
+        return key, stream_file
+
+    def resume(self, path):
+        # Next sequence number of an existing file
+        if not os.path.exists(path):
+            return 0
+        with Reader(path) as reader:
+            last_sequence, end = reader.last_sequence, reader.end
+        if end < os.path.getsize(path):
+            logger.warning("Recorder - Cutting the incomplete chunk at the end of %s", path)
+            os.truncate(path, end)
+        return last_sequence + 1 if last_sequence is not None else 0
+
+    def write(self, record):
+        kind, exchange_name, currency_pair, timestamp, data = record
+        key, stream_file = self.stream(kind, exchange_name, currency_pair)
+        if kind == BOOK:
+            chunk = encode_orderbook(self.sequences[key], timestamp, data)
+        else:
+            chunk = encode_trades(self.sequences[key], timestamp, data)
+        stream_file.write(chunk)
+        self.sequences[key] += 1
+        self.bytes_written += len(chunk)
+        self.recorded += 1
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            # Write everything already queued before flushing
+            while record is not None:
+                try:
+                    self.write(record)
+                except Exception as e:
+                    logger.error("Recorder - Failed to write %s %s on %s: %s", record[0], record[2], record[1], e)
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            for stream_file in self.files.values():
+                stream_file.flush()
+            if record is None:
+                break
+
+    def stop(self):
+        """
+        Write what is queued and close the files
+        """
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+        for stream_file in self.files.values():
+            stream_file.close()
+        self.files = {}
+
+    def statistics(self):
+        return {
+            'Recorded': self.recorded,
+            'Dropped': self.dropped,
+            'Queued': self.queue.qsize(),
+            'BytesWritten': self.bytes_written,
+        }
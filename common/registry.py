@@ -0,0 +1,83 @@
+import importlib
+import threading
+from common import snapshot
+
+# Exchange name: (module, class, asyncio module, asyncio class), imported on first use only
+EXCHANGES = {
+    'Gatecoin': ('gatecoin.gatecoin', 'Gatecoin', 'gatecoin.gatecoin_async', 'AsyncGatecoin'),
+    'Bittrex': ('bittrex.bittrex', 'Bittrex', 'bittrex.bittrex_async', 'AsyncBittrex'),
+    'Liqui': ('liqui.liqui', 'Liqui', 'liqui.liqui_async', 'AsyncLiqui'),
+}
+
+# (exchange name, asynchronous): class already imported
+classes = {}
+lock = threading.Lock()
+
+
+def register(exchange_name, module, class_name, async_module=None, async_class_name=None):
+    """
+    Declare an exchange client, an adapter.ExchangeAdapter subclass, without importing it
+
+    :param module: Module of the client (ex: 'bittrex.bittrex')
+    :type module: str
+    """
+    with lock:
+        EXCHANGES[exchange_name] = (module, class_name, async_module, async_class_name)
+        classes.pop((exchange_name, False), None)
+        classes.pop((exchange_name, True), None)
+
+
+def exchange_class(exchange_name, asynchronous=False):
+    """
+    Client class of an exchange, its module being imported on the first call
+    """
+    exchange_client_class = classes.get((exchange_name, asynchronous))
+    if exchange_client_class is not None:
+        return exchange_client_class
+    if exchange_name not in EXCHANGES:
+        raise Exception("Registry - Unknown exchange: " + str(exchange_name))
+    module, class_name, async_module, async_class_name = EXCHANGES[exchange_name]
+    if asynchronous:
+        if async_module is None:
+            raise Exception("Registry - No asyncio client for " + exchange_name)
+        module, class_name = async_module, async_class_name
+    with lock:
+        exchange_client_class = getattr(importlib.import_module(module), class_name)
+        classes[(exchange_name, asynchronous)] = exchange_client_class
+    return exchange_client_class
+
+
+def referenced_exchanges(currency_pairs):
+    """
+    Names of the exchanges quoting at least one of the currency pairs, in configuration order
+    """
+    exchange_names = []
+    for exchange_name, currency_pair in snapshot.snapshot_requests(currency_pairs):
+        if exchange_name not in exchange_names:
+            exchange_names.append(exchange_name)
+    return exchange_names
+
+
+def rate_limits(exchange_names):
+    """
+    Default rate limits of each exchange, see ratelimit.RateLimiter
+    """
+    return {exchange_name: exchange_class(exchange_name).default_rate_limits for exchange_name in exchange_names}
+
+
+def create_exchanges(config, exchange_names, asynchronous=False, **kwargs):
+    """
+    Create the clients of the given exchanges, importing only their modules
+
+    :param config: Module or object holding the credentials of each exchange as an attribute
+        named after it in lower case (ex: strategy_config.bittrex)
+    :param kwargs: Passed to every client (ex: order_store, metrics, session)
+
+    :return: Exchange clients by name
+    :rtype : dict
+    """
+    exchange = {}
+    for exchange_name in exchange_names:
+        exchange[exchange_name] = exchange_class(exchange_name, asynchronous).from_config(
+            getattr(config, exchange_name.lower()), **kwargs)
+    return exchange
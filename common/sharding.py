@@ -0,0 +1,413 @@
+from array import array
+from multiprocessing import shared_memory
+import multiprocessing
+import struct
+import time
+from common import orderbook
+from common import ratelimit
+from common import snapshot
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+# Slot of a book in a TopOfBookTable: sequence, timestamp, best bid price and size, best ask price and size
+SEQUENCE = struct.Struct('<Q')
+LEVELS = struct.Struct('<5d')
+SLOT_SIZE = SEQUENCE.size + LEVELS.size
+# Price of an empty side
+EMPTY = float('nan')
+
+
+class TopOfBookTable(object):
+    """
+    Best bid and ask of every book in shared memory, written by the workers and read by the coordinator
+
+    Each book has a fixed slot, written by a single process and protected by a sequence
+    lock: the sequence is odd while the slot is written, and a reader retries until it
+    sees the same even sequence before and after copying the levels. Readers never
+    block the writer and nothing is pickled.
+    The table is created by the coordinator (name=None) and attached by name in the
+    workers, every process passing the same book_requests so that the slots match.
+
+    :param book_requests: (exchange_name, currency_pair) books, in slot order
+    :type book_requests: list
+    """
+    def __init__(self, book_requests, name=None):
+        self.book_requests = list(book_requests)
+        self.slots = {book_request: i * SLOT_SIZE for i, book_request in enumerate(self.book_requests)}
+        self.owner = name is None
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner,
+                                                 size=max(len(self.book_requests), 1) * SLOT_SIZE)
+        self.name = self.memory.name
+        self.buffer = self.memory.buf
+        if self.owner:
+            self.buffer[:] = bytes(len(self.buffer))
+
+    def write_levels(self, book_request, timestamp, bid_price, bid_size, ask_price, ask_size):
+        offset = self.slots[book_request]
+        buffer = self.buffer
+        sequence = SEQUENCE.unpack_from(buffer, offset)[0]
+        SEQUENCE.pack_into(buffer, offset, sequence + 1)
+        LEVELS.pack_into(buffer, offset + SEQUENCE.size, timestamp, bid_price, bid_size, ask_price, ask_size)
+        SEQUENCE.pack_into(buffer, offset, sequence + 2)
+
+    def write(self, book_request, book, timestamp=None):
+        """
+        Publish the top of an OrderBook
+        """
+        bid = book.best_bid or (EMPTY, 0.0)
+        ask = book.best_ask or (EMPTY, 0.0)
+        if timestamp is None:
+            timestamp = book.timestamp if book.timestamp is not None else time.time()
+        self.write_levels(book_request, timestamp, bid[0], bid[1], ask[0], ask[1])
+
+    def read(self, book_request):
+        """
+        Consistent copy of the slot of a book
+
+        :return: (sequence, timestamp, bid price, bid size, ask price, ask size), sequence 0 when never written
+        :rtype : tuple
+        """
+        offset = self.slots[book_request]
+        buffer = self.buffer
+        while True:
+            sequence = SEQUENCE.unpack_from(buffer, offset)[0]
+            if not sequence & 1:
+                levels = LEVELS.unpack_from(buffer, offset + SEQUENCE.size)
+                if SEQUENCE.unpack_from(buffer, offset)[0] == sequence:
+                    return (sequence,) + levels
+            # Written right now: let the writer finish
+            time.sleep(0)
+
+    def sequences(self):
+        """
+        Sequence of every book, in slot order: a book changed when its sequence did
+        """
+        buffer = self.buffer
+        return [SEQUENCE.unpack_from(buffer, offset)[0] for offset in self.slots.values()]
+
+    def orderbooks(self):
+        """
+        One-level OrderBook of every book written at least once
+
+        :return: {(exchange_name, currency_pair): OrderBook}
+        :rtype : dict
+        """
+        books = {}
+        for book_request in self.book_requests:
+            sequence, timestamp, bid_price, bid_size, ask_price, ask_size = self.read(book_request)
+            if not sequence:
+                continue
+            book = orderbook.OrderBook(timestamp=timestamp)
+            # NaN prices mark an empty side
+            if bid_price == bid_price:
+                book.buy = orderbook.BookSide(array('d', [bid_price]), array('d', [bid_size]), descending=True)
+            if ask_price == ask_price:
+                book.sell = orderbook.BookSide(array('d', [ask_price]), array('d', [ask_size]))
+            books[book_request] = book
+        return books
+
+    def close(self):
+        """
+        Detach from the table, and free it in the process that created it
+        """
+        self.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+class SharedTokenBucket(ratelimit.TokenBucket):
+    """
+    TokenBucket whose tokens and last refill time are two values of an array shared by processes
+    """
+    def __init__(self, state, index, rate, burst):
+        self.state = state
+        self.index = index
+        self.rate = float(rate)
+        self.burst = float(burst)
+
+    @property
+    def tokens(self):
+        return self.state[self.index]
+
+    @tokens.setter
+    def tokens(self, tokens):
+        self.state[self.index] = tokens
+
+    @property
+    def updated(self):
+        return self.state[self.index + 1]
+
+    @updated.setter
+    def updated(self, updated):
+        self.state[self.index + 1] = updated
+
+
+class SharedRateLimiter(ratelimit.RateLimiter):
+    """
+    RateLimiter taking its tokens from buckets shared by every worker process, see SharedBudget
+    """
+    def __init__(self, rate, burst, classes, name, state, index, lock):
+        super().__init__(rate, burst, classes, name)
+        self.bucket = SharedTokenBucket(state, index, rate, burst)
+        for class_name in sorted(self.class_buckets):
+            index += 2
+            limits = classes[class_name]
+            self.class_buckets[class_name] = SharedTokenBucket(state, index, limits['rate'], limits.get('burst', 1))
+        self.lock = lock
+
+
+class SharedBudget(object):
+    """
+    Request budget of every exchange, shared by the worker processes
+
+    The token buckets live in a shared array guarded by a process lock: the workers
+    together never send more requests than the rate limits of an exchange allow.
+    Pass the budget to the workers when they are created, then give their clients
+    the limiter of their exchange (see rate_limiter).
+
+    :param rate_limits: Rate limits of each exchange, see registry.rate_limits
+    :type rate_limits: dict
+    """
+    def __init__(self, rate_limits, context=None):
+        context = context or multiprocessing.get_context()
+        self.rate_limits = rate_limits
+        # exchange_name: index of its exchange bucket, followed by its class buckets by name
+        self.indexes = {}
+        buckets = []
+        for exchange_name in sorted(rate_limits):
+            config = rate_limits[exchange_name]
+            self.indexes[exchange_name] = 2 * len(buckets)
+            buckets.append(config['burst'])
+            classes = config.get('classes') or {}
+            buckets.extend(classes[class_name].get('burst', 1) for class_name in sorted(classes) if 'rate' in classes[class_name])
+        # tokens, last refill time of each bucket
+        now = time.monotonic()
+        self.state = context.RawArray('d', [value for burst in buckets for value in (float(burst), now)])
+        self.lock = context.Lock()
+
+    def rate_limiter(self, exchange_name):
+        config = self.rate_limits[exchange_name]
+        return SharedRateLimiter(config['rate'], config['burst'], config.get('classes'), exchange_name,
+                                 self.state, self.indexes[exchange_name], self.lock)
+
+
+def split_pairs(currency_pairs, workers):
+    """
+    Split the books of the currency pairs across workers
+
+    Pairs are given to the worker with the fewest books so far, the pairs quoted on the
+    most exchanges first. A book needed by several pairs is polled by one worker only.
+
+    :return: (exchange_name, currency_pair) books of each worker, workers without books left out
+    :rtype : list
+    """
+    shards = [[] for _ in range(max(workers, 1))]
+    owned = set()
+    for currency_pair in sorted(currency_pairs, key=lambda pair: len(snapshot.pair_exchanges(pair)), reverse=True):
+        book_requests = [book_request for book_request in snapshot.pair_exchanges(currency_pair) if book_request not in owned]
+        if not book_requests:
+            continue
+        shard = min(shards, key=len)
+        shard.extend(book_requests)
+        owned.update(book_requests)
+    return [shard for shard in shards if shard]
+
+
+def shard_exchanges(book_requests):
+    """
+    Names of the exchanges of the books of a shard, in order of first appearance
+    """
+    return list(dict.fromkeys(exchange_name for exchange_name, currency_pair in book_requests))
+
+
+def use_shared_budget(exchange, budget):
+    """
+    Replace the rate limiters of the clients by the shared ones of their exchange
+    """
+    for exchange_name, exchange_client in exchange.items():
+        if exchange_name in budget.rate_limits:
+            exchange_client.rate_limiter = budget.rate_limiter(exchange_name)
+            # Report the headroom of the limiter actually used
+            if getattr(exchange_client, 'metrics', None) is not None:
+                exchange_client.metrics.watch_rate_limiter(exchange_name, exchange_client.rate_limiter)
+
+
+def worker_exchanges(book_requests, budget):
+    """
+    Clients of a worker: those of trading_bot.create_exchanges for the exchanges of its books only,
+    drawing from the shared budget
+    """
+    # Imported here: trading_bot runs the coordinator
+    import trading_bot
+    exchange = trading_bot.create_exchanges(exchange_names=shard_exchanges(book_requests))
+    use_shared_budget(exchange, budget)
+    return exchange
+
+
+def run_worker(worker_index, book_requests, table_name, all_book_requests, budget, stop_event, config):
+    """
+    Body of a worker process: poll its books with its own clients and publish their top in the table
+
+    The clients are those of worker_exchanges.
+
+    :param config: {'Workers', 'PollMinInterval', 'PollMaxInterval', 'RecordDirectory', 'Once'}
+    :type config: dict
+    """
+    # Imported here: trading_bot runs the coordinator
+    import trading_bot
+    from common import poller
+    from common import recorder
+
+    listener = trading_bot.setup_logging('_worker%d' % worker_index)
+    exchange = worker_exchanges(book_requests, budget)
+    table = TopOfBookTable(all_book_requests, table_name)
+    book_recorder = None
+    if config['RecordDirectory']:
+        book_recorder = recorder.Recorder(config['RecordDirectory']).start()
+    logger.info("Worker %d - Polling %d orderbooks", worker_index, len(book_requests))
+
+    def on_update(exchange_name, currency_pair, update, book):
+        table.write((exchange_name, currency_pair), book)
+        if book_recorder is not None:
+            book_recorder.record_orderbook(exchange_name, currency_pair, book)
+
+    book_poller = None
+    try:
+        if config['Once']:
+            books = snapshot.fetch_orderbooks(exchange, book_requests)
+            for book_request, book in books.orderbooks.items():
+                table.write(book_request, book, books.timestamp)
+                if book_recorder is not None:
+                    book_recorder.record_orderbook(book_request[0], book_request[1], book, books.timestamp)
+        else:
+            # The shared budget is split between the workers
+            book_poller = poller.AdaptivePoller(
+                exchange,
+                book_requests,
+                min_interval=config['PollMinInterval'],
+                max_interval=config['PollMaxInterval'],
+                budget_share=0.5 / config['Workers'],
+                on_update=on_update).start()
+            stop_event.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if book_poller is not None:
+            book_poller.stop()
+        if book_recorder is not None:
+            book_recorder.stop()
+        table.close()
+        listener.stop()
+
+
+class ShardedRunner(object):
+    """
+    Run the strategy over worker processes, each polling a share of the currency pairs
+
+    JSON decoding and book normalization are spread over several interpreters. Each
+    worker has its own exchange clients, all drawing from a SharedBudget, and publishes
+    the top of its books in a TopOfBookTable. The coordinator (this process) scans the
+    table for arbitrage whenever a top of book moved: the depth walk of the scanner is
+    limited to the best level.
+
+    :param scanner: arbitrage.Scanner over all the currency pairs
+    :type scanner: Scanner
+
+    :param rate_limits: Rate limits of each exchange, see SharedBudget
+    :type rate_limits: dict
+    """
+    def __init__(self, currency_pairs, scanner, rate_limits, workers=None, poll_min_interval=0.5, poll_max_interval=30,
+                 record_directory=None, scan_interval=0.05):
+        self.scanner = scanner
+        self.scan_interval = scan_interval
+        self.shards = split_pairs(currency_pairs, workers or multiprocessing.cpu_count())
+        self.book_requests = [book_request for shard in self.shards for book_request in shard]
+        # Fresh interpreters: no lock or thread of this process is inherited
+        self.context = multiprocessing.get_context('spawn')
+        self.budget = SharedBudget(rate_limits, self.context)
+        self.config = {
+            'Workers': len(self.shards),
+            'PollMinInterval': poll_min_interval,
+            'PollMaxInterval': poll_max_interval,
+            'RecordDirectory': record_directory,
+            'Once': False,
+        }
+        self.table = None
+        self.stop_event = self.context.Event()
+        self.processes = []
+
+    def share_budget(self, exchange):
+        """
+        Make the clients of the coordinator (orders, cancels, balance refreshes) draw from the budget of the workers
+        """
+        use_shared_budget(exchange, self.budget)
+
+    def start_worker(self, worker_index):
+        process = self.context.Process(
+            target=run_worker,
+            args=(worker_index, self.shards[worker_index], self.table.name, self.book_requests, self.budget,
+                  self.stop_event, self.config),
+            name="Worker-%d" % worker_index,
+            daemon=True)
+        process.start()
+        return process
+
+    def start(self, once=False):
+        self.config['Once'] = once
+        self.stop_event.clear()
+        self.table = TopOfBookTable(self.book_requests)
+        self.processes = [self.start_worker(worker_index) for worker_index in range(len(self.shards))]
+        logger.info("Sharding - %d orderbooks split over %d workers", len(self.book_requests), len(self.shards))
+        return self
+
+    def scan(self):
+        opportunities = self.scanner.scan(self.table.orderbooks(), time.time())
+        for opportunity in opportunities:
+            logger.info("Arbitrage opportunity: %s", opportunity)
+        return opportunities
+
+    def run(self, once=False):
+        """
+        Start the workers and scan the shared tops of book until interrupted
+
+        With once, every worker fetches its books one time and the table is scanned when they are done.
+
+        :return: Opportunities of the last scan
+        :rtype : list
+        """
+        self.start(once)
+        opportunities = []
+        try:
+            if once:
+                for process in self.processes:
+                    process.join()
+                return self.scan()
+            sequences = self.table.sequences()
+            while True:
+                time.sleep(self.scan_interval)
+                current = self.table.sequences()
+                if current != sequences:
+                    sequences = current
+                    opportunities = self.scan()
+                for worker_index, process in enumerate(self.processes):
+                    if not process.is_alive():
+                        logger.error("Sharding - Worker %d exited with code %s, restarting it", worker_index, process.exitcode)
+                        self.processes[worker_index] = self.start_worker(worker_index)
+        except KeyboardInterrupt:
+            logger.info("Sharding - Interrupted")
+        finally:
+            self.stop()
+        return opportunities
+
+    def stop(self, timeout=10):
+        self.stop_event.set()
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.processes = []
+        if self.table is not None:
+            self.table.close()
+            self.table = None
@@ -0,0 +1,47 @@
+import hmac
+
+
+class Signer(object):
+    """
+    HMAC keyed once with the API secret, copied for every message
+
+    Copying the keyed state skips the key setup (two hash blocks) done by each hmac.new.
+
+    :param secret: API secret
+    :type secret: str
+
+    :param digestmod: hashlib constructor or name (ex: hashlib.sha512)
+    """
+    def __init__(self, secret, digestmod):
+        self.keyed = hmac.new(secret.encode(), digestmod=digestmod)
+
+    def digest(self, message):
+        signature = self.keyed.copy()
+        signature.update(message)
+        return signature.digest()
+
+    def hexdigest(self, message):
+        signature = self.keyed.copy()
+        signature.update(message)
+        return signature.hexdigest()
+
+    def digest_many(self, messages):
+        """
+        Signatures of several messages, in the same order
+        """
+        keyed = self.keyed
+        signatures = []
+        for message in messages:
+            signature = keyed.copy()
+            signature.update(message)
+            signatures.append(signature.digest())
+        return signatures
+
+    def hexdigest_many(self, messages):
+        keyed = self.keyed
+        signatures = []
+        for message in messages:
+            signature = keyed.copy()
+            signature.update(message)
+            signatures.append(signature.hexdigest())
+        return signatures
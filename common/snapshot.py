@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+class Snapshot(object):
+    """
+    Orderbooks of several (exchange, currency pair) captured in one go
+
+    All the books share the same capture timestamp: the moment the requests were
+    dispatched. `duration` is the wall-clock time until the slowest venue answered.
+    """
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+        self.duration = 0
+        # {(exchange_name, currency_pair): orderbook}
+        self.orderbooks = {}
+        # {(exchange_name, currency_pair): seconds spent on this book}
+        self.latencies = {}
+        # {(exchange_name, currency_pair): exception}
+        self.errors = {}
+
+    def add(self, book_request, orderbook, error, latency):
+        self.latencies[book_request] = latency
+        if error is not None:
+            logger.error("Snapshot - Failed to get the orderbook %s on %s: %s", book_request[1], book_request[0], error)
+            self.errors[book_request] = error
+        else:
+            self.orderbooks[book_request] = orderbook
+
+    def __getitem__(self, key):
+        return self.orderbooks[key]
+
+    def __contains__(self, key):
+        return key in self.orderbooks
+
+
+def pair_exchanges(currency_pair):
+    """
+    (exchange_name, currency_pair) books quoting a configured currency pair
+
+    Uses the optional 'Exchanges' entry ({exchange_name: currency_pair}) of the
+    configuration, else the Primary and Secondary exchanges.
+    """
+    if 'Exchanges' in currency_pair:
+        return list(currency_pair['Exchanges'].items())
+    return [(currency_pair[way + '_exchange'], currency_pair[way + '_exchange_currencypair']) for way in ['Primary', 'Secondary']]
+
+
+def snapshot_requests(currency_pairs):
+    """
+    List the distinct (exchange_name, currency_pair) books needed by the strategy configuration
+    """
+    book_requests = []
+    for currency_pair in currency_pairs:
+        for book_request in pair_exchanges(currency_pair):
+            if book_request not in book_requests:
+                book_requests.append(book_request)
+    return book_requests
+
+
+def fetch_orderbooks(exchange, book_requests, max_workers=None):
+    """
+    Fetch every requested clean orderbook in parallel
+
+    :param exchange: Exchange clients by name (ex: {'Bittrex': Bittrex(...)})
+    :type exchange: dict
+
+    :param book_requests: (exchange_name, currency_pair) tuples to fetch
+    :type book_requests: list
+
+    :param max_workers: Number of threads, default is one per book
+    :type max_workers: int
+
+    :return: Orderbooks captured with a common timestamp
+    :rtype : Snapshot
+    """
+    if not max_workers:
+        max_workers = max(len(book_requests), 1)
+
+    def fetch(book_request):
+        exchange_name, currency_pair = book_request
+        start = time.time()
+        try:
+            orderbook = exchange[exchange_name].clean_orderbook(currency_pair)
+            return orderbook, None, time.time() - start
+        except Exception as e:
+            return None, e, time.time() - start
+
+    snapshot = Snapshot(time.time())
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(fetch, book_requests)
+        for book_request, result in zip(book_requests, results):
+            snapshot.add(book_request, *result)
+    snapshot.duration = time.time() - snapshot.timestamp
+
+    logger.info("Snapshot - %d orderbooks captured in %.3f seconds", len(snapshot.orderbooks), snapshot.duration)
+    return snapshot
+
+
+async def fetch_orderbooks_async(exchange, book_requests):
+    """
+    Fetch every requested clean orderbook concurrently with asyncio exchange clients
+
+    Same as fetch_orderbooks, the exchange clients being the asyncio variants
+    (ex: {'Bittrex': AsyncBittrex(...)}).
+    """
+    # Imported by the asyncio callers only: the blocking clients start without it
+    import asyncio
+
+    async def fetch(book_request):
+        exchange_name, currency_pair = book_request
+        start = time.time()
+        try:
+            orderbook = await exchange[exchange_name].clean_orderbook(currency_pair)
+            return orderbook, None, time.time() - start
+        except Exception as e:
+            return None, e, time.time() - start
+
+    snapshot = Snapshot(time.time())
+    results = await asyncio.gather(*[fetch(book_request) for book_request in book_requests])
+    for book_request, result in zip(book_requests, results):
+        snapshot.add(book_request, *result)
+    snapshot.duration = time.time() - snapshot.timestamp
+
+    logger.info("Snapshot - %d orderbooks captured in %.3f seconds", len(snapshot.orderbooks), snapshot.duration)
+    return snapshot
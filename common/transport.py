@@ -0,0 +1,45 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default connection pool and retry settings shared by the exchange clients
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.3
+# Gateway errors worth a retry: the request did not reach the matching engine
+RETRY_STATUS = (502, 503, 504)
+
+
+def create_session(pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES, backoff_factor=DEFAULT_BACKOFF_FACTOR):
+    """
+    Create a keep-alive HTTP session with a connection pool and a retry policy
+
+    Connections to a host are reused across requests, so only the first request
+    pays for the TCP and TLS handshakes.
+    Only idempotent methods (GET, PUT, DELETE...) are retried: a POST placing an
+    order is never sent twice.
+
+    :param pool_size: Number of connections kept open per host
+    :type pool_size: int
+
+    :param max_retries: Number of retries on connection errors and gateway errors
+    :type max_retries: int
+
+    :param backoff_factor: Sleep between retries is backoff_factor * 2 ** (retry - 1)
+    :type backoff_factor: float
+
+    :return: Session to use in place of the module-level requests functions
+    :rtype : requests.Session
+    """
+    retry = Retry(
+        total=max_retries,
+        read=0,
+        status_forcelist=RETRY_STATUS,
+        backoff_factor=backoff_factor,
+        raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
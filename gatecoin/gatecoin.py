@@ -1,11 +1,12 @@
 from urllib.parse import urlencode as _urlencode
-from collections import OrderedDict
 import json
 import time
 import base64
 import hashlib
-import hmac
-import requests
+from common import adapter
+from common import fixedpoint
+from common import orderbook
+from common import signing
 import decimal
 # logger
 import logging
@@ -13,26 +14,61 @@ logger = logging.getLogger("TradingBot")
 
 sleep_time_in_second = 5
 
-
-class Gatecoin(object):
-
-    def __init__(self, url, key, secret, timeout=10, json_nums=decimal.Decimal):
-
+URL = 'https://api.gatecoin.com'
+
+# Client-side request budget: requests per second, requests at once and endpoint classes.
+# The reserves keep requests available for the trading endpoints (see ratelimit.RateLimiter)
+RATE_LIMITS = {
+    'rate': 5,
+    'burst': 10,
+    'classes': {
+        'Trade': {'reserve': 0},
+        'Balance': {'reserve': 2},
+        'Public': {'reserve': 4},
+        'Reference': {'reserve': 4},
+    },
+}
+
+# Commands answering public market data, decoded with the market data number type
+PUBLIC_PREFIXES = ('/Public/', '/Reference/')
+
+# Time-to-live in seconds of the cached responses, by command prefix
+CACHE_TTLS = {
+    '/Public/LiveTicker': 5,
+    '/Public/TickerHistory/': 60,
+    '/Reference/': 3600,
+}
+
+
+class Gatecoin(adapter.ExchangeAdapter):
+    """
+    Used for requesting Gatecoin with API key and API secret
+
+    Transport, rate limiting, caching and metrics: see adapter.ExchangeAdapter
+    """
+    name = 'Gatecoin'
+    default_rate_limits = RATE_LIMITS
+    default_cache_ttls = CACHE_TTLS
+
+    def __init__(self, url, key, secret, timeout=10, json_nums=decimal.Decimal, market_data_nums=float, **kwargs):
+        adapter.ExchangeAdapter.__init__(self, timeout=timeout, json_nums=json_nums, market_data_nums=market_data_nums, **kwargs)
         # URL
         self.url = url
         # Nonce
         self._nonce = 0
-        # Logger
-        self.logger = logger
-        # json number datatypes
-        self.jsonNums = json_nums
-        # Grab keys, set timeout, ditch coach?
-        self.key, self.secret, self.timeout = \
-            key, secret, timeout
-        # Set time labels
-        self.MINUTE, self.HOUR, self.DAY, self.WEEK, self.MONTH, self.YEAR = \
-            60, 60 * 60, 60 * 60 * 24, 60 * 60 * 24 * \
-            7, 60 * 60 * 24 * 30, 60 * 60 * 24 * 365
+        # Grab keys
+        self.key, self.secret = key, secret
+        # HMAC keyed once with the secret, and the static part of the message and headers of each method
+        self.signer = signing.Signer(secret or '', hashlib.sha256)
+        self.signing_contexts = {}
+        for method in ('Post', 'Put', 'Get', 'Delete'):
+            content_type = '' if method == 'Get' else 'application/json'
+            self.signing_contexts[method] = ((method + url).lower(), content_type,
+                                             {'API_PUBLIC_KEY': key, 'Content-Type': content_type})
+
+    @classmethod
+    def from_config(cls, config, **kwargs):
+        return cls(config.get('url', URL), config['public'], config['private'], **kwargs)
 
     @property
     def nonce(self):
@@ -40,125 +76,114 @@ class Gatecoin(object):
         return str(self._nonce)
 
     def __call__(self, method, command, args={}):
-        if not self.key or not self.secret:
-            raise Exception("A Key and Secret needed!")
+        return self.cached((method, command, _urlencode(args)), self.cache_ttl(method, command),
+                           self.query, method, command, args)
 
-        # Signature generation
-        method_name = method
-        if method == 'Get':
-            content_type = ''
-        else:
-            content_type = 'application/json'
+    def cache_ttl(self, method, command):
+        # Time-to-live of the cached responses of a command, None when it is not cached
+        if method != 'Get':
+            return None
+        for prefix, ttl in self.cache_ttls.items():
+            if command.startswith(prefix):
+                return ttl
+        return None
 
-        now = self.nonce
+    def query(self, method, command, args={}):
+        # Uncached query
+        self.require_credentials(self.key, self.secret)
+        return self.send(self.endpoint_class(command), self.endpoint_name(command), command.startswith(PUBLIC_PREFIXES),
+                         self.sign_request, method, command, args)
 
-        message_to_encrypt = method_name + self.url + command + content_type + now
-        message_to_encrypt = message_to_encrypt.lower()
-        signature = hmac.new(self.secret.encode(), msg=message_to_encrypt.encode(), digestmod=hashlib.sha256).digest()
-        signature_base64 = base64.b64encode(signature, altchars=None)
+    def sign_request(self, method, command, args={}):
+        """
+        Build the signed request as (HTTP method, url, body, headers)
 
-        headers = {
-            'API_PUBLIC_KEY': self.key,
-            'API_REQUEST_SIGNATURE': signature_base64,
-            'API_REQUEST_DATE': now,
-            'Content-Type': content_type
-        }
+        Shared by the blocking client and the asyncio one.
+        """
+        request, message = self.prepare_request(method, command, args)
+        return self.signed(request, self.signer.digest(message))
 
-        successful = False
-        if method == 'Post':
-            data = json.dumps(args)
-            logger.debug("Gatecoin - Request Post: %s with %s", self.url + command, data)
-            response = requests.post(
-                self.url + command,
-                data=data,
-                headers=headers,
-                timeout=self.timeout)
-            successful = True
-        # put
-        elif method == 'Put':
+    def prepare_request(self, method, command, args={}):
+        # Unsigned request and the message to sign
+        if method not in self.signing_contexts:
+            raise self.invalid("Invalid Command!: " + command)
+
+        # Signature of (method + url + command + content type + date), lower-cased
+        prefix, content_type, static_headers = self.signing_contexts[method]
+        now = self.nonce
+        message_to_encrypt = prefix + command.lower() + content_type + now
+
+        headers = dict(static_headers)
+        # Filled by signed, in its place
+        headers['API_REQUEST_SIGNATURE'] = None
+        headers['API_REQUEST_DATE'] = now
+
+        # post, put
+        if method in ('Post', 'Put'):
+            url = self.url + command
             data = json.dumps(args)
-            logger.debug("Gatecoin - Request Put: %s with %s", self.url + command, data)
-            response = requests.put(
-                self.url + command,
-                data=data,
-                headers=headers,
-                timeout=self.timeout)
-            successful = True
-        # get
-        elif method == 'Get':
-            logger.debug("Gatecoin - Request Get: %s", self.url + command + _urlencode(args))
-            response = requests.get(
-                self.url + command + _urlencode(args),
-                headers=headers,
-                timeout=self.timeout)
-            successful = True
-        # Delete
-        elif method == 'Delete':
-            logger.debug("Gatecoin - Request Delete: %s", self.url + _urlencode(args))
-            response = requests.delete(
-                self.url + command + _urlencode(args),
-                headers=headers,
-                timeout=self.timeout)
-            successful = True
+            logger.debug("Gatecoin - Request %s: %s with %s", method, url, data)
+        # get, delete
         else:
-            raise Exception("Gatecoin - Invalid Command!: " + command)
+            url = self.url + command + _urlencode(args)
+            data = None
+            logger.debug("Gatecoin - Request %s: %s", method, url)
 
-        if successful is False or response is None:
-            logger.error("Gatecoin - Request not succesful" )
-            raise Exception("Gatecoin - Request not succesful")
+        return (method.upper(), url, data, headers), message_to_encrypt.encode()
 
-        if response.status_code != 200:
-            logger.error("Gatecoin - Response error: HTTP " + str(response.status_code) + " returned with the content " + str(response.text) + ".")
-            raise Exception("Gatecoin - Response error: HTTP " + str(response.status_code) + " returned with the content " + str(response.text) + ".")
+    @staticmethod
+    def signed(request, signature):
+        request[3]['API_REQUEST_SIGNATURE'] = base64.b64encode(signature).decode()
+        return request
 
-        # decode json
-        if not self.jsonNums:
-            response_json = json.loads(response.text, parse_float=str)
-        else:
-            response_json = json.loads(
-                response.text,
-                parse_float=self.jsonNums,
-                parse_int=self.jsonNums)
+    def sign_many(self, requests):
+        """
+        Sign several requests at once, their messages digested in one batch
 
+        :param requests: (method, command, args) tuples
+        :type requests: list
 
-        if response_json['responseStatus']['message'] != 'OK':
-            logger.error("Gatecoin - Response contains a functional error: " + str(response_json))
-            raise Exception("Gatecoin - Response contains a functional error: " + str(response_json))
+        :return: (HTTP method, url, body, headers) of each request, see sign_request
+        :rtype : list
+        """
+        prepared = [self.prepare_request(*request) for request in requests]
+        signatures = self.signer.digest_many([message for _, message in prepared])
+        return [self.signed(request, signature) for (request, _), signature in zip(prepared, signatures)]
+
+    def check_response(self, response_json, public):
+        return response_json['responseStatus']['message'] == 'OK'
 
-        # check if gatecoin returned an error
-        # Commented as it should be case specific error handling
-        #if 'error' in response_json:
-        #    raise Exception(response_json['error'])
+    def endpoint_class(self, command):
+        # Rate limit class of a command: '/Trade/Orders' -> 'Trade'
+        return command.split('/')[1]
 
-        return response_json
+    def endpoint_name(self, command):
+        # Metrics name of a command, without its parameters: '/Public/MarketDepth/ETHBTC' -> '/Public/MarketDepth'
+        return '/'.join(command.split('?')[0].split('/')[:3])
 
     # --BALANCE SECTION-------------------------------------------------------
     def get_balances(self):
         """
         Get the available balance for each currency for the logged in account
         """
-        self.current_rate['Balance'].append(time.time())
         return self.__call__('Get', '/Balance/Balances')
 
     def get_balance(self, currency):
         """
         Get the available balance for s currency for the logged in account
         """
-        self.current_rate['Balance'].append(time.time())
         return self.__call__('Get', '/Balance/Balances/' + str(currency))
 
     def get_balance_deposits(self):
         """
         Get all account deposits, including wire, okpay and digital currency, of the logged in user
         """
-        self.current_rate['Balance'].append(time.time())
         return self.__call__('Get', '/Balance/Deposits')
 
     def get_balance_withdrawals(self):
         """
         Get all account deposits, including wire, okpay and digital currency, of the logged in user
         """
-        self.current_rate['Balance'].append(time.time())
         return self.__call__('Get', '/Balance/Withdrawals')
 
     # --TRADE SECTION-------------------------------------------------------
@@ -166,7 +191,6 @@ class Gatecoin(object):
         """
         Get open orders for the logged in trader
         """
-        self.current_rate['Trade'].append(time.time())
         logger.debug("Gatecoin - Get all open orders")
         return self.__call__('Get', '/Trade/Orders')
 
@@ -174,20 +198,23 @@ class Gatecoin(object):
         """
         Get open orders for the logged in trader
         """
-        self.current_rate['Trade'].append(time.time())
-        logger.debug("Gatecoin - Placed a limit " + str(way) + " order on " + str(code) + " with quantity: " + str(amount) + " and price " + str(price))
-        return self.__call__('Post', '/Trade/Orders', {
+        logger.debug("Gatecoin - Placed a limit %s order on %s with quantity: %s and price %s", way, code, amount, price)
+        response = self.__call__('Post', '/Trade/Orders', self.limit_order_args(code, way, amount, price))
+        self.record_order(code, way, amount, price, response)
+        return response
+
+    def limit_order_args(self, code, way, amount, price):
+        return {
             'Code': str(code),
             'Way': str(way),
             'Amount': str(amount),
             'Price': str(price),
-        })
+        }
 
     def delete_orders(self):
         """
         Cancel all existing orders
         """
-        self.current_rate['Trade'].append(time.time())
         logger.debug("Gatecoin - Deleted all open orders")
         return self.__call__('Delete', '/Trade/Orders')
 
@@ -195,30 +222,36 @@ class Gatecoin(object):
         """
         Cancel an existing order
         """
-        self.current_rate['Trade'].append(time.time())
-        logger.debug("Gatecoin - Deleted order " + str(order_id))
+        logger.debug("Gatecoin - Deleted order %s", order_id)
         return self.__call__('Delete', '/Trade/Orders/' + str(order_id))
 
+    def cancel_order(self, order_id):
+        # Same name on every exchange client
+        response = self.delete_order(order_id)
+        self.record_cancel(order_id)
+        return response
+
+    def order_id(self, response):
+        # Exchange order id from the response of place_limit_order
+        return response['clOrderId']
+
     def get_order(self, order_id):
         """
         Get an existing order
         """
-        self.current_rate['Trade'].append(time.time())
-        logger.debug("Gatecoin - Get order " + str(order_id))
+        logger.debug("Gatecoin - Get order %s", order_id)
         return self.__call__('Get', '/Trade/Orders/' + str(order_id))
 
     def get_trades(self, count=0):
         """
         Get all transactions of logged in user
         """
-        self.current_rate['Trade'].append(time.time())
         return self.__call__('Get', '/Trade/Trades?Count=' + str(count))
 
     def get_usertrades(self, after):
         """
         Get all transactions of logged in user
         """
-        self.current_rate['Trade'].append(time.time())
         return self.__call__('Get', '/Trade/UserTrades/' + str(after))
 
     # --PUBLIC SECTION-------------------------------------------------------
@@ -240,6 +273,12 @@ class Gatecoin(object):
         """
         return self.__call__('Get', '/Public/TransactionsHistory/' + str(currency_pair))
 
+    def get_currency_pairs(self):
+        """
+        Get the currency pairs traded and their price decimal places
+        """
+        return self.__call__('Get', '/Reference/CurrencyPairs')
+
     def get_liveticker(self):
         """
         Get live ticker for all currency
@@ -257,7 +296,7 @@ class Gatecoin(object):
         Get live ticker by currency
         """
         if timeframe not in ['1m', '15m', '1h', '6h', '24h']:
-            raise Exception('Incorrect parameters: timeframe in get_public_ticker_history')
+            raise self.invalid('Incorrect parameters: timeframe in get_public_ticker_history')
 
         return self.__call__('Get', '/Public/TickerHistory/' + str(currency) + '/' + str(timeframe))
 
@@ -277,26 +316,41 @@ class Gatecoin(object):
             balances[balance_currency['currency']]['Pending'] = balance_currency['pendingIncoming'] - balance_currency['pendingOutgoing']
         return balances
 
-    def clean_orderbook(self, currency_pair):
-        # Output a cleaned dictionnary:
-        # {'buy': {Price: Amount, Price: Amount, ...},
-        # 'sell' {Price: Amount, Price: Amount, ...}}
-
-        raw_orderbook = self.get_orderbook(currency_pair)
-
-        orderbook_unordered = {'buy': {}, 'sell': {}}
-        orderbook_cleaned = {'buy': {}, 'sell': {}}
-
-        for buy in raw_orderbook['bids']:
-            quantity = buy['volume']
-            price = buy['price']
-            orderbook_unordered['buy'][price] = quantity
-        orderbook_cleaned['buy'] = OrderedDict(sorted(orderbook_unordered['buy'].items(), key=lambda t: t[0], reverse=True))
-
-        for sell in raw_orderbook['asks']:
-            quantity = sell['volume']
-            price = sell['price']
-            orderbook_unordered['sell'][price] = quantity
-        orderbook_cleaned['sell'] = OrderedDict(sorted(orderbook_unordered['sell'].items(), key=lambda t: t[0]))
-
-        return orderbook_cleaned
+    def parse_orderbook(self, raw_orderbook, currency_pair):
+        # Extract the unsorted (Price, Amount) bid and ask levels from a raw orderbook
+        bids = [(buy['price'], buy['volume']) for buy in raw_orderbook['bids']]
+        asks = [(sell['price'], sell['volume']) for sell in raw_orderbook['asks']]
+        return bids, asks
+
+    def get_market_metadata(self):
+        return self.get_currency_pairs()
+
+    def parse_market_scales(self, raw_markets):
+        # Extract {code: PairScale} from CurrencyPairs: prices have priceDecimalPlaces decimals, quantities 8
+        return {pair['tradingCode']: fixedpoint.PairScale(pair['priceDecimalPlaces'], fixedpoint.DEFAULT_PLACES)
+                for pair in raw_markets['currencyPairs']}
+
+    def parse_open_orders(self, raw_orders):
+        # Extract the open orders as [{'OrderId', 'Market', 'Way', 'Quantity', 'Remaining', 'Price'}, ...]
+        return [{'OrderId': order['clOrderId'],
+                 'Market': order['code'],
+                 'Way': 'Bid' if order['side'] == 0 else 'Ask',
+                 'Quantity': order['initialQuantity'],
+                 'Remaining': order['remainingQuantity'],
+                 'Price': order['price']} for order in raw_orders['orders']]
+
+    def clean_open_orders(self):
+        raw_orders = self.get_open_orders()
+        return self.parse_open_orders(raw_orders)
+
+    def parse_trades(self, raw_trades):
+        # Extract the trades as [(Timestamp, Way, Price, Quantity), ...],
+        # Way being the side of the taker: 'buy' or 'sell'
+        return [(float(trade['transactionTime']),
+                 orderbook.BUY if trade['way'].lower() == 'bid' else orderbook.SELL,
+                 float(trade['price']),
+                 float(trade['quantity'])) for trade in raw_trades['transactions']]
+
+    def clean_trades(self, currency_pair):
+        raw_trades = self.get_transactions(currency_pair)
+        return self.parse_trades(raw_trades)
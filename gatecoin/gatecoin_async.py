@@ -0,0 +1,41 @@
+from common import aio
+from gatecoin import gatecoin
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+class AsyncGatecoin(aio.AsyncClient, gatecoin.Gatecoin):
+    """
+    Gatecoin client for asyncio: every public method returns an awaitable
+
+    Signing and response handling are the ones of gatecoin.Gatecoin, the request pipeline
+    is the one of aio.AsyncClient: requests go through an aiohttp connection pool that
+    can be shared between clients.
+    """
+    def __init__(self, url, key, secret, async_session=None, connection_limit=aio.DEFAULT_CONNECTION_LIMIT, **kwargs):
+        gatecoin.Gatecoin.__init__(self, url, key, secret, **kwargs)
+        aio.AsyncClient.__init__(self, async_session, connection_limit)
+
+    async def place_limit_order(self, code, way, amount, price):
+        logger.debug("Gatecoin - Placed a limit %s order on %s with quantity: %s and price %s", way, code, amount, price)
+        response = await self.__call__('Post', '/Trade/Orders', self.limit_order_args(code, way, amount, price))
+        self.record_order(code, way, amount, price, response)
+        return response
+
+    async def cancel_order(self, order_id):
+        response = await self.delete_order(order_id)
+        self.record_cancel(order_id)
+        return response
+
+    async def clean_open_orders(self):
+        raw_orders = await self.get_open_orders()
+        return self.parse_open_orders(raw_orders)
+
+    async def get_clean_balance(self):
+        raw_balance = await self.get_balances()
+        return self.clean_balances(raw_balance)
+
+    async def clean_trades(self, currency_pair):
+        raw_trades = await self.get_transactions(currency_pair)
+        return self.parse_trades(raw_trades)
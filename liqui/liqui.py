@@ -1,10 +1,9 @@
 from urllib.parse import urlencode
-from collections import OrderedDict
-import json
 import time
 import hashlib
-import hmac
-import requests
+from common import adapter
+from common import fixedpoint
+from common import signing
 import decimal
 
 # logger
@@ -14,144 +13,160 @@ logger = logging.getLogger("TradingBot")
 BASE_URL_PUBLIC = 'https://api.liqui.io/api/3/'
 BASE_URL_PRIVATE = 'https://api.liqui.io/tapi'
 
+TRADE_SET = {'trade', 'cancelOrder'}
 
-class Liqui(object):
+NO_ORDERS = 'no orders'
+
+# Client-side request budget: requests per second, requests at once and endpoint classes.
+# The reserves keep requests available for the trading endpoints (see ratelimit.RateLimiter)
+RATE_LIMITS = {
+    'rate': 2,
+    'burst': 10,
+    'classes': {
+        'Trade': {'reserve': 0},
+        'Account': {'reserve': 2},
+        'Public': {'reserve': 4},
+    },
+}
+
+# Time-to-live in seconds of the cached public responses, by command
+CACHE_TTLS = {
+    'info': 3600,
+    'ticker': 5,
+}
+
+
+class Liqui(adapter.ExchangeAdapter):
     """
     Used for requesting Liqui with API key and API secret
+
+    Transport, rate limiting, caching and metrics: see adapter.ExchangeAdapter
     """
-    def __init__(self, api_key, api_secret, json_nums=decimal.Decimal, timeout=10):
+    name = 'Liqui'
+    default_rate_limits = RATE_LIMITS
+    default_cache_ttls = CACHE_TTLS
+
+    def __init__(self, api_key, api_secret, json_nums=decimal.Decimal, timeout=10, market_data_nums=float, **kwargs):
+        adapter.ExchangeAdapter.__init__(self, timeout=timeout, json_nums=json_nums, market_data_nums=market_data_nums, **kwargs)
         # Keys
         self.api_key = str(api_key) if api_key is not None else ''
         self.api_secret = str(api_secret) if api_secret is not None else ''
-        # Logger
-        self.logger = logger
-        # json number datatypes
-        self.jsonNums = json_nums
-        # Set time-out
-        self.timeout = timeout
-        # Set time labels
-        self.MINUTE, self.HOUR, self.DAY, self.WEEK, self.MONTH, self.YEAR = \
-            60, 60 * 60, 60 * 60 * 24, 60 * 60 * 24 * \
-            7, 60 * 60 * 24 * 30, 60 * 60 * 24 * 365
+        # HMAC keyed once with the secret
+        self.signer = signing.Signer(self.api_secret, hashlib.sha512)
 
     @property
     def nonce(self):
         self._nonce = int(time.time())
         return str(self._nonce)
 
-    def __public__(self, method, command, args=[]):
+    def __public__(self, method, command, args=''):
+        return self.cached((method, command, args), self.cache_ttls.get(command), self.public_query, method, command, args)
 
-        data = args
-        # get
-        if method == 'Get':
-            request_url = BASE_URL_PUBLIC + command + "/" + data
-            logger.debug("Liqui - Request Get: %s", request_url)
-            response = requests.get(
-                request_url,
-                timeout=self.timeout)
-
-            if response is None:
-                logger.error("Liqui - Request not succesful" )
-                raise Exception("Liqui - Request not succesful")
-
-            if response.status_code != 200:
-                logger.error("Liqui - Response error: HTTP " + str(response.status_code) + " returned with the content " + str(response.text) + ".")
-                raise Exception("Liqui - Response error: HTTP " + str(response.status_code) + " returned.")
-
-            # decode json
-            if not self.jsonNums:
-                response_json = json.loads(response.text, parse_float=str)
-            else:
-                response_json = json.loads(
-                    response.text,
-                    parse_float=self.jsonNums,
-                    parse_int=self.jsonNums)
-
-            if 'success' in response_json and response_json['success'] != 1:
-                logger.error("Liqui - Response contains a functional error: " + str(response_json))
-                raise Exception("Liqui - Response contains a functional error: " + str(response_json))
+    def public_query(self, method, command, args=''):
+        # Uncached public query
+        if method != 'Get':
+            raise self.invalid("Invalid method: " + method)
+        return self.send('Public', command, True, self.public_request, command, args)
 
-        else:
-            raise Exception("Liqui - Invalid method: " + method)
+    def __private__(self, method, command, args={}):
+        self.require_credentials(self.api_key, self.api_secret)
 
-        logger.debug("Liqui - Response content: " + str(response_json))
+        if method not in ('Post', 'Get'):
+            raise self.invalid("Invalid method: " + method)
 
-        return response_json;
+        return self.send(self.endpoint_class(command), command, False, self.sign_request, method, command, args)
 
-    def __private__(self, method, command, args={}):
+    def endpoint_class(self, command):
+        # Rate limit class of a private command: Trade or Account
+        return 'Trade' if command in TRADE_SET else 'Account'
+
+    def public_url(self, command, args):
+        request_url = BASE_URL_PUBLIC + command
+        if args:
+            request_url += "/" + args
+        logger.debug("Liqui - Request Get: %s", request_url)
+        return request_url
+
+    def public_request(self, command, args):
+        # Public requests are not signed
+        return 'GET', self.public_url(command, args), None, None
 
-        if not self.api_key or not self.api_secret:
-            raise Exception("A Key and Secret needed!")
+    def sign_request(self, method, command, args={}):
+        """
+        Build the signed private request as (HTTP method, url, body, headers)
 
+        Shared by the blocking client and the asyncio one.
+        """
+        data = self.request_data(command, args)
+        return self.signed(method, command, data, self.signer.hexdigest(data.encode()))
+
+    def request_data(self, command, args={}):
+        # Urlencoded parameters of a private request, which are also the message signed
+        args = dict(args)
         args['method'] = command
         args['nonce'] = self.nonce
-        data = urlencode(args)
-        signature = hmac.new(self.api_secret.encode(), msg=data.encode(), digestmod=hashlib.sha512).hexdigest()
+        return urlencode(args)
 
+    def signed(self, method, command, data, signature):
         headers = {
             'Key': self.api_key,
             'Sign': signature,
         }
 
-        successful = False
         if method == 'Post':
             request_url = BASE_URL_PRIVATE
-            logger.debug("Liqui - Request Post: %s with %s", request_url + command, data)
-            response = requests.post(
-                request_url,
-                data=data,
-                headers=headers,
-                timeout=self.timeout)
-            successful = True
+            logger.debug("Liqui - Request Post: %s%s with %s", request_url, command, data)
+            return 'POST', request_url, data, headers
         # get
-        elif method == 'Get':
-            request_url = BASE_URL_PUBLIC
-            logger.debug("Liqui - Request Get: %s", request_url + command + urlencode(args))
-            response = requests.get(
-                request_url,
-                headers=headers,
-                timeout=self.timeout)
-            successful = True
-        else:
-            raise Exception("Liqui - Invalid method: " + method)
-
-        if successful is False or response is None:
-            logger.error("Liqui - Request not succesful" )
-            raise Exception("Liqui - Request not succesful")
-
-        if response.status_code != 200:
-            logger.error("Liqui - Response error: HTTP " + str(response.status_code) + " returned with the content " + str(response.text) + ".")
-            raise Exception("Liqui - Response error: HTTP " + str(response.status_code) + " returned.")
-
-        # decode json
-        if not self.jsonNums:
-            response_json = json.loads(response.text, parse_float=str)
-        else:
-            response_json = json.loads(
-                response.text,
-                parse_float=self.jsonNums,
-                parse_int=self.jsonNums)
-
-        logger.debug("Liqui - Response content: " + str(response_json))
-
-        if response_json['success'] != 1:
-            logger.error("Liqui - Response contains a functional error: " + str(response_json))
-            raise Exception("Liqui - Response contains a functional error: " + str(response_json))
-
-        return response_json;
+        request_url = BASE_URL_PUBLIC
+        logger.debug("Liqui - Request Get: %s%s%s", request_url, command, data)
+        return 'GET', request_url, None, headers
+
+    def sign_many(self, requests):
+        """
+        Sign several private requests at once, their parameters digested in one batch
+
+        :param requests: (method, command, args) tuples
+        :type requests: list
+
+        :return: (HTTP method, url, body, headers) of each request, see sign_request
+        :rtype : list
+        """
+        data = [self.request_data(*request[1:]) for request in requests]
+        signatures = self.signer.hexdigest_many([request_data.encode() for request_data in data])
+        return [self.signed(request[0], request[1], request_data, signature)
+                for request, request_data, signature in zip(requests, data, signatures)]
+
+    def check_response(self, response_json, public):
+        # ActiveOrders answers an error when there is no open order
+        if not public and response_json.get('error') == NO_ORDERS:
+            response_json['success'], response_json['return'] = 1, {}
+
+        # public responses only carry a success flag on errors
+        return (public and 'success' not in response_json) or response_json['success'] == 1
+
+    def get_market_info(self):
+        """
+        Get the trading rules of every pair: decimal places, min price, min amount, fee
+        """
+        return self.__public__("Get", "info")
+
+    def get_ticker(self, market):
+        return self.__public__("Get", "ticker", market)
 
     def get_orderbook(self, market):
-        logger.debug("Liqui - Get orderbook for " + str(market))
+        logger.debug("Liqui - Get orderbook for %s", market)
         return self.__public__("Get", "depth", market)
 
     def place_limit_order(self, market, way, quantity, price):
         if way == 'Ask':
-            self.sell_limit(market, quantity, price)
+            response = self.sell_limit(market, quantity, price)
         elif way == 'Bid':
-            self.buy_limit(market, quantity, price)
+            response = self.buy_limit(market, quantity, price)
         else:
-            logger.error("Liqui - Unknown order way " + str(way))
-            raise Exception("Liqui - Unknown order way " + str(way))
+            raise self.invalid("Unknown order way " + str(way))
+        self.record_order(market, way, quantity, price, response)
+        return response
 
     def buy_limit(self, market, quantity, rate):
         order = {
@@ -160,7 +175,7 @@ class Liqui(object):
             'rate' : rate,
             'amount': quantity
         }
-        logger.debug("Liqui - Placed a limit Buy order on " + str(market) + " with quantity: " + str(quantity) + " and price " + str(rate))
+        logger.debug("Liqui - Placed a limit Buy order on %s with quantity: %s and price %s", market, quantity, rate)
         return self.__private__("Post", 'trade', order)
 
     def sell_limit(self, market, quantity, rate):
@@ -170,12 +185,41 @@ class Liqui(object):
             'rate' : rate,
             'amount': quantity
         }
-        logger.debug("Liqui - Placed a limit Sell order on " + str(market) + " with quantity: " + str(quantity) + " and price " + str(rate))
+        logger.debug("Liqui - Placed a limit Sell order on %s with quantity: %s and price %s", market, quantity, rate)
         return self.__private__("Post", 'trade', order)
 
+    def cancel_order(self, order_id):
+        logger.debug("Liqui - Cancel order %s", order_id)
+        response = self.__private__("Post", 'cancelOrder', {'order_id': order_id})
+        self.record_cancel(order_id)
+        return response
+
+    def order_id(self, response):
+        # Exchange order id from the response of place_limit_order: 0 when the order was filled at once
+        order_id = response['return']['order_id']
+        return order_id if order_id else None
+
     def get_info(self):
         return self.__private__("Post", 'getInfo')
 
+    def get_active_orders(self, market=None):
+        # {order_id: {'pair', 'type', 'amount', 'rate', ...}} under 'return', every pair when no market is given
+        return self.__private__("Post", 'ActiveOrders', {'pair': market} if market else {})
+
+    def parse_open_orders(self, raw_orders):
+        # Extract the open orders as [{'OrderId', 'Market', 'Way', 'Quantity', 'Remaining', 'Price'}, ...],
+        # the initial quantity being unknown
+        return [{'OrderId': int(order_id),
+                 'Market': order['pair'],
+                 'Way': 'Bid' if order['type'] == 'buy' else 'Ask',
+                 'Quantity': order['amount'],
+                 'Remaining': order['amount'],
+                 'Price': order['rate']} for order_id, order in raw_orders['return'].items()]
+
+    def clean_open_orders(self, market=None):
+        raw_orders = self.get_active_orders(market)
+        return self.parse_open_orders(raw_orders)
+
     def get_balances(self):
         funds = self.get_info()['return']['funds']
         return {currency: balance for currency, balance in funds.items() if balance != 0}
@@ -183,41 +227,47 @@ class Liqui(object):
     def get_clean_balance(self):
         balances = {}
         raw_balance = self.get_balances()
-        balances = self.clean_balances(raw_balance)
+        raw_orders = self.get_active_orders()
+        balances = self.clean_balances(raw_balance, raw_orders)
         return balances
 
-    def clean_balances(self, raw_balances):
+    def clean_balances(self, raw_balances, raw_orders=None):
+        # getInfo funds are the available balances: the amounts held by the open orders are added back
+        open_orders = {}
+        if raw_orders is not None:
+            for order in raw_orders['return'].values():
+                base, quote = order['pair'].upper().split('_')
+                if order['type'] == 'sell':
+                    open_orders[base] = open_orders.get(base, 0) + order['amount']
+                else:
+                    open_orders[quote] = open_orders.get(quote, 0) + order['amount'] * order['rate']
+
         balances = {}
         for balance_currency in raw_balances:
             currency = balance_currency.upper()
+            open_order = open_orders.pop(currency, 0)
             balances[currency] = {}
-            balances[currency]['Balance'] = 0
+            balances[currency]['Balance'] = raw_balances[balance_currency] + open_order
             balances[currency]['AvailableBalance'] = raw_balances[balance_currency]
-            balances[currency]['OpenOrder'] = 0
+            balances[currency]['OpenOrder'] = open_order
             balances[currency]['Pending'] = 0
+        # Currencies entirely held by open orders
+        for currency, open_order in open_orders.items():
+            balances[currency] = {'Balance': open_order, 'AvailableBalance': 0, 'OpenOrder': open_order, 'Pending': 0}
         return balances
 
-    def clean_orderbook(self, market):
-        # Output a cleaned dictionnary:
-        # {'buy': {Price: Amount, Price: Amount, ...},
-        # 'sell' {Price: Amount, Price: Amount, ...}}
-
-        raw_orderbook = self.get_orderbook(market)
+    def parse_orderbook(self, raw_orderbook, market):
+        # Extract the unsorted (Price, Amount) bid and ask levels from a raw orderbook
         raw_orderbook = raw_orderbook[market]
 
-        orderbook_unordered = {'buy': {}, 'sell': {}}
-        orderbook_cleaned = {'buy': {}, 'sell': {}}
-
-        for buy in raw_orderbook['bids']:
-            quantity = buy[1]
-            price = buy[0]
-            orderbook_unordered['buy'][price] = quantity
-        orderbook_cleaned['buy'] = OrderedDict(sorted(orderbook_unordered['buy'].items(), key=lambda t: t[0], reverse=True))
+        bids = [(buy[0], buy[1]) for buy in raw_orderbook['bids']]
+        asks = [(sell[0], sell[1]) for sell in raw_orderbook['asks']]
+        return bids, asks
 
-        for sell in raw_orderbook['asks']:
-            quantity = sell[1]
-            price = sell[0]
-            orderbook_unordered['sell'][price] = quantity
-        orderbook_cleaned['sell'] = OrderedDict(sorted(orderbook_unordered['sell'].items(), key=lambda t: t[0]))
+    def get_market_metadata(self):
+        return self.get_market_info()
 
-        return orderbook_cleaned
+    def parse_market_scales(self, raw_markets):
+        # Extract {market: PairScale} from info: prices have decimal_places decimals, amounts 8
+        return {market: fixedpoint.PairScale(rules['decimal_places'], fixedpoint.DEFAULT_PLACES)
+                for market, rules in raw_markets['pairs'].items()}
@@ -0,0 +1,46 @@
+from common import aio
+from liqui import liqui
+# logger
+import logging
+logger = logging.getLogger("TradingBot")
+
+
+class AsyncLiqui(aio.AsyncClient, liqui.Liqui):
+    """
+    Liqui client for asyncio: every public method returns an awaitable
+
+    Signing and response handling are the ones of liqui.Liqui, the request pipeline
+    is the one of aio.AsyncClient: requests go through an aiohttp connection pool that
+    can be shared between clients.
+    """
+    def __init__(self, api_key, api_secret, async_session=None, connection_limit=aio.DEFAULT_CONNECTION_LIMIT, **kwargs):
+        liqui.Liqui.__init__(self, api_key, api_secret, **kwargs)
+        aio.AsyncClient.__init__(self, async_session, connection_limit)
+
+    async def place_limit_order(self, market, way, quantity, price):
+        if way == 'Ask':
+            response = await self.sell_limit(market, quantity, price)
+        elif way == 'Bid':
+            response = await self.buy_limit(market, quantity, price)
+        else:
+            raise self.invalid("Unknown order way " + str(way))
+        self.record_order(market, way, quantity, price, response)
+        return response
+
+    async def cancel_order(self, order_id):
+        response = await self.__private__("Post", 'cancelOrder', {'order_id': order_id})
+        self.record_cancel(order_id)
+        return response
+
+    async def clean_open_orders(self, market=None):
+        raw_orders = await self.get_active_orders(market)
+        return self.parse_open_orders(raw_orders)
+
+    async def get_balances(self):
+        funds = (await self.get_info())['return']['funds']
+        return {currency: balance for currency, balance in funds.items() if balance != 0}
+
+    async def get_clean_balance(self):
+        raw_balance = await self.get_balances()
+        raw_orders = await self.get_active_orders()
+        return self.clean_balances(raw_balance, raw_orders)
@@ -5,6 +5,11 @@ liqui = {'public': 'PublicKey', 'private': 'PrivateKey'}
 
 one_bp_in_pourcent = 10000
 
+# Taker fee of each exchange, as a ratio
+fees = {'Gatecoin': 0.0035, 'Bittrex': 0.0025, 'Liqui': 0.0025}
+# Arbitrage opportunities below this net spread (in bp) are ignored
+min_spread_bps = 5
+
 currency_pairs = []
 ETHBTC = {
     'Name': 'ETH/BTC',
@@ -14,5 +19,47 @@ ETHBTC = {
     'Secondary_exchange': 'Bittrex',
     'Secondary_exchange_currencypair': 'BTC-ETH',
     'Primary_exchange_currencypair': 'ETHBTC',
+    # Optional: every exchange quoting the pair, for the arbitrage scanner
+    'Exchanges': {'Gatecoin': 'ETHBTC', 'Bittrex': 'BTC-ETH', 'Liqui': 'eth_btc'},
 }
 currency_pairs.append(ETHBTC)
+
+# Fetch all the orderbooks in parallel instead of one exchange after the other
+concurrent_snapshot = True
+
+# Keep polling every orderbook instead of running a single cycle
+daemon = False
+# Bounds of the adaptive poll interval of each orderbook, in seconds
+poll_min_interval = 0.5
+poll_max_interval = 30
+# Seconds between two polls of the trades of each currency pair, None to poll the orderbooks only
+trade_poll_interval = None
+# Updates waiting for each consumer of the market data bus (see common/bus.py), the scanner only keeps the latest books
+bus_queue_size = 1000
+
+# Unix socket of the market data gateway shared by the local bots (python3 -m common.gateway), the daemon then
+# reads the orderbooks from it instead of polling the exchanges. None to poll them.
+gateway_socket = None
+
+# Worker processes polling a share of the currency pairs each (see common/sharding.py), 1 to run in this process.
+# The workers share the rate limits of the exchanges and publish the top of their books to this process.
+workers = 1
+
+# Directory where the orderbooks and trades are recorded (see common/recorder.py), None to disable
+record_directory = None
+
+# Seconds between two reconciliations of the orders placed by the clients with the open orders of the exchanges,
+# each followed by a refresh of the balance table (see common/orders.py and common/portfolio.py), None to disable
+order_reconcile_interval = None
+
+# Request metrics (see common/metrics.py): port of the pull endpoint http://127.0.0.1:<port>/metrics
+# and seconds between two dumps in the log, None to disable
+metrics_port = None
+metrics_dump_interval = None
+
+# Logging (see common/logs.py): level, size of a log file before rotation, number of rotated files kept,
+# and one response body logged out of log_response_sample at DEBUG level (0 to never log them)
+log_level = 'INFO'
+log_max_bytes = 50 * 1024 * 1024
+log_backup_count = 10
+log_response_sample = 100
@@ -0,0 +1,18 @@
+import pytest
+from bittrex import bittrex
+from bittrex import bittrex_async
+from common import adapter
+
+
+def test_clients_implement_every_abstract_endpoint():
+    class Partial(adapter.ExchangeAdapter):
+        def get_orderbook(self, market):
+            return {}
+
+    with pytest.raises(TypeError):
+        Partial()
+    assert bittrex.Bittrex('Key', 'Secret').session is not None
+
+
+def test_async_clients_have_no_requests_session():
+    assert bittrex_async.AsyncBittrex('Key', 'Secret').session is None
@@ -0,0 +1,188 @@
+import asyncio
+import decimal
+import pytest
+from bittrex import bittrex
+from bittrex import bittrex_async
+from common import adapter
+from common import orders
+from gatecoin import gatecoin
+from gatecoin import gatecoin_async
+from liqui import liqui
+from liqui import liqui_async
+
+NOW = 1500000000.25
+RATE_LIMITS = {'rate': 1000, 'burst': 1000}
+OK = b'"responseStatus": {"message": "OK"}'
+
+# Canned answers: the first fragment found in "METHOD url body" picks the content
+BITTREX = [
+    ('getorderbook', b'{"success": true, "result": {"buy": [{"Quantity": 2, "Rate": 0.0841}, {"Quantity": 1.5, "Rate": 0.084}], '
+                     b'"sell": [{"Quantity": 0.25, "Rate": 0.0843}]}}'),
+    ('getbalances', b'{"success": true, "result": [{"Currency": "BTC", "Balance": 1.1, "Available": 1, "Pending": 0.1}]}'),
+    ('getopenorders', b'{"success": true, "result": [{"OrderUuid": "u1", "Exchange": "BTC-ETH", "OrderType": "LIMIT_BUY", '
+                      b'"Quantity": 2, "QuantityRemaining": 1.5, "Limit": 0.05}]}'),
+    ('getmarkethistory', b'{"success": true, "result": [{"TimeStamp": "2017-07-14T02:40:00.25", "OrderType": "BUY", '
+                         b'"Price": 0.05, "Quantity": 1}]}'),
+    ('buylimit', b'{"success": true, "result": {"uuid": "u2"}}'),
+    ('cancel', b'{"success": true, "result": null}'),
+]
+GATECOIN = [
+    ('/Public/MarketDepth/', b'{"bids": [{"price": 0.05, "volume": 1}], "asks": [{"price": 0.051, "volume": 2}], ' + OK + b'}'),
+    ('/Public/Transactions/', b'{"transactions": [{"transactionTime": "1500000000", "way": "bid", "price": 0.05, '
+                              b'"quantity": 1}], ' + OK + b'}'),
+    ('/Balance/Balances', b'{"balances": [{"currency": "BTC", "balance": 1.5, "availableBalance": 1, "openOrder": 0.5, '
+                          b'"pendingIncoming": 0, "pendingOutgoing": 0}], ' + OK + b'}'),
+    ('DELETE ', b'{' + OK + b'}'),
+    ('POST ', b'{"clOrderId": "BK2", ' + OK + b'}'),
+    ('/Trade/Orders', b'{"orders": [{"clOrderId": "BK1", "code": "ETHBTC", "side": 0, "initialQuantity": 2, '
+                      b'"remainingQuantity": 1, "price": 0.05}], ' + OK + b'}'),
+]
+LIQUI = [
+    ('depth/eth_btc', b'{"eth_btc": {"asks": [[0.051, 2]], "bids": [[0.05, 1], [0.0505, 3]]}}'),
+    ('method=getInfo', b'{"success": 1, "return": {"funds": {"btc": 1.5, "eth": 0}}}'),
+    ('method=ActiveOrders', b'{"success": 1, "return": {"12": {"pair": "eth_btc", "type": "buy", "amount": 1, "rate": 0.05}}}'),
+    ('method=trade', b'{"success": 1, "return": {"received": 0, "remains": 1.5, "order_id": 13}}'),
+    ('method=cancelOrder', b'{"success": 1, "return": {"order_id": 13}}'),
+]
+
+VENUES = [
+    ('Bittrex', BITTREX, lambda cls, **kwargs: cls('key', 'secret', **kwargs), bittrex.Bittrex, bittrex_async.AsyncBittrex, [
+        ('clean_orderbook', ('BTC-ETH',)),
+        ('get_clean_balance', ()),
+        ('clean_open_orders', ('BTC-ETH',)),
+        ('clean_trades', ('BTC-ETH', 1)),
+        ('place_limit_order', ('BTC-ETH', 'Bid', decimal.Decimal('1.5'), decimal.Decimal('0.05'))),
+        ('cancel_order', ('u2',)),
+    ]),
+    ('Gatecoin', GATECOIN, lambda cls, **kwargs: cls(gatecoin.URL, 'key', 'secret', **kwargs), gatecoin.Gatecoin,
+     gatecoin_async.AsyncGatecoin, [
+        ('clean_orderbook', ('ETHBTC',)),
+        ('get_clean_balance', ()),
+        ('clean_open_orders', ()),
+        ('clean_trades', ('ETHBTC',)),
+        ('place_limit_order', ('ETHBTC', 'Bid', decimal.Decimal('1.5'), decimal.Decimal('0.05'))),
+        ('cancel_order', ('BK2',)),
+    ]),
+    ('Liqui', LIQUI, lambda cls, **kwargs: cls('key', 'secret', **kwargs), liqui.Liqui, liqui_async.AsyncLiqui, [
+        ('clean_orderbook', ('eth_btc',)),
+        ('get_clean_balance', ()),
+        ('clean_open_orders', ('eth_btc',)),
+        ('place_limit_order', ('eth_btc', 'Bid', decimal.Decimal('1.5'), decimal.Decimal('0.05'))),
+        ('cancel_order', (13,)),
+    ]),
+]
+
+
+def answer(routes, method, url, data):
+    request = "%s %s %s" % (method, url, data or '')
+    for fragment, content in routes:
+        if fragment in request:
+            return content
+    raise AssertionError("No canned answer for " + request)
+
+
+class Response(object):
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+
+class Session(object):
+    # Blocking transport: records the requests and answers the canned contents
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+
+    def request(self, method, url, data=None, headers=None, **kwargs):
+        self.requests.append((method, url, data, headers))
+        return Response(200, answer(self.routes, method, url, data))
+
+
+@pytest.fixture(autouse=True)
+def fixed_time(monkeypatch):
+    # Same nonces and signature dates for both clients
+    for module in (gatecoin, bittrex, liqui):
+        monkeypatch.setattr(module.time, 'time', lambda: NOW)
+
+
+def comparable(result):
+    # Orderbooks compared through their levels
+    if hasattr(result, 'to_dict'):
+        return result.to_dict()
+    return result
+
+
+@pytest.mark.parametrize('name, routes, build, sync_class, async_class, calls', VENUES, ids=[venue[0] for venue in VENUES])
+def test_async_clients_match_the_sync_ones(name, routes, build, sync_class, async_class, calls):
+    sync_store, async_store = orders.OrderStore(), orders.OrderStore()
+    session = Session(routes)
+    sync_client = build(sync_class, session=session, rate_limits=RATE_LIMITS, order_store=sync_store)
+    async_client = build(async_class, rate_limits=RATE_LIMITS, order_store=async_store)
+    assert async_client.session is None
+    async_requests = []
+
+    async def request(method, url, data=None, headers=None):
+        async_requests.append((method, url, data, headers))
+        return 200, answer(routes, method, url, data)
+
+    async_client.request = request
+
+    async def run_async():
+        return [await getattr(async_client, method)(*args) for method, args in calls]
+
+    sync_results = [getattr(sync_client, method)(*args) for method, args in calls]
+    async_results = asyncio.run(run_async())
+    assert [comparable(result) for result in async_results] == [comparable(result) for result in sync_results]
+    # Same signed requests, and the same orders recorded
+    assert async_requests == session.requests
+    assert async_store.find(name) == sync_store.find(name)
+    assert len(sync_store.find(name)) == 1
+
+
+def test_async_errors_match_the_sync_ones():
+    session = Session([('getbalances', b'{"success": false, "message": "APIKEY_INVALID", "result": null}')])
+    sync_client = bittrex.Bittrex('key', 'secret', session=session)
+    async_client = bittrex_async.AsyncBittrex('key', 'secret')
+
+    async def request(method, url, data=None, headers=None):
+        return 200, answer(session.routes, method, url, data)
+
+    async_client.request = request
+    with pytest.raises(adapter.Rejected):
+        sync_client.get_balances()
+    with pytest.raises(adapter.Rejected):
+        asyncio.run(async_client.get_balances())
+
+
+def test_requests_go_through_the_async_session():
+    pytest.importorskip('aiohttp')
+
+    class AsyncResponse(object):
+        status = 200
+
+        async def read(self):
+            return BITTREX[0][1]
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, exc_type, exc, tb):
+            return False
+
+    class AsyncSession(object):
+        def __init__(self):
+            self.requests = []
+
+        def request(self, method, url, **kwargs):
+            self.requests.append((method, url))
+            return AsyncResponse()
+
+    async_session = AsyncSession()
+    client = bittrex_async.AsyncBittrex(None, None, async_session=async_session)
+    book = asyncio.run(client.clean_orderbook('BTC-ETH'))
+    assert book.best_bid == (0.0841, 2.0)
+    assert async_session.requests == [('GET', bittrex.BASE_URL % 'public' + 'getorderbook?market=BTC-ETH&type=both&depth=20')]
+    # A session passed in is left open for its other users
+    assert not client.owns_async_session
+    asyncio.run(client.close())
+    assert client.async_session is async_session
@@ -0,0 +1,83 @@
+import decimal
+import pytest
+from common import arbitrage
+from common import orderbook
+
+PAIR = {'Name': 'ETH-BTC', 'Exchanges': {'Bittrex': 'BTC-ETH', 'Liqui': 'eth_btc'}}
+
+
+def book(bids, asks):
+    return orderbook.OrderBook.from_levels(bids, asks)
+
+
+def scan(books, fees=None, **kwargs):
+    scanner = arbitrage.Scanner([PAIR], fees or {}, **kwargs)
+    return scanner.scan({('Bittrex', 'BTC-ETH'): books[0], ('Liqui', 'eth_btc'): books[1]}, 1.0)
+
+
+def test_crossing_books():
+    opportunities = scan([book([(9.0, 1.0)], [(10.0, 2.0), (10.5, 1.0)]),
+                          book([(11.0, 1.0), (10.2, 5.0)], [(12.0, 1.0)])])
+    assert len(opportunities) == 1
+    opportunity = opportunities[0]
+    assert (opportunity.buy_exchange, opportunity.sell_exchange) == ('Bittrex', 'Liqui')
+    assert (opportunity.buy_currencypair, opportunity.sell_currencypair) == ('BTC-ETH', 'eth_btc')
+    assert (opportunity.best_ask, opportunity.best_bid) == (10.0, 11.0)
+    assert opportunity.spread_bps == pytest.approx(1000)
+    # 1 @ 10 against 11, then 1 @ 10 against 10.2; 10.5 no longer crosses
+    assert opportunity.size == 2.0
+    assert (opportunity.buy_limit, opportunity.sell_limit) == (10.0, 10.2)
+    assert opportunity.average_buy == pytest.approx(10.0)
+    assert opportunity.average_sell == pytest.approx(10.6)
+    assert opportunity.profit == pytest.approx(1.2)
+    assert opportunity.profit_bps == pytest.approx(600)
+    assert opportunity.timestamp == 1.0
+
+
+def test_books_not_crossing():
+    assert scan([book([(9.0, 1.0)], [(10.0, 1.0)]), book([(9.5, 1.0)], [(10.5, 1.0)])]) == []
+    # Equal prices do not cross
+    assert scan([book([(9.0, 1.0)], [(10.0, 1.0)]), book([(10.0, 1.0)], [(10.5, 1.0)])]) == []
+
+
+def test_fees_remove_the_spread():
+    books = [book([(9.0, 1.0)], [(10.0, 1.0)]), book([(10.1, 1.0)], [(10.5, 1.0)])]
+    assert len(scan(books)) == 1
+    assert scan(books, {'Bittrex': 0.005, 'Liqui': 0.005}) == []
+    opportunity, = scan(books, {'Bittrex': 0.001})
+    assert opportunity.average_buy == pytest.approx(10.01)
+    assert opportunity.profit == pytest.approx(0.09)
+
+
+def test_min_spread():
+    books = [book([(9.0, 1.0)], [(10.0, 1.0)]), book([(10.1, 1.0)], [(10.5, 1.0)])]
+    assert len(scan(books, min_spread_bps=99)) == 1
+    assert scan(books, min_spread_bps=101) == []
+
+
+def test_walk_depth():
+    asks = orderbook.BookSide.from_levels([(10.0, 1.0), (10.1, 2.0), (10.4, 5.0)])
+    bids = orderbook.BookSide.from_levels([(10.5, 0.5), (10.3, 3.0), (10.0, 5.0)], descending=True)
+    size, cost, proceeds, ask_limit, bid_limit = arbitrage.walk_depth(asks, 0, bids, 0)
+    # 0.5 @ 10 / 10.5, 0.5 @ 10 / 10.3, 2 @ 10.1 / 10.3, then 10.4 > 10.3
+    assert size == 3.0
+    assert cost == pytest.approx(5.0 + 5.0 + 20.2)
+    assert proceeds == pytest.approx(5.25 + 5.15 + 20.6)
+    assert (ask_limit, bid_limit) == (10.1, 10.3)
+    # The fees stop the walk earlier
+    size, cost, proceeds, ask_limit, bid_limit = arbitrage.walk_depth(asks, 0.02, bids, 0)
+    assert size == 1.0 and (ask_limit, bid_limit) == (10.0, 10.3)
+    assert cost == pytest.approx(10.0 * 1.02)
+
+
+def test_empty_crossing_levels_are_skipped():
+    # The top of book crosses but its levels are empty: no division by a zero size
+    books = [book([(9.0, 1.0)], [(10.0, 0.0), (11.0, 1.0)]), book([(10.5, 0.0), (10.0, 1.0)], [(12.0, 1.0)])]
+    assert scan(books) == []
+
+
+def test_decimal_books():
+    D = decimal.Decimal
+    opportunity, = scan([book([(D('9'), D('1'))], [(D('10'), D('2'))]), book([(D('11'), D('1'))], [(D('12'), D('1'))])])
+    assert opportunity.size == 1.0
+    assert opportunity.profit == pytest.approx(1.0)
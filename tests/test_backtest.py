@@ -0,0 +1,49 @@
+from common import backtest
+from common import orderbook
+from common import recorder
+
+
+def record(directory):
+    book_recorder = recorder.Recorder(str(directory)).start()
+    for i in range(3):
+        book_recorder.record_orderbook('Bittrex', 'BTC-ETH',
+                                       orderbook.OrderBook.from_levels([(0.08 - i * 0.001, 1.0)], [(0.081, 1.0)]), 10.0 + i)
+    # Overlapping trade lists, two identical fills at 11.0
+    book_recorder.record_trades('Bittrex', 'BTC-ETH', [(10.5, 'sell', 0.079, 0.1), (11.0, 'sell', 0.078, 0.2),
+                                                      (11.0, 'sell', 0.078, 0.2)], 11.0)
+    book_recorder.record_trades('Bittrex', 'BTC-ETH', [(11.0, 'sell', 0.078, 0.2), (11.0, 'sell', 0.078, 0.2),
+                                                      (11.0, 'sell', 0.077, 0.3), (12.0, 'buy', 0.081, 0.5)], 12.0)
+    book_recorder.stop()
+
+
+def test_missing_book_recording(tmp_path):
+    record(tmp_path)
+    exchange = backtest.SimulatedExchange('Bittrex', str(tmp_path), {'BTC-ETH': ('ETH', 'BTC'), 'BTC-LTC': ('LTC', 'BTC')})
+    assert list(exchange.books) == ['BTC-ETH']
+    assert not exchange.clean_orderbook('BTC-LTC').buy
+    assert len(exchange.top_of_book('BTC-LTC')[0]) == 0
+
+    steps = []
+    backtest.Backtester({'Bittrex': exchange}).run(lambda exchange, timestamp: steps.append(timestamp))
+    assert steps == [10.0, 11.0, 12.0]
+    exchange.close_readers()
+
+
+def test_recorded_trades_kept_once(tmp_path):
+    record(tmp_path)
+    exchange = backtest.SimulatedExchange('Bittrex', str(tmp_path), {'BTC-ETH': ('ETH', 'BTC')})
+    exchange.now = 12.0
+    trades = [(timestamp, side, round(price, 3), round(size, 1)) for timestamp, side, price, size in exchange.new_trades('BTC-ETH')]
+    assert trades == [(10.5, recorder.SIDE_SELL, 0.079, 0.1), (11.0, recorder.SIDE_SELL, 0.078, 0.2),
+                      (11.0, recorder.SIDE_SELL, 0.078, 0.2), (11.0, recorder.SIDE_SELL, 0.077, 0.3),
+                      (12.0, recorder.SIDE_BUY, 0.081, 0.5)]
+    exchange.close_readers()
+
+
+def test_trade_cursor_same_timestamp():
+    cursor = recorder.TradeCursor()
+    assert cursor.new_trades([(1.0, 'buy', 10.0, 1.0), (1.0, 'buy', 10.0, 1.0)]) == [(1.0, 'buy', 10.0, 1.0)] * 2
+    assert cursor.new_trades([(1.0, 'buy', 10.0, 1.0), (1.0, 'buy', 10.0, 1.0), (1.0, 'sell', 9.0, 2.0)]) == \
+        [(1.0, 'sell', 9.0, 2.0)]
+    assert cursor.new_trades([(0.5, 'buy', 10.0, 1.0), (1.0, 'sell', 9.0, 2.0), (2.0, 'buy', 11.0, 1.0)]) == \
+        [(2.0, 'buy', 11.0, 1.0)]
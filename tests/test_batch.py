@@ -0,0 +1,111 @@
+import asyncio
+import threading
+from common import batch
+from common import orders
+from liqui import liqui
+
+
+class FakeClient(object):
+    # Records its requests; with a barrier, each order waits for the orders of the other exchanges
+    def __init__(self, name, barrier=None, fail=False):
+        self.name = name
+        self.barrier = barrier
+        self.fail = fail
+        self.requests = []
+
+    def place_limit_order(self, market, way, quantity, price):
+        self.requests.append((market, way, quantity, price))
+        if self.barrier is not None:
+            self.barrier.wait()
+        if self.fail:
+            raise Exception("%s - Order rejected" % self.name)
+        return {'id': self.name + '-' + market}
+
+    def cancel_order(self, order_id):
+        self.requests.append(('cancel', order_id))
+        return {'cancelled': order_id}
+
+    def order_id(self, response):
+        return response['id']
+
+
+class FakeAsyncClient(FakeClient):
+    async def place_limit_order(self, market, way, quantity, price):
+        return FakeClient.place_limit_order(self, market, way, quantity, price)
+
+    async def cancel_order(self, order_id):
+        return FakeClient.cancel_order(self, order_id)
+
+
+ORDERS = [
+    {'Exchange': 'Bittrex', 'Market': 'BTC-ETH', 'Way': 'Bid', 'Quantity': 1.0, 'Price': 0.05},
+    {'Exchange': 'Liqui', 'Market': 'eth_btc', 'Way': 'Ask', 'Quantity': 1.0, 'Price': 0.051},
+    {'Exchange': 'Bittrex', 'OrderId': 'old'},
+]
+
+
+def check_results(exchange, results):
+    assert sorted(exchange['Bittrex'].requests, key=str) == [('BTC-ETH', 'Bid', 1.0, 0.05), ('cancel', 'old')]
+    assert exchange['Liqui'].requests == [('eth_btc', 'Ask', 1.0, 0.051)]
+    # One result per request, in the order of the requests
+    assert [result['Exchange'] for result in results] == ['Bittrex', 'Liqui', 'Bittrex']
+    assert [result['OrderId'] for result in results] == ['Bittrex-BTC-ETH', 'Liqui-eth_btc', 'old']
+    assert [result.get('Filled') for result in results] == [False, False, None]
+    assert results[2]['Response'] == {'cancelled': 'old'}
+    assert all(result['Error'] is None and result['Latency'] >= 0 for result in results)
+
+
+def test_requests_go_to_their_exchange():
+    exchange = {'Bittrex': FakeClient('Bittrex'), 'Liqui': FakeClient('Liqui')}
+    dispatcher = batch.BatchDispatcher(exchange)
+    try:
+        check_results(exchange, dispatcher.dispatch(ORDERS))
+    finally:
+        dispatcher.close()
+
+
+def test_exchanges_are_sent_to_concurrently():
+    # Each leg only returns once the other one was sent: a serial dispatch would break the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    exchange = {'Bittrex': FakeClient('Bittrex', barrier), 'Liqui': FakeClient('Liqui', barrier)}
+    dispatcher = batch.BatchDispatcher(exchange)
+    try:
+        results = dispatcher.place_orders(ORDERS[:2])
+    finally:
+        dispatcher.close()
+    assert [result['Error'] for result in results] == [None, None]
+    assert not barrier.broken
+
+
+def test_a_failed_leg_does_not_stop_the_others():
+    exchange = {'Bittrex': FakeClient('Bittrex'), 'Liqui': FakeClient('Liqui', fail=True)}
+    dispatcher = batch.BatchDispatcher(exchange)
+    try:
+        results = dispatcher.dispatch(ORDERS)
+    finally:
+        dispatcher.close()
+    assert [result['Error'] is None for result in results] == [True, False, True]
+    assert str(results[1]['Error']) == "Liqui - Order rejected"
+    assert (results[1]['OrderId'], results[1]['Response']) == (None, None)
+    assert results[0]['OrderId'] == 'Bittrex-BTC-ETH'
+
+
+def test_dispatch_async():
+    exchange = {'Bittrex': FakeAsyncClient('Bittrex'), 'Liqui': FakeAsyncClient('Liqui')}
+    check_results(exchange, asyncio.run(batch.dispatch_async(exchange, ORDERS)))
+
+
+def test_liqui_order_filled_at_once():
+    order_store = orders.OrderStore()
+    client = liqui.Liqui('Key', 'Secret', order_store=order_store)
+    responses = [{'success': 1, 'return': {'received': 1.0, 'remains': 0, 'order_id': 0, 'funds': {}}},
+                 {'success': 1, 'return': {'received': 1.0, 'remains': 0, 'order_id': 0, 'funds': {}}},
+                 {'success': 1, 'return': {'received': 0.5, 'remains': 0.5, 'order_id': 1234, 'funds': {}}}]
+    client.buy_limit = lambda market, quantity, rate: responses.pop(0)
+    results = [batch.order_result(dict(ORDERS[1], Way='Bid'), client.place_limit_order('eth_btc', 'Bid', 1.0, 0.05),
+                                  None, 0.0, client)
+               for _ in range(3)]
+    assert [(result['OrderId'], result['Filled']) for result in results] == [(None, True), (None, True), (1234, False)]
+    # Only the order left on the book is open, the fills do not collide on id 0
+    assert [order['OrderId'] for order in order_store.open_orders('Liqui')] == [1234]
+    assert order_store.statistics()['Total'] == 1
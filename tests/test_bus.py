@@ -0,0 +1,41 @@
+from common import bus
+from common import orderbook
+
+
+class TradesClient(object):
+    def __init__(self, polls):
+        self.polls = polls
+
+    def clean_trades(self, market):
+        return self.polls.pop(0)
+
+
+def test_trades_sharing_a_timestamp_are_published():
+    market_data = bus.Bus()
+    subscription = market_data.subscribe(kinds=(bus.TRADES,))
+    client = TradesClient([[(1.0, 'buy', 10.0, 1.0)],
+                           [(1.0, 'buy', 10.0, 1.0), (1.0, 'sell', 9.5, 2.0), (1.0, 'buy', 10.0, 1.0)]])
+    feed = bus.MarketDataFeed({'Bittrex': client}, [('Bittrex', 'BTC-ETH')], market_data)
+    feed.poll_trades()
+    feed.poll_trades()
+    assert [message.data for message in subscription.drain()] == [
+        [(1.0, 'buy', 10.0, 1.0)],
+        [(1.0, 'buy', 10.0, 1.0), (1.0, 'sell', 9.5, 2.0)]]
+
+
+def test_lagging_subscription_conflates_books():
+    market_data = bus.Bus()
+    conflating = market_data.subscribe()
+    everything = market_data.subscribe(conflate=False, max_size=2)
+    for i in range(3):
+        book = orderbook.OrderBook.from_levels([(10.0 - i, 1.0)], [(11.0, 1.0)])
+        market_data.publish_book('Bittrex', 'BTC-ETH', book, top_changed=(i == 0))
+
+    messages = conflating.drain()
+    assert len(messages) == 1
+    assert messages[0].data.best_bid == (8.0, 1.0)
+    # The top move of a conflated book is kept
+    assert messages[0].top_changed
+    assert conflating.conflated == 2
+    assert len(everything.drain()) == 2
+    assert everything.dropped == 1
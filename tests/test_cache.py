@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+import pytest
+
+from common import cache
+
+
+def test_get_or_load_caches_and_expires(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    ttl_cache = cache.TTLCache()
+    loads = []
+
+    assert ttl_cache.get_or_load('key', 10, lambda: loads.append(1) or len(loads)) == 1
+    assert ttl_cache.get_or_load('key', 10, lambda: loads.append(1) or len(loads)) == 1
+    now[0] += 11
+    assert ttl_cache.get_or_load('key', 10, lambda: loads.append(1) or len(loads)) == 2
+
+
+def test_get_or_load_interrupted_loader_raises_to_waiters():
+    ttl_cache = cache.TTLCache()
+    started, release = threading.Event(), threading.Event()
+    results = []
+
+    def leader_loader():
+        started.set()
+        release.wait()
+        raise KeyboardInterrupt
+
+    def leader():
+        try:
+            ttl_cache.get_or_load('key', 10, leader_loader)
+        except KeyboardInterrupt:
+            results.append('leader interrupted')
+
+    def waiter():
+        try:
+            results.append(ttl_cache.get_or_load('key', 10, lambda: 'unused'))
+        except Exception as e:
+            results.append(type(e))
+
+    leader_thread = threading.Thread(target=leader)
+    leader_thread.start()
+    started.wait()
+    waiter_thread = threading.Thread(target=waiter)
+    waiter_thread.start()
+    while ttl_cache.coalesced == 0:
+        pass
+    release.set()
+    leader_thread.join()
+    waiter_thread.join()
+    assert sorted(map(str, results)) == sorted(map(str, ['leader interrupted', Exception]))
+
+
+def test_get_or_load_async_coalesces():
+    ttl_cache = cache.TTLCache()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return 'value'
+
+    async def main():
+        return await asyncio.gather(*[ttl_cache.get_or_load_async('key', 10, loader) for _ in range(5)])
+
+    assert asyncio.run(main()) == ['value'] * 5
+    assert len(loads) == 1
+    assert ttl_cache.coalesced == 4
+
+
+def test_get_or_load_async_leader_cancelled():
+    ttl_cache = cache.TTLCache()
+    loads = []
+
+    async def loader():
+        loads.append(1)
+        await asyncio.sleep(0.05)
+        return len(loads)
+
+    async def main():
+        leader = asyncio.ensure_future(ttl_cache.get_or_load_async('key', 10, loader))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(ttl_cache.get_or_load_async('key', 10, loader))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # The follower loads the value itself instead of waiting forever
+        value = await asyncio.wait_for(follower, 1)
+        return value, ttl_cache.async_in_flight
+
+    value, in_flight = asyncio.run(main())
+    assert value == 2
+    assert in_flight == {}
+
+
+def test_get_or_load_async_follower_cancelled():
+    ttl_cache = cache.TTLCache()
+
+    async def loader():
+        await asyncio.sleep(0.02)
+        return 'value'
+
+    async def main():
+        leader = asyncio.ensure_future(ttl_cache.get_or_load_async('key', 10, loader))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(ttl_cache.get_or_load_async('key', 10, loader))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == 'value'
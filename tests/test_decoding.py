@@ -0,0 +1,72 @@
+from array import array
+import decimal
+import pytest
+from bittrex import bittrex
+from common import decoding
+from liqui import liqui
+
+BITTREX_ORDERBOOK = b'{"success": true, "message": "", "result": {' \
+                    b'"buy": [{"Quantity": 2, "Rate": 0.0841}, {"Quantity": 1.5, "Rate": 0.084}], ' \
+                    b'"sell": [{"Quantity": 0.25, "Rate": 0.0843}]}}'
+BITTREX_BALANCES = b'{"success": true, "message": "", "result": [' \
+                   b'{"Currency": "BTC", "Balance": 1.1, "Available": 1, "Pending": 0.1}]}'
+
+
+class Response(object):
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+
+class Session(object):
+    # Answers the queued contents
+    def __init__(self, *contents):
+        self.contents = list(contents)
+
+    def request(self, method, url, **kwargs):
+        return Response(200, self.contents.pop(0))
+
+
+def test_scaled_numbers():
+    scaled = decoding.Scaled(8)
+    assert [scaled(text) for text in ('0.0841', '12.5', '0.00000001', '1e-3', '0.123456785')] == \
+        [8410000, 1250000000, 1, 100000, 12345678]
+    assert scaled.scale_int('2') == 200000000
+    # Integers are scaled as well: 2 and 2.0 decode to the same value
+    assert decoding.Decoder(scaled).loads(b'[2, 2.0, 0.5]') == [200000000, 200000000, 50000000]
+
+
+@pytest.mark.parametrize('nums, expected', [
+    (float, [0.1, 2]),
+    (decimal.Decimal, [decimal.Decimal('0.1'), decimal.Decimal('2')]),
+    (None, ['0.1', 2]),
+])
+def test_decoder_policies(nums, expected):
+    values = decoding.Decoder(nums).loads(b'[0.1, 2]')
+    assert values == expected
+    assert [type(value) for value in values] == [type(value) for value in expected]
+
+
+def test_market_data_is_decoded_as_floats():
+    client = bittrex.Bittrex('key', 'secret', session=Session(BITTREX_ORDERBOOK, BITTREX_BALANCES))
+    book = client.clean_orderbook('BTC-ETH')
+    assert isinstance(book.buy.prices, array) and book.buy.prices.typecode == 'd'
+    assert list(book.buy) == [(0.0841, 2.0), (0.084, 1.5)]
+    assert book.best_ask == (0.0843, 0.25)
+    # Private responses stay exact
+    balance = client.get_clean_balance()['BTC']
+    assert balance['Balance'] == decimal.Decimal('1.1')
+    assert balance['OpenOrder'] == decimal.Decimal('0.1')
+
+
+def test_scaled_market_data():
+    client = bittrex.Bittrex(None, None, market_data_nums=decoding.Scaled(8), session=Session(BITTREX_ORDERBOOK))
+    book = client.clean_orderbook('BTC-ETH')
+    assert list(book.buy) == [(8410000, 200000000), (8400000, 150000000)]
+    assert book.spread == 20000
+
+    content = b'{"eth_btc": {"asks": [[0.0843, 1]], "bids": [[0.0841, 0.5], [0.0842, 3]]}}'
+    client = liqui.Liqui(None, None, market_data_nums=decoding.Scaled(8), session=Session(content))
+    book = client.clean_orderbook('eth_btc')
+    assert list(book.buy) == [(8420000, 300000000), (8410000, 50000000)]
+    assert list(book.sell) == [(8430000, 100000000)]
@@ -0,0 +1,23 @@
+import pytest
+from common import execution
+from common import orderbook
+
+
+def brute_size_for_slippage(side, max_slippage):
+    # Largest size, on a fine grid, whose vwap stays within max_slippage of the best price
+    best = side.prices[0]
+    sign = -1 if side.descending else 1
+    sizes = [i / 1000.0 for i in range(1, int(sum(side.sizes) * 1000) + 1)]
+    within = [size for size in sizes if sign * (side.vwap(size) - best) / best <= max_slippage + 1e-12]
+    return within[-1] if within else 0
+
+
+@pytest.mark.parametrize('descending', [False, True])
+@pytest.mark.parametrize('max_slippage', [0.0, 0.01, 0.03, 0.2])
+def test_size_for_slippage(descending, max_slippage):
+    levels = [(100.0, 1.0), (101.0, 2.0), (103.0, 1.5), (110.0, 3.0)]
+    if descending:
+        levels = [(200.0 - price, size) for price, size in levels]
+    side = orderbook.BookSide.from_levels(levels, descending)
+    size = execution.DepthProfile(side).size_for_slippage(max_slippage)
+    assert size == pytest.approx(brute_size_for_slippage(side, max_slippage), abs=1e-3)
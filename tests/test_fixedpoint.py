@@ -0,0 +1,94 @@
+import decimal
+
+import pytest
+
+from common import fixedpoint
+from common import orderbook
+from bittrex import bittrex
+from gatecoin import gatecoin
+
+
+@pytest.mark.parametrize('value', ['0.0841', '90000000.12345678', '0.00000001', '1e-3', '12'])
+def test_price_round_trip(value):
+    scale = fixedpoint.PairScale(8, 8)
+    ticks = scale.price_to_int(decimal.Decimal(value))
+    assert scale.price(ticks) == decimal.Decimal(value)
+    assert scale.price_to_int(value) == ticks
+    assert scale.price_to_int(float(value)) == ticks
+
+
+def test_to_int_rounds_half_even():
+    assert fixedpoint.to_int('0.125', 100) == 12
+    assert fixedpoint.to_int('0.135', 100) == 14
+    assert fixedpoint.to_int(0.1 + 0.2, 10 ** 8) == 30000000
+
+
+def test_fixed_orderbook_round_trip():
+    scale = fixedpoint.PairScale(5, 3)
+    book = fixedpoint.FixedOrderBook.from_levels(
+        [(decimal.Decimal('0.08410'), decimal.Decimal('1.5')), (decimal.Decimal('0.08420'), decimal.Decimal('2'))],
+        [(0.0843, 0.25)], scale)
+    assert list(book.buy) == [(8420, 2000), (8410, 1500)]
+    assert book.buy.prices.typecode == 'q'
+    assert book.spread == 10
+    assert book.sell.vwap(250) == 8430
+    assert book.buy.vwap(3000) == 8417
+
+    float_book = book.to_orderbook()
+    assert list(float_book.buy) == [(0.0842, 2.0), (0.0841, 1.5)]
+    assert list(fixedpoint.FixedOrderBook.from_orderbook(float_book, scale).buy) == list(book.buy)
+
+
+def test_fixed_book_side_depth():
+    side = fixedpoint.FixedBookSide.from_levels([(100, 1), (101, 2), (103, 3)], fixedpoint.PairScale(0, 0))
+    assert side.levels_through(101) == 2
+    assert side.volume_to(102) == 3
+    assert side.notional(4) == 100 + 202 + 103
+    assert side.notional(7) is None
+    bids = fixedpoint.FixedBookSide.from_levels([(100, 1), (103, 3), (101, 2), (101, 4)], fixedpoint.PairScale(0, 0), True)
+    assert list(bids) == [(103, 3), (101, 6), (100, 1)]
+    assert [bids.levels_through(price) for price in (104, 103, 102, 101, 99)] == [0, 1, 1, 2, 3]
+
+
+def test_bittrex_market_scales():
+    client = bittrex.Bittrex(None, None)
+    scales = client.parse_market_scales({'result': [{'MarketName': 'BTC-ETH', 'MinTradeSize': 0.005}]})
+    assert scales == {'BTC-ETH': fixedpoint.PairScale(8, 8)}
+
+
+def test_gatecoin_reference_is_public_market_data():
+    client = gatecoin.Gatecoin(gatecoin.URL, None, None)
+    assert '/Reference/CurrencyPairs'.startswith(gatecoin.PUBLIC_PREFIXES)
+    assert client.rate_limiter.reserves['Reference'] == 4
+    scales = client.parse_market_scales({'currencyPairs': [{'tradingCode': 'BTCUSD', 'priceDecimalPlaces': 1.0}]})
+    assert scales == {'BTCUSD': fixedpoint.PairScale(1, 8)}
+
+
+def test_exact_conversion_rejects_values_finer_than_the_scale():
+    scale = fixedpoint.PairScale(8, 8)
+    assert scale.price_to_int(0.05037, exact=True) == 5037000
+    assert scale.price_to_int(decimal.Decimal('0.05037000'), exact=True) == 5037000
+    for value in (0.123456789, decimal.Decimal('0.123456789'), '1e-9'):
+        with pytest.raises(ValueError):
+            scale.price_to_int(value, exact=True)
+
+
+def test_bittrex_fixed_orderbook_checks_the_guessed_scale(monkeypatch):
+    client = bittrex.Bittrex(None, None)
+    client.market_scales = {'BTC-ETH': fixedpoint.PairScale(8, 8)}
+    raw_orderbook = {'result': {'buy': [{'Rate': 0.05, 'Quantity': 1.25}], 'sell': [{'Rate': 0.0501, 'Quantity': 2.0}]}}
+    monkeypatch.setattr(client, 'get_orderbook', lambda market: raw_orderbook)
+    book = client.clean_fixed_orderbook('BTC-ETH')
+    assert book.best_bid == (5000000, 125000000)
+    assert book.spread_bps() == 20.0
+
+    raw_orderbook['result']['sell'].append({'Rate': 0.050100001, 'Quantity': 1.0})
+    with pytest.raises(ValueError):
+        client.clean_fixed_orderbook('BTC-ETH')
+
+
+def test_depth_queries_reuse_the_prefix_sums():
+    side = fixedpoint.FixedBookSide.from_levels([(100, 1), (101, 2), (103, 3)], fixedpoint.PairScale(0, 0))
+    assert [side.vwap(size) for size in (1, 2, 3, 6, 7)] == [100, 100, 101, 102, None]
+    assert side.volume_to(101) == 3
+    assert list(side.cumulative_sizes()) == [1, 3, 6]
@@ -0,0 +1,182 @@
+import json
+import os
+import socket
+import threading
+import time
+import pytest
+from common import gateway
+from common import orderbook
+from common import sharding
+
+BOOKS = [('Bittrex', 'BTC-ETH'), ('Liqui', 'eth_btc')]
+
+
+class FakeExchange(object):
+    # Exchange client answering the same snapshot at every poll
+    def __init__(self, bids, asks):
+        self.bids, self.asks = bids, asks
+        self.orderbooks = {}
+
+    def poll_orderbook(self, market):
+        book = self.orderbooks.setdefault(market, orderbook.IncrementalOrderBook())
+        return book.apply_snapshot(self.bids, self.asks, 1.0)
+
+
+@pytest.fixture
+def server(tmp_path):
+    server = gateway.Gateway({'Bittrex': object(), 'Liqui': object()}, BOOKS, str(tmp_path / 'gateway.sock'))
+    yield server
+    # Never started: close without shutting the server loop down
+    server.stop_event.set()
+    server.server.server_close()
+    server.table.close()
+
+
+def publish(server, book_request, bids, asks):
+    incremental = orderbook.IncrementalOrderBook()
+    update = incremental.apply_snapshot(bids, asks, 2.0)
+    book = incremental.to_orderbook()
+    server.feed.book_poller.books[book_request] = book
+    server.on_update(book_request[0], book_request[1], update, book)
+
+
+def connect(server):
+    # Serve one end of a socket pair, as the server does for each connection
+    client_end, server_end = socket.socketpair()
+    client_end.settimeout(5)
+    thread = threading.Thread(target=gateway.Handler, args=(server_end, None, server.server), daemon=True)
+    thread.start()
+    return client_end, client_end.makefile('rwb'), thread
+
+
+def ask(file, line):
+    file.write(line.encode() + b'\n')
+    file.flush()
+    return json.loads(file.readline())
+
+
+def test_requests_over_a_socket(server):
+    connection, file, thread = connect(server)
+    layout = ask(file, '{"Command": "Layout"}')
+    assert layout == {'Table': server.table.name, 'Books': [list(book) for book in BOOKS], 'Pid': os.getpid()}
+    assert 'No book yet' in ask(file, '{"Command": "Book", "Exchange": "Bittrex", "Market": "BTC-ETH"}')['Error']
+
+    publish(server, BOOKS[0], [(10.0, 1.0), (9.0, 2.0)], [(11.0, 3.0)])
+    answer = ask(file, '{"Command": "Book", "Exchange": "Bittrex", "Market": "BTC-ETH", "Depth": 1}')
+    book = gateway.decode_book(answer)
+    assert (answer['Exchange'], answer['Market'], book.timestamp) == ('Bittrex', 'BTC-ETH', 2.0)
+    assert list(book.buy) == [(10.0, 1.0)] and list(book.sell) == [(11.0, 3.0)]
+    answer = ask(file, json.dumps({'Command': 'Book', 'Exchange': 'Bittrex', 'Market': 'BTC-ETH'}))
+    assert list(gateway.decode_book(answer).buy) == [(10.0, 1.0), (9.0, 2.0)]
+    assert server.table.read(BOOKS[0])[2:] == (10.0, 1.0, 11.0, 3.0)
+
+    file.close()
+    connection.close()
+    thread.join(5)
+    assert not thread.is_alive()
+
+
+@pytest.mark.parametrize('line', [
+    'null', '[1, 2]', '"Layout"', 'not json',
+    '{"Command": "Book", "Exchange": "Bittrex", "Market": "BTC-ETH", "Depth": "5"}',
+    '{"Command": "Book", "Exchange": "Bittrex", "Market": "BTC-ETH", "Depth": -1}',
+    '{"Command": "Book", "Exchange": ["Bittrex"], "Market": "BTC-ETH"}',
+    '{"Command": "Book", "Exchange": "Bittrex"}',
+    '{"Command": "Book", "Exchange": "Kraken", "Market": "BTC-ETH"}',
+    '{"Command": "Subscribe", "Exchanges": "Bittrex"}',
+    '{"Command": "Subscribe", "Markets": [["BTC-ETH"]]}',
+    '{"Command": "Unknown"}',
+])
+def test_invalid_requests_keep_the_connection(server, line):
+    connection, file, thread = connect(server)
+    assert 'Error' in ask(file, line)
+    assert ask(file, '{"Command": "Layout"}')['Table'] == server.table.name
+    file.close()
+    connection.close()
+    thread.join(5)
+
+
+def test_subscribe_streams_the_matching_books(server):
+    connection, file, thread = connect(server)
+    file.write(b'{"Command": "Subscribe", "Markets": ["eth_btc"]}\n')
+    file.flush()
+    deadline = time.time() + 5
+    while not server.bus.subscriptions and time.time() < deadline:
+        time.sleep(0.01)
+
+    publish(server, BOOKS[0], [(10.0, 1.0)], [(11.0, 1.0)])
+    publish(server, BOOKS[1], [(0.05, 2.0)], [(0.06, 1.0)])
+    answer = json.loads(file.readline())
+    assert (answer['Exchange'], answer['Market'], answer['TopChanged']) == ('Liqui', 'eth_btc', True)
+    assert list(gateway.decode_book(answer).sell) == [(0.06, 1.0)]
+
+    # The stream ends with the gateway
+    server.stop_event.set()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert not server.bus.subscriptions
+    file.close()
+    connection.close()
+
+
+def test_client_round_trip(tmp_path):
+    exchange = {'Bittrex': FakeExchange([(10.0, 1.0)], [(11.0, 2.0)]), 'Liqui': FakeExchange([(0.05, 1.0)], [(0.06, 1.0)])}
+    server = gateway.Gateway(exchange, BOOKS, str(tmp_path / 'gateway.sock'), min_interval=0.01).start()
+    client = gateway.GatewayClient(server.socket_path)
+    try:
+        deadline = time.time() + 5
+        while len(server.feed.books) < len(BOOKS) and time.time() < deadline:
+            time.sleep(0.01)
+        assert client.layout() == (server.table.name, BOOKS)
+        assert list(client.orderbook('Liqui', 'eth_btc').buy) == [(0.05, 1.0)]
+        with pytest.raises(Exception):
+            client.orderbook('Liqui', 'ltc_btc')
+        # Attached in the process of the gateway: still registered for the gateway to free it
+        table = client.top_of_book()
+        assert table.read(BOOKS[0])[2:] == (10.0, 1.0, 11.0, 2.0)
+        table.close()
+    finally:
+        client.close()
+        server.stop(5)
+
+
+def test_torn_reads_are_retried(monkeypatch):
+    table = sharding.TopOfBookTable(BOOKS)
+    try:
+        book = orderbook.OrderBook.from_levels([(10.0, 1.0)], [(11.0, 2.0)], 1.0)
+        table.write(BOOKS[0], book)
+        offset = table.slots[BOOKS[0]]
+        waits = []
+
+        # Caught in the middle of a write: odd sequence until the writer is done
+        sharding.SEQUENCE.pack_into(table.buffer, offset, 3)
+
+        def finish_write(seconds):
+            waits.append(seconds)
+            sharding.LEVELS.pack_into(table.buffer, offset + sharding.SEQUENCE.size, 2.0, 10.5, 1.0, 11.0, 2.0)
+            sharding.SEQUENCE.pack_into(table.buffer, offset, 4)
+
+        monkeypatch.setattr(sharding.time, 'sleep', finish_write)
+        assert table.read(BOOKS[0]) == (4, 2.0, 10.5, 1.0, 11.0, 2.0)
+        assert len(waits) == 1
+
+        # A write started and ended while the levels were copied: the copy is dropped
+        levels_struct = sharding.LEVELS
+
+        class Levels(object):
+            size = levels_struct.size
+
+            @staticmethod
+            def unpack_from(buffer, position):
+                levels = levels_struct.unpack_from(buffer, position)
+                if len(waits) == 1:
+                    levels_struct.pack_into(buffer, position, 3.0, 10.25, 1.0, 11.0, 2.0)
+                    sharding.SEQUENCE.pack_into(buffer, offset, 6)
+                return levels
+
+        monkeypatch.setattr(sharding.time, 'sleep', waits.append)
+        monkeypatch.setattr(sharding, 'LEVELS', Levels)
+        assert table.read(BOOKS[0]) == (6, 3.0, 10.25, 1.0, 11.0, 2.0)
+        assert len(waits) == 2
+    finally:
+        table.close()
@@ -0,0 +1,34 @@
+import json
+import logging
+
+from common import logs
+
+
+def read_entries(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_message_formatted_when_logged(tmp_path):
+    logger = logging.getLogger("TradingBot.test_logs")
+    logger.propagate = False
+    path = tmp_path / 'log.log'
+    listener = logs.setup_pipeline(logger, str(path), response_sample=1)
+    try:
+        response = {'success': 0}
+        logger.info("Liqui - Response content: %s", response)
+        # Modified once logged, as Liqui.check_response does
+        response['success'] = 1
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Liqui - Failed")
+    finally:
+        listener.stop()
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+
+    entries = read_entries(path)
+    assert entries[0]['Component'] == 'Liqui'
+    assert entries[0]['Message'] == "Response content: {'success': 0}"
+    assert 'ValueError: boom' in entries[1]['Exception']
@@ -0,0 +1,125 @@
+import json
+import urllib.request
+import pytest
+from bittrex import bittrex
+from common import adapter
+from common import metrics
+from common import ratelimit
+
+
+class Response(object):
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+
+class Session(object):
+    # Answers the queued responses, raising the exceptions
+    def __init__(self, *responses):
+        self.responses = list(responses)
+
+    def request(self, method, url, **kwargs):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram([1, 2, 4])
+    for value in (0.5, 1, 1.5, 3, 3, 10):
+        histogram.observe(value)
+    # Values equal to a bound go to its bucket, values above every bound to the last one
+    assert histogram.counts == [2, 1, 2, 1]
+    assert (histogram.count, histogram.total, histogram.max) == (6, 19.0, 10)
+    assert histogram.to_dict()['Buckets'] == [(1, 2), (2, 1), (4, 2), (None, 1)]
+    assert histogram.to_dict()['Mean'] == pytest.approx(19.0 / 6)
+
+
+def test_histogram_percentiles():
+    histogram = metrics.Histogram([1, 2, 4])
+    assert histogram.percentile(0.5) is None
+    assert histogram.to_dict()['P99'] is None
+    for value in [0.5] * 50 + [1.5] * 40 + [3] * 9 + [10]:
+        histogram.observe(value)
+    assert [histogram.percentile(ratio) for ratio in (0.5, 0.51, 0.9, 0.99, 1.0)] == [1, 2, 2, 4, 10]
+    # Never above the largest value seen
+    small = metrics.Histogram([1, 2, 4])
+    small.observe(2.5)
+    assert small.percentile(0.5) == 2.5
+
+
+def test_handle_records_the_request(monkeypatch):
+    clock = iter([10.25, 10.5])
+    monkeypatch.setattr(metrics.time, 'perf_counter', lambda: next(clock))
+    request_metrics = metrics.Metrics()
+    assert request_metrics.handle('Bittrex', 'getticker', 10.0, 0.125, b'x' * 100, lambda a, b: a + b, 1, 2) == 3
+    endpoint = request_metrics.snapshot()['Endpoints']['Bittrex']['getticker']
+    assert (endpoint['Requests'], endpoint['Errors']) == (1, 0)
+    assert endpoint['Latency']['Sum'] == pytest.approx(0.25)
+    assert endpoint['Decode']['Sum'] == pytest.approx(0.25)
+    assert endpoint['Payload']['Buckets'] == [(128, 1)]
+    assert endpoint['RateLimitWait']['Max'] == 0.125
+
+
+def test_handle_counts_the_errors_and_can_be_disabled():
+    request_metrics = metrics.Metrics()
+
+    def failing():
+        raise ValueError("bad response")
+
+    with pytest.raises(ValueError):
+        request_metrics.handle('Liqui', 'Trade', 0.0, 0.0, b'{}', failing)
+    request_metrics.observe_error('Liqui', 'Trade')
+    endpoint = request_metrics.endpoints[('Liqui', 'Trade')]
+    assert (endpoint.requests, endpoint.errors, endpoint.latency.count) == (2, 2, 1)
+
+    request_metrics.enabled = False
+    assert request_metrics.handle('Liqui', 'Trade', 0.0, 0.0, b'{}', lambda: 'done') == 'done'
+    request_metrics.observe_error('Liqui', 'Trade')
+    assert (endpoint.requests, endpoint.errors) == (2, 2)
+
+
+def test_client_requests_per_endpoint():
+    request_metrics = metrics.Metrics()
+    client = bittrex.Bittrex('Key', 'Secret', metrics=request_metrics)
+    client.session = Session(
+        Response(200, b'{"success": true, "message": "", "result": {"Bid": 1.0, "Ask": 2.0, "Last": 1.5}}'),
+        Response(429, b'Too many requests'),
+        ConnectionError("reset"),
+        Response(200, b'{"success": true, "message": "", "result": []}'))
+    client.query('getticker', {'market': 'BTC-ETH'})
+    with pytest.raises(adapter.RateLimitError):
+        client.query('getticker', {'market': 'BTC-ETH'})
+    with pytest.raises(adapter.TransportError):
+        client.query('getopenorders')
+    client.query('getopenorders')
+
+    endpoints = request_metrics.snapshot()['Endpoints']['Bittrex']
+    assert (endpoints['getticker']['Requests'], endpoints['getticker']['Errors']) == (2, 1)
+    assert endpoints['getticker']['Latency']['Count'] == 2
+    # The request without response has no latency
+    assert (endpoints['getopenorders']['Requests'], endpoints['getopenorders']['Errors']) == (2, 1)
+    assert endpoints['getopenorders']['Latency']['Count'] == 1
+    assert set(request_metrics.snapshot()['RateLimitHeadroom']) == {'Bittrex'}
+
+
+def test_headroom_and_reset():
+    request_metrics = metrics.Metrics()
+    request_metrics.watch_rate_limiter('Gatecoin', ratelimit.RateLimiter(1, 5, {'Public': {'reserve': 2}, 'Order': {'rate': 1, 'burst': 1}}))
+    assert request_metrics.headroom() == {'Gatecoin': {'Public': 3, 'Order': 1, 'All': 5}}
+    request_metrics.observe_error('Gatecoin', 'Trade/Orders')
+    request_metrics.reset()
+    assert request_metrics.snapshot()['Endpoints'] == {}
+
+
+def test_server_answers_the_snapshot():
+    request_metrics = metrics.Metrics()
+    request_metrics.observe_error('Liqui', 'Trade')
+    server = metrics.MetricsServer(request_metrics, port=0).start()
+    try:
+        with urllib.request.urlopen('http://127.0.0.1:%d/metrics' % server.port, timeout=5) as response:
+            snapshot = json.loads(response.read())
+        assert snapshot['Endpoints']['Liqui']['Trade']['Errors'] == 1
+    finally:
+        server.stop()
@@ -0,0 +1,83 @@
+import decimal
+
+import pytest
+
+from common import orderbook
+
+
+@pytest.mark.parametrize('nums', [float, decimal.Decimal])
+def test_incremental_orderbook_to_orderbook(nums):
+    book = orderbook.IncrementalOrderBook()
+    update = book.apply_snapshot([(nums('0.0841'), nums('1.5')), (nums('0.0840'), nums('2'))],
+                                 [(nums('0.0843'), nums('3')), (nums('0.0842'), nums('0.5'))])
+    assert update.top_changed
+
+    side_book = book.to_orderbook()
+    # Decimal levels stay exact
+    assert list(side_book.buy) == [(nums('0.0841'), nums('1.5')), (nums('0.0840'), nums('2'))]
+    assert list(side_book.sell) == [(nums('0.0842'), nums('0.5')), (nums('0.0843'), nums('3'))]
+    float_book = side_book.to_float()
+    assert float_book.buy.prices.typecode == 'd'
+    assert list(float_book.buy) == [(0.0841, 1.5), (0.084, 2.0)]
+    assert list(float_book.sell) == [(0.0842, 0.5), (0.0843, 3.0)]
+
+
+@pytest.mark.parametrize('nums', [float, decimal.Decimal])
+def test_incremental_orderbook_snapshot_changes(nums):
+    book = orderbook.IncrementalOrderBook()
+    book.apply_snapshot([(nums('10'), nums('1'))], [(nums('11'), nums('1'))])
+
+    update = book.apply_snapshot([(nums('10'), nums('1')), (nums('9'), nums('4'))], [(nums('12'), nums('2'))])
+    assert sorted(update.changes) == sorted([(orderbook.BUY, nums('9'), 0, nums('4')),
+                                             (orderbook.SELL, nums('11'), nums('1'), 0),
+                                             (orderbook.SELL, nums('12'), 0, nums('2'))])
+    assert update.top_changed
+    assert book.best_ask == (nums('12'), nums('2'))
+
+    assert not book.apply_snapshot([(nums('10'), nums('1')), (nums('9'), nums('4'))], [(nums('12'), nums('2'))])
+
+
+def test_incremental_side_delete_absent_level():
+    side = orderbook.IncrementalBookSide()
+    side.update(10.0, 1.0)
+    assert side.update(11.0, 0) is None
+    assert side.update(11.0, -1.0) is None
+    assert side.update(10.0, -1.0) == (10.0, 1.0, 0)
+    assert len(side) == 0
+
+
+def test_from_levels_aggregates_duplicate_prices():
+    bids = orderbook.BookSide.from_levels([(10.0, 1.0), (9.0, 2.0), (10.0, 0.5), (8.0, 1.0)], descending=True)
+    assert list(bids) == [(10.0, 1.5), (9.0, 2.0), (8.0, 1.0)]
+    asks = orderbook.BookSide.from_levels([(11.0, 1.0), (11.0, 2.0), (12.0, 1.0)])
+    assert list(asks) == [(11.0, 3.0), (12.0, 1.0)]
+
+
+def test_levels_through():
+    bids = orderbook.BookSide.from_levels([(10.0, 1.0), (9.0, 2.0), (8.0, 1.0)], descending=True)
+    assert [bids.levels_through(price) for price in (11.0, 10.0, 9.5, 8.0, 7.0)] == [0, 1, 1, 3, 3]
+    assert bids.volume_to(9.0) == 3.0
+    asks = orderbook.BookSide.from_levels([(11.0, 1.0), (12.0, 2.0)])
+    assert [asks.levels_through(price) for price in (10.0, 11.0, 11.5, 12.0)] == [0, 1, 1, 2]
+
+
+def test_snapshot_with_empty_level_not_in_the_book():
+    book = orderbook.IncrementalOrderBook()
+    book.apply_snapshot([(10.0, 1.0)], [(11.0, 1.0)])
+    update = book.apply_snapshot([(10.0, 1.0), (9.0, 0.0)], [(11.0, 2.0), (12.0, 0)])
+    assert update.changes == [(orderbook.SELL, 11.0, 1.0, 2.0)]
+    assert update.top_changed
+    assert len(book.buy) == 1 and len(book.sell) == 1
+    assert not book.apply_snapshot([(10.0, 1.0), (9.0, 0.0)], [(11.0, 2.0), (12.0, 0)])
+
+
+def test_decimal_levels_stay_exact():
+    D = decimal.Decimal
+    book = orderbook.OrderBook.from_levels([(D('0.1'), D('1')), (D('0.3'), D('2'))], [(D('0.4'), D('0.7'))])
+    assert book.best_bid == (D('0.3'), D('2'))
+    assert book.spread == D('0.1')
+    assert book.buy.vwap(D('3')) == (D('0.6') + D('0.1')) / 3
+    float_book = book.to_float()
+    assert float_book.buy.prices.typecode == 'd'
+    assert list(float_book.buy) == [(0.3, 2.0), (0.1, 1.0)]
+    assert float_book.to_float() is float_book
@@ -0,0 +1,26 @@
+from decimal import Decimal
+import pytest
+from common import orders
+
+
+@pytest.mark.parametrize('stored', [0.1, '0.1', '0.10', Decimal('0.1')])
+def test_reconcile_compares_quantities_as_decimals(stored):
+    store = orders.OrderStore()
+    store.add('Gatecoin', 'A', 'BTCUSD', 'Bid', stored, 100.0)
+    exchange_order = {'OrderId': 'A', 'Market': 'BTCUSD', 'Way': 'Bid', 'Quantity': Decimal('0.1'),
+                      'Remaining': Decimal('0.1'), 'Price': Decimal('100')}
+    assert store.reconcile('Gatecoin', [exchange_order]) == {'Added': 0, 'Updated': 0, 'Closed': 0}
+    exchange_order['Remaining'] = Decimal('0.05')
+    assert store.reconcile('Gatecoin', [exchange_order]) == {'Added': 0, 'Updated': 1, 'Closed': 0}
+    assert store.get('Gatecoin', 'A')['Remaining'] == Decimal('0.05')
+
+
+def test_find_by_market_without_exchange():
+    store = orders.OrderStore()
+    store.add('Gatecoin', 'A', 'BTCUSD', 'Bid', 1.0, 100.0)
+    store.add('Bittrex', 'B', 'BTCUSD', 'Ask', 1.0, 101.0)
+    store.add('Bittrex', 'C', 'BTC-ETH', 'Ask', 1.0, 0.05)
+    store.cancelled('Bittrex', 'B')
+    assert sorted(order['OrderId'] for order in store.find(market='BTCUSD')) == ['A', 'B']
+    assert [order['OrderId'] for order in store.open_orders(market='BTCUSD')] == ['A']
+    assert store.find(market='LTCUSD') == []
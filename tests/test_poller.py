@@ -0,0 +1,80 @@
+import pytest
+from common import adapter
+from common import orderbook
+from common import poller
+from common import ratelimit
+
+BOOK = ('Bittrex', 'BTC-ETH')
+
+
+class FakeExchange(object):
+    # Answers the queued snapshots of (bids, asks), raising the exceptions
+    def __init__(self, snapshots, rate_limiter=None):
+        self.snapshots = list(snapshots)
+        self.orderbooks = {}
+        if rate_limiter is not None:
+            self.rate_limiter = rate_limiter
+
+    def poll_orderbook(self, market):
+        snapshot = self.snapshots.pop(0)
+        if isinstance(snapshot, Exception):
+            raise snapshot
+        book = self.orderbooks.setdefault(market, orderbook.IncrementalOrderBook())
+        return book.apply_snapshot(*snapshot)
+
+
+def poll_intervals(snapshots, start, min_interval=1, max_interval=8):
+    updates = []
+    book_poller = poller.AdaptivePoller({'Bittrex': FakeExchange(snapshots)}, [BOOK], min_interval, max_interval,
+                                        tighten=0.5, back_off=2, on_update=lambda *args: updates.append(args))
+    task = book_poller.tasks['Bittrex'][0]
+    task.interval = start
+    intervals = []
+    for _ in snapshots:
+        book_poller.poll(task, min_interval)
+        intervals.append(task.interval)
+    return intervals, task, book_poller, updates
+
+
+def test_interval_shrinks_while_the_top_moves():
+    snapshots = [([(10.0 - i, 1.0)], [(11.0, 1.0)]) for i in range(5)]
+    intervals, task, book_poller, updates = poll_intervals(snapshots, 8)
+    # Down to the minimum, never below
+    assert intervals == [4, 2, 1, 1, 1]
+    assert (task.polls, task.top_changes, task.errors) == (5, 5, 0)
+    assert len(updates) == 5
+    assert book_poller.books[BOOK].best_bid == (6.0, 1.0)
+
+
+def test_interval_backs_off_while_idle():
+    snapshots = [([(10.0, 1.0)], [(11.0, 1.0)])] * 5
+    intervals, task, book_poller, updates = poll_intervals(snapshots, 1)
+    # The first snapshot moves the top, then nothing changes: up to the maximum, never above
+    assert intervals == [1, 2, 4, 8, 8]
+    assert (task.top_changes, len(updates)) == (1, 1)
+
+
+def test_changes_below_the_top_back_off_but_publish():
+    snapshots = [([(10.0, 1.0), (9.0, 1.0)], [(11.0, 1.0)]), ([(10.0, 1.0), (9.0, 2.0)], [(11.0, 1.0)])]
+    intervals, task, book_poller, updates = poll_intervals(snapshots, 2)
+    assert intervals == [1, 2]
+    assert len(updates) == 2 and not updates[1][2].top_changed
+
+
+@pytest.mark.parametrize('error', [adapter.RateLimitError('Bittrex', 429, b'Too many requests'),
+                                   adapter.TransportError('Bittrex', 'timeout')])
+def test_interval_backs_off_on_errors(error):
+    intervals, task, book_poller, updates = poll_intervals([error] * 3 + [([(10.0, 1.0)], [(11.0, 1.0)])], 2)
+    assert intervals == [4, 8, 8, 4]
+    assert (task.polls, task.errors, task.top_changes) == (4, 3, 1)
+    assert book_poller.statistics()[BOOK] == {'Interval': 4, 'Polls': 4, 'TopChanges': 1, 'Errors': 3}
+
+
+def test_min_interval_leaves_budget_to_the_orders():
+    books = [('Bittrex', 'BTC-ETH'), ('Bittrex', 'BTC-LTC'), ('Liqui', 'eth_btc')]
+    exchange = {'Bittrex': FakeExchange([], ratelimit.RateLimiter(2, 10)), 'Liqui': FakeExchange([])}
+    book_poller = poller.AdaptivePoller(exchange, books, 0.5, 30, budget_share=0.5)
+    # Two books on one request per second of budget
+    assert book_poller.exchange_min_interval('Bittrex') == 2
+    # No rate limiter: the configured minimum
+    assert book_poller.exchange_min_interval('Liqui') == 0.5
@@ -0,0 +1,89 @@
+from decimal import Decimal
+import pytest
+from common import orders
+from common import portfolio
+
+ETHBTC = {'Name': 'ETH/BTC', 'Base_currency': 'ETH', 'Quoted_currency': 'BTC',
+          'Primary_exchange': 'Gatecoin', 'Primary_exchange_currencypair': 'ETHBTC',
+          'Secondary_exchange': 'Bittrex', 'Secondary_exchange_currencypair': 'BTC-ETH'}
+
+
+class BalanceClient(object):
+    def __init__(self, balances):
+        self.balances = balances
+
+    def get_clean_balance(self):
+        return self.balances
+
+
+@pytest.fixture
+def balances():
+    exchange = {'Gatecoin': BalanceClient({'BTC': {'Balance': '1', 'AvailableBalance': '1'},
+                                           'ETH': {'Balance': '10', 'AvailableBalance': '10'}})}
+    balances = portfolio.Portfolio(exchange, [ETHBTC])
+    assert balances.refresh() == ['Gatecoin']
+    yield balances
+    balances.close()
+
+
+def test_order_store_events_move_the_balances(balances):
+    store = orders.OrderStore()
+    store.add_listener(balances)
+    store.add('Gatecoin', 'A', 'ETHBTC', 'Bid', Decimal('4'), Decimal('0.05'))
+    assert balances.available('Gatecoin', 'BTC') == pytest.approx(0.8)
+    assert not balances.can_place('Gatecoin', 'ETHBTC', 'Bid', 20, 0.05)
+
+    # Reconciliation reporting a partial fill of 1 at the limit price
+    exchange_order = {'OrderId': 'A', 'Market': 'ETHBTC', 'Way': 'Bid', 'Quantity': Decimal('4'),
+                      'Remaining': Decimal('3'), 'Price': Decimal('0.05')}
+    assert store.reconcile('Gatecoin', [exchange_order])['Updated'] == 1
+    assert balances.balance('Gatecoin', 'ETH')['Balance'] == pytest.approx(11)
+    assert balances.balance('Gatecoin', 'BTC')['Balance'] == pytest.approx(0.95)
+    assert balances.balance('Gatecoin', 'BTC')['OpenOrder'] == pytest.approx(0.15)
+
+    store.cancelled('Gatecoin', 'A')
+    assert balances.available('Gatecoin', 'BTC') == pytest.approx(0.95)
+    assert balances.balance('Gatecoin', 'BTC')['OpenOrder'] == pytest.approx(0)
+
+
+def test_reconciler_refreshes_the_portfolio(balances):
+    class Client(BalanceClient):
+        def clean_open_orders(self):
+            return []
+
+    store = orders.OrderStore()
+    store.add_listener(balances)
+    balances.exchange['Gatecoin'] = Client({'BTC': {'Balance': '2', 'AvailableBalance': '2'}})
+    store.add('Gatecoin', 'A', 'ETHBTC', 'Ask', 1, 0.05)
+    assert balances.available('Gatecoin', 'ETH') == 9
+    orders.Reconciler(store, balances.exchange, portfolio=balances).reconcile()
+    assert store.get('Gatecoin', 'A')['Status'] == orders.CLOSED
+    assert balances.available('Gatecoin', 'BTC') == 2
+    assert balances.available('Gatecoin', 'ETH') == 0
+
+
+def test_closed_orders_stay_held_until_the_refresh(balances):
+    class Client(BalanceClient):
+        def clean_open_orders(self):
+            return []
+
+        def get_clean_balance(self):
+            raise Exception("Gatecoin - Timeout")
+
+    store = orders.OrderStore()
+    store.add_listener(balances)
+    store.add('Gatecoin', 'A', 'ETHBTC', 'Bid', 4, 0.05)
+    store.add('Gatecoin', 'B', 'ETHBTC', 'Bid', 2, 0.05)
+    assert balances.available('Gatecoin', 'BTC') == pytest.approx(0.7)
+    # Cancelled here: released at once
+    store.cancelled('Gatecoin', 'B')
+    assert balances.available('Gatecoin', 'BTC') == pytest.approx(0.8)
+
+    # A is no longer listed, maybe filled: its quote stays held while the refresh fails
+    balances.exchange['Gatecoin'] = Client({})
+    orders.Reconciler(store, balances.exchange, portfolio=balances).reconcile()
+    assert store.get('Gatecoin', 'A')['Status'] == orders.CLOSED
+    assert 'Gatecoin' in balances.errors
+    assert balances.available('Gatecoin', 'BTC') == pytest.approx(0.8)
+    assert balances.balance('Gatecoin', 'BTC')['OpenOrder'] == pytest.approx(0.2)
+    assert not balances.open_orders
@@ -0,0 +1,67 @@
+import pytest
+from common import ratelimit
+
+
+@pytest.fixture
+def frozen_clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_reserve_keeps_tokens_for_the_other_classes(frozen_clock):
+    limiter = ratelimit.RateLimiter(1, 5, {'MarketData': {'reserve': 2}, 'Order': {}})
+    assert [limiter.try_acquire('MarketData') for _ in range(4)] == [True, True, True, False]
+    assert limiter.headroom('MarketData') == 0
+    assert limiter.headroom('Order') == 2
+    assert limiter.try_acquire('Order')
+    assert limiter.try_acquire('Order')
+    assert not limiter.try_acquire('Order')
+
+
+def test_reserved_class_waits_for_the_refill(frozen_clock):
+    limiter = ratelimit.RateLimiter(2, 3, {'MarketData': {'reserve': 1}})
+    assert limiter.take('MarketData') == 0
+    assert limiter.take('MarketData') == 0
+    # One token left, the reserve needs two
+    assert limiter.take('MarketData') == pytest.approx(0.5)
+    frozen_clock[0] += 0.5
+    assert limiter.take('MarketData') == 0
+
+
+def test_class_bucket_limits_its_own_rate(frozen_clock):
+    limiter = ratelimit.RateLimiter(10, 10, {'Order': {'rate': 1, 'burst': 2}})
+    assert limiter.try_acquire('Order') and limiter.try_acquire('Order')
+    assert limiter.take('Order') == pytest.approx(1.0)
+    assert limiter.headroom() == 8
+    assert limiter.headroom('Order') == 0
+
+
+@pytest.mark.parametrize('reserve', [5, 6])
+def test_reserve_must_be_below_the_burst(reserve):
+    with pytest.raises(ValueError):
+        ratelimit.RateLimiter(1, 5, {'MarketData': {'reserve': reserve}})
+    ratelimit.RateLimiter(1, 5, {'MarketData': {'reserve': 4}})
+
+
+def test_refill_ignores_an_earlier_clock():
+    bucket = ratelimit.TokenBucket(10, 5)
+    bucket.tokens, bucket.updated = 1.0, 1000.0
+    bucket.refill(999.0)
+    assert (bucket.tokens, bucket.updated) == (1.0, 1000.0)
+    bucket.refill(1000.2)
+    assert bucket.tokens == pytest.approx(3.0)
+
+
+def test_clock_is_read_under_the_lock(monkeypatch):
+    limiter = ratelimit.RateLimiter(1, 5, {'MarketData': {'reserve': 1, 'rate': 1, 'burst': 2}})
+    held = []
+
+    def monotonic():
+        held.append(limiter.lock.locked())
+        return 1000.0
+
+    monkeypatch.setattr(ratelimit.time, 'monotonic', monotonic)
+    limiter.take('MarketData')
+    limiter.headroom('MarketData')
+    assert held == [True, True]
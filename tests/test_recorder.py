@@ -0,0 +1,98 @@
+from array import array
+import decimal
+import struct
+import pytest
+from common import fixedpoint
+from common import orderbook
+from common import recorder
+
+
+def record(directory, books, trades=()):
+    book_recorder = recorder.Recorder(str(directory)).start()
+    for timestamp, book in books:
+        book_recorder.record_orderbook('Bittrex', 'BTC-ETH', book, timestamp)
+    for timestamp, trade_list in trades:
+        book_recorder.record_trades('Bittrex', 'BTC-ETH', trade_list, timestamp)
+    book_recorder.stop()
+    return book_recorder
+
+
+def book(bid, ask):
+    return orderbook.OrderBook.from_levels([(bid, 1.0), (bid - 1, 2.0)], [(ask, 3.0)])
+
+
+def test_write_read(tmp_path):
+    book_recorder = record(tmp_path, [(1.0, book(10.0, 11.0)), (2.0, book(9.0, 12.0))],
+                           [(2.5, [(2.4, 'buy', 11.0, 0.5), (2.5, 'sell', 10.0, 0.25)])])
+    assert book_recorder.statistics()['Recorded'] == 3
+    with recorder.open_reader(str(tmp_path), 'Bittrex', 'BTC-ETH') as reader:
+        assert len(reader) == 2
+        assert list(reader.timestamps) == [1.0, 2.0]
+        chunk = reader.chunk(1)
+        assert chunk.sequence == 1
+        assert list(chunk.rows()) == [(2.0, recorder.SIDE_BUY, 9.0, 1.0), (2.0, recorder.SIDE_BUY, 8.0, 2.0),
+                                      (2.0, recorder.SIDE_SELL, 12.0, 3.0)]
+        del chunk
+    with recorder.open_reader(str(tmp_path), 'Bittrex', 'BTC-ETH', recorder.TRADES) as reader:
+        chunk = reader.chunk(0)
+        assert list(chunk.rows()) == [(2.4, recorder.SIDE_BUY, 11.0, 0.5), (2.5, recorder.SIDE_SELL, 10.0, 0.25)]
+        del chunk
+
+
+def test_reopen_resumes_the_sequence(tmp_path):
+    record(tmp_path, [(1.0, book(10.0, 11.0)), (2.0, book(10.0, 11.0))])
+    path = recorder.stream_path(str(tmp_path), 'Bittrex', 'BTC-ETH', recorder.BOOK)
+    # Incomplete chunk of an interrupted write
+    with open(path, 'ab') as stream_file:
+        stream_file.write(recorder.encode_orderbook(2, 3.0, book(10.0, 11.0))[:40])
+    record(tmp_path, [(4.0, book(10.0, 11.0))])
+    with recorder.Reader(path) as reader:
+        assert [chunk.sequence for chunk in reader] == [0, 1, 2]
+        assert list(reader.timestamps) == [1.0, 2.0, 4.0]
+        assert reader.end == len(open(path, 'rb').read())
+
+
+def test_byte_order_marker_is_checked(tmp_path):
+    path = str(tmp_path / 'swapped.book')
+    chunk = bytearray(recorder.encode_orderbook(0, 1.0, book(10.0, 11.0)))
+    struct.pack_into('>I', chunk, 4, recorder.BYTE_ORDER_MARK)
+    with open(path, 'wb') as stream_file:
+        stream_file.write(chunk)
+    with pytest.raises(Exception, match="byte order"):
+        recorder.Reader(path)
+
+
+def test_reads_chunks_without_byte_order_marker(tmp_path):
+    path = str(tmp_path / 'v1.book')
+    chunk = recorder.encode_orderbook(7, 1.0, book(10.0, 11.0))
+    with open(path, 'wb') as stream_file:
+        stream_file.write(recorder.HEADER_V1.pack(recorder.MAGIC_V1, 3, 7, 1.0) + chunk[recorder.HEADER.size:])
+        stream_file.write(recorder.encode_orderbook(8, 2.0, book(10.0, 11.0)))
+    with recorder.Reader(path) as reader:
+        assert [(chunk.sequence, list(chunk.prices)) for chunk in reader] == [(7, [10.0, 9.0, 11.0]), (8, [10.0, 9.0, 11.0])]
+
+
+def test_records_decimal_books(tmp_path):
+    D = decimal.Decimal
+    record(tmp_path, [(1.0, orderbook.OrderBook.from_levels([(D('10.5'), D('1'))], [(D('11'), D('0.25'))]))])
+    with recorder.open_reader(str(tmp_path), 'Bittrex', 'BTC-ETH') as reader:
+        chunk = reader.chunk(0)
+        assert list(chunk.rows()) == [(1.0, recorder.SIDE_BUY, 10.5, 1.0), (1.0, recorder.SIDE_SELL, 11.0, 0.25)]
+        del chunk
+
+
+def test_records_fixed_books_in_floats(tmp_path):
+    scale = fixedpoint.PairScale(2, 1)
+    fixed_book = fixedpoint.FixedOrderBook.from_levels([(10.5, 1.5)], [(11.0, 0.5)], scale)
+    record(tmp_path, [(1.0, fixed_book)])
+    with recorder.open_reader(str(tmp_path), 'Bittrex', 'BTC-ETH') as reader:
+        chunk = reader.chunk(0)
+        assert list(chunk.rows()) == [(1.0, recorder.SIDE_BUY, 10.5, 1.5), (1.0, recorder.SIDE_SELL, 11.0, 0.5)]
+        del chunk
+
+
+def test_refuses_columns_that_are_not_float64():
+    book = orderbook.OrderBook(orderbook.BookSide(array('q', [1050]), array('q', [15]), True),
+                               orderbook.BookSide(array('d', [11.0]), array('d', [0.5])))
+    with pytest.raises(TypeError):
+        recorder.encode_orderbook(0, 1.0, book)
@@ -0,0 +1,44 @@
+from common import metrics
+from common import registry
+from common import sharding
+
+PAIRS = [
+    {'Name': 'ETH/BTC', 'Primary_exchange': 'Gatecoin', 'Primary_exchange_currencypair': 'ETHBTC',
+     'Secondary_exchange': 'Bittrex', 'Secondary_exchange_currencypair': 'BTC-ETH',
+     'Exchanges': {'Gatecoin': 'ETHBTC', 'Bittrex': 'BTC-ETH', 'Liqui': 'eth_btc'}},
+    {'Name': 'LTC/BTC', 'Primary_exchange': 'Bittrex', 'Primary_exchange_currencypair': 'BTC-LTC',
+     'Secondary_exchange': 'Liqui', 'Secondary_exchange_currencypair': 'ltc_btc'},
+]
+
+
+def test_shards_list_the_exchanges_of_their_books():
+    shards = sharding.split_pairs(PAIRS, 2)
+    assert sorted(book for shard in shards for book in shard) == sorted(
+        [('Gatecoin', 'ETHBTC'), ('Bittrex', 'BTC-ETH'), ('Liqui', 'eth_btc'), ('Bittrex', 'BTC-LTC'), ('Liqui', 'ltc_btc')])
+    assert [sharding.shard_exchanges(shard) for shard in shards] == [['Gatecoin', 'Bittrex', 'Liqui'], ['Bittrex', 'Liqui']]
+    assert sharding.shard_exchanges([('Liqui', 'ltc_btc'), ('Liqui', 'eth_btc')]) == ['Liqui']
+
+
+def test_workers_only_create_the_exchanges_of_their_books():
+    budget = sharding.SharedBudget(registry.rate_limits(['Bittrex', 'Gatecoin', 'Liqui']))
+    for shard in sharding.split_pairs(PAIRS, 2):
+        exchange = sharding.worker_exchanges(shard, budget)
+        assert list(exchange) == sharding.shard_exchanges(shard)
+        for exchange_name, exchange_client in exchange.items():
+            assert isinstance(exchange_client.rate_limiter, sharding.SharedRateLimiter)
+            assert exchange_client.rate_limiter.bucket.state is budget.state
+
+
+def test_coordinator_clients_share_the_budget():
+    request_metrics = metrics.Metrics()
+    exchange = registry.create_exchanges(type('Config', (), {'bittrex': {'public': 'Key', 'private': 'Secret'}}),
+                                         ['Bittrex'], metrics=request_metrics)
+    budget = sharding.SharedBudget(registry.rate_limits(exchange))
+    sharding.use_shared_budget(exchange, budget)
+    rate_limiter = exchange['Bittrex'].rate_limiter
+    assert isinstance(rate_limiter, sharding.SharedRateLimiter)
+    assert request_metrics.rate_limiters['Bittrex'] is rate_limiter
+    # A request of the coordinator takes a token from the bucket of the workers
+    tokens = budget.rate_limiter('Bittrex').bucket.tokens
+    assert rate_limiter.try_acquire('account')
+    assert budget.rate_limiter('Bittrex').bucket.tokens < tokens
@@ -0,0 +1,72 @@
+import base64
+import hashlib
+import hmac
+import json
+from urllib.parse import urlencode
+import pytest
+from bittrex import bittrex
+from gatecoin import gatecoin
+from liqui import liqui
+
+KEY = 'k' * 32
+SECRET = 's' * 64
+NOW = 1500000000.25
+
+
+@pytest.fixture(autouse=True)
+def fixed_time(monkeypatch):
+    for module in (gatecoin, bittrex, liqui):
+        monkeypatch.setattr(module.time, 'time', lambda: NOW)
+
+
+def gatecoin_baseline(method, command, args):
+    # Signed request of a fresh HMAC per request, as first written
+    content_type = '' if method == 'Get' else 'application/json'
+    now = str(NOW)
+    message = (method + gatecoin.URL + command + content_type + now).lower()
+    signature = hmac.new(SECRET.encode(), msg=message.encode(), digestmod=hashlib.sha256).digest()
+    headers = {'API_PUBLIC_KEY': KEY, 'Content-Type': content_type,
+               'API_REQUEST_SIGNATURE': base64.b64encode(signature).decode(), 'API_REQUEST_DATE': now}
+    if method in ('Post', 'Put'):
+        return method.upper(), gatecoin.URL + command, json.dumps(args), headers
+    return method.upper(), gatecoin.URL + command + gatecoin._urlencode(args), None, headers
+
+
+def bittrex_baseline(method, options):
+    request_url = (bittrex.BASE_URL % 'market') + method + '?apikey=' + KEY + '&nonce=' + str(int(NOW * 1000)) + '&' + urlencode(options)
+    return 'GET', request_url, None, {'apisign': hmac.new(SECRET.encode(), request_url.encode(), hashlib.sha512).hexdigest()}
+
+
+def liqui_baseline(method, command, args):
+    args = dict(args, method=command, nonce=str(int(NOW)))
+    data = urlencode(args)
+    headers = {'Key': KEY, 'Sign': hmac.new(SECRET.encode(), msg=data.encode(), digestmod=hashlib.sha512).hexdigest()}
+    if method == 'Post':
+        return 'POST', liqui.BASE_URL_PRIVATE, data, headers
+    return 'GET', liqui.BASE_URL_PUBLIC, None, headers
+
+
+VENUES = [
+    (gatecoin.Gatecoin(gatecoin.URL, KEY, SECRET), gatecoin_baseline, [
+        ('Post', '/Trade/Orders', {'Code': 'ETHBTC', 'Way': 'Bid', 'Amount': '1.5', 'Price': '0.07'}),
+        ('Get', '/Trade/Orders', {}),
+        ('Delete', '/Trade/Orders/BK11', {}),
+    ]),
+    (bittrex.Bittrex(KEY, SECRET), bittrex_baseline, [
+        ('buylimit', {'market': 'BTC-ETH', 'quantity': '1.5', 'rate': '0.07'}),
+        ('getopenorders', {}),
+    ]),
+    (liqui.Liqui(KEY, SECRET), liqui_baseline, [
+        ('Post', 'Trade', {'pair': 'eth_btc', 'type': 'buy', 'rate': '0.07', 'amount': '1.5'}),
+        ('Post', 'ActiveOrders', {}),
+    ]),
+]
+
+
+@pytest.mark.parametrize('client, baseline, requests', VENUES, ids=['Gatecoin', 'Bittrex', 'Liqui'])
+def test_signatures_match_the_baseline(client, baseline, requests):
+    expected = [baseline(*request) for request in requests]
+    assert [client.sign_request(*request) for request in requests] == expected
+    assert client.sign_many(requests) == expected
+    # Same headers, in the same order
+    assert [list(signed[3].items()) for signed in client.sign_many(requests)] == [list(signed[3].items()) for signed in expected]
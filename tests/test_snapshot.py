@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import pytest
+from common import orderbook
+from common import snapshot
+
+PAIRS = [
+    {'Name': 'ETH/BTC', 'Primary_exchange': 'Gatecoin', 'Primary_exchange_currencypair': 'ETHBTC',
+     'Secondary_exchange': 'Bittrex', 'Secondary_exchange_currencypair': 'BTC-ETH'},
+    {'Name': 'LTC/BTC', 'Primary_exchange': 'Bittrex', 'Primary_exchange_currencypair': 'BTC-LTC',
+     'Secondary_exchange': 'Liqui', 'Secondary_exchange_currencypair': 'ltc_btc',
+     'Exchanges': {'Bittrex': 'BTC-LTC', 'Liqui': 'ltc_btc'}},
+    {'Name': 'ETH/BTC again', 'Primary_exchange': 'Bittrex', 'Primary_exchange_currencypair': 'BTC-ETH',
+     'Secondary_exchange': 'Gatecoin', 'Secondary_exchange_currencypair': 'ETHBTC'},
+]
+
+
+class BookClient(object):
+    # Every book request waits at the barrier: a serial fetch would break it
+    def __init__(self, barrier=None, fail=False):
+        self.barrier = barrier
+        self.fail = fail
+
+    def clean_orderbook(self, market):
+        if self.barrier is not None:
+            self.barrier.wait()
+        if self.fail:
+            raise Exception("Liqui - Request to depth failed")
+        return orderbook.OrderBook.from_levels([(1.0, 1.0)], [(1.1, 1.0)])
+
+
+class AsyncBookClient(BookClient):
+    async def clean_orderbook(self, market):
+        # Yield once so that every fetch is in flight at the same time
+        await asyncio.sleep(0)
+        return BookClient.clean_orderbook(self, market)
+
+
+def test_snapshot_requests_are_distinct():
+    assert snapshot.snapshot_requests(PAIRS) == [
+        ('Gatecoin', 'ETHBTC'), ('Bittrex', 'BTC-ETH'), ('Bittrex', 'BTC-LTC'), ('Liqui', 'ltc_btc')]
+
+
+def test_books_are_fetched_concurrently():
+    book_requests = snapshot.snapshot_requests(PAIRS)
+    barrier = threading.Barrier(len(book_requests), timeout=5)
+    exchange = {'Gatecoin': BookClient(barrier), 'Bittrex': BookClient(barrier), 'Liqui': BookClient(barrier, fail=True)}
+    books = snapshot.fetch_orderbooks(exchange, book_requests)
+    assert not barrier.broken
+    assert sorted(books.orderbooks) == sorted(book_requests[:3])
+    assert list(books.errors) == [('Liqui', 'ltc_btc')]
+    assert ('Bittrex', 'BTC-ETH') in books and ('Liqui', 'ltc_btc') not in books
+    assert books['Bittrex', 'BTC-ETH'].best_ask == (1.1, 1.0)
+    # One capture timestamp, and the time of each book
+    assert set(books.latencies) == set(book_requests)
+    assert books.duration >= max(books.latencies.values())
+
+
+def test_max_workers_bounds_the_threads():
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    class Client(object):
+        def clean_orderbook(self, market):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            threading.Event().wait(0.01)
+            with lock:
+                active[0] -= 1
+            return orderbook.OrderBook()
+
+    book_requests = [('Bittrex', 'BTC-%d' % i) for i in range(6)]
+    books = snapshot.fetch_orderbooks({'Bittrex': Client()}, book_requests, max_workers=2)
+    assert len(books.orderbooks) == 6
+    assert peak[0] <= 2
+
+
+def test_fetch_orderbooks_async():
+    book_requests = snapshot.snapshot_requests(PAIRS)
+    exchange = {'Gatecoin': AsyncBookClient(), 'Bittrex': AsyncBookClient(), 'Liqui': AsyncBookClient(fail=True)}
+    books = asyncio.run(snapshot.fetch_orderbooks_async(exchange, book_requests))
+    assert sorted(books.orderbooks) == sorted(book_requests[:3])
+    assert isinstance(books.errors[('Liqui', 'ltc_btc')], Exception)
+    assert set(books.latencies) == set(book_requests)
@@ -0,0 +1,116 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import pytest
+import requests
+from bittrex import bittrex
+from common import transport
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Answers the statuses queued on the server, then 200, keeping the connection alive
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.requests.append(self.command)
+        status = self.server.statuses.pop(0) if self.server.statuses else 200
+        body = b'{}'
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = reply
+    do_POST = reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('localhost', 0), Handler)
+    server.daemon_threads = True
+    server.connections = 0
+    server.requests = []
+    server.statuses = []
+    server.url = 'http://localhost:%d/' % server.server_address[1]
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class Session(object):
+    # Records the requests, answering them with an empty success
+    def __init__(self):
+        self.urls = []
+
+    def request(self, method, url, **kwargs):
+        self.urls.append(url)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"success": true, "result": []}'
+        return response
+
+
+def test_session_settings():
+    session = transport.create_session(pool_size=4, max_retries=2)
+    for url in ('https://bittrex.com', 'http://localhost'):
+        http_adapter = session.get_adapter(url)
+        assert http_adapter._pool_maxsize == 4
+        assert http_adapter.max_retries.total == 2
+        assert tuple(http_adapter.max_retries.status_forcelist) == transport.RETRY_STATUS
+    assert 'POST' not in http_adapter.max_retries.allowed_methods
+    assert 'GET' in http_adapter.max_retries.allowed_methods
+
+
+def test_connections_are_kept_alive(server):
+    session = transport.create_session()
+    for _ in range(5):
+        assert session.get(server.url, timeout=5).status_code == 200
+    assert server.connections == 1
+    session.close()
+
+
+def test_gateway_errors_are_retried(server):
+    session = transport.create_session(backoff_factor=0)
+    server.statuses = [503, 502]
+    assert session.get(server.url, timeout=5).status_code == 200
+    assert server.requests == ['GET'] * 3
+
+    # Retries exhausted: the last answer is returned, not raised
+    server.requests, server.statuses = [], [503] * 4
+    assert session.get(server.url, timeout=5).status_code == 503
+    assert len(server.requests) == 1 + transport.DEFAULT_MAX_RETRIES
+    session.close()
+
+
+def test_posts_are_not_retried(server):
+    session = transport.create_session(backoff_factor=0)
+    server.statuses = [503]
+    assert session.post(server.url, data=b'order', timeout=5).status_code == 503
+    assert server.requests == ['POST']
+    session.close()
+
+
+def test_client_session():
+    client = bittrex.Bittrex(None, None, pool_size=3, max_retries=1)
+    assert isinstance(client.session, requests.Session)
+    assert client.session.get_adapter(bittrex.BASE_URL)._pool_maxsize == 3
+    assert client.session.get_adapter(bittrex.BASE_URL).max_retries.total == 1
+
+    # Public and private endpoints go through the one session
+    session = Session()
+    client = bittrex.Bittrex('key', 'secret', session=session)
+    client.get_market_summaries()
+    client.get_balances()
+    assert [url.split('?')[0].rsplit('/', 2)[-2] for url in session.urls] == ['public', 'account']
@@ -1,63 +1,222 @@
 import strategy_config
 
-from gatecoin import gatecoin
-from bittrex import bittrex
-from liqui import liqui
+from common import arbitrage
+from common import logs
+from common import registry
+from common import snapshot
+# bus, gateway, metrics, recorder and sharding are imported by the modes that use them
 
 import datetime
 import logging
+import time
 from pprint import pprint
 
 logger = logging.getLogger("TradingBot")
-logger.setLevel(logging.DEBUG)
-# Create a file handler
-handler = logging.FileHandler('./log_' + datetime.datetime.now().strftime("%Y-%m-%d") + '.log')
-handler.setLevel(logging.INFO)
-# Create a logging format
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-# Add the handlers to the logger
-logger.addHandler(handler)
+
+
+def setup_logging(suffix=''):
+    # JSON lines written by a background thread, the polling and order paths only queue the records
+    # suffix: appended to the file name, one file per worker process of a sharded run
+    return logs.setup_pipeline(
+        logger,
+        './log_' + datetime.datetime.now().strftime("%Y-%m-%d") + suffix + '.log',
+        level=strategy_config.log_level,
+        max_bytes=strategy_config.log_max_bytes,
+        backup_count=strategy_config.log_backup_count,
+        response_sample=strategy_config.log_response_sample)
+
+
+def create_exchanges(order_store=None, request_metrics=None, exchange_names=None):
+    # order_store: optional orders.OrderStore shared by the clients, request_metrics: optional metrics.Metrics
+    # Only the exchanges quoting a configured currency pair are imported and created
+    if exchange_names is None:
+        exchange_names = registry.referenced_exchanges(strategy_config.currency_pairs)
+    return registry.create_exchanges(strategy_config, exchange_names, order_store=order_store, metrics=request_metrics)
+
+
+def run_cycle(exchange, currency_pairs, scanner, concurrent=True, verbose=True, book_recorder=None):
+    """
+    Get the orderbooks of every configured currency pair and scan them for arbitrage
+
+    The orderbooks are also queued to the book_recorder when one is given
+
+    :return: ({(exchange_name, currency_pair): OrderBook}, opportunities)
+    :rtype : tuple
+    """
+    if concurrent:
+        # Fetch every (exchange, currency pair) orderbook at once with a common timestamp
+        logger.info("Getting all the clean orderbooks concurrently")
+        books = snapshot.fetch_orderbooks(exchange, snapshot.snapshot_requests(currency_pairs))
+        orderbooks, timestamp = books.orderbooks, books.timestamp
+    else:
+        orderbooks, timestamp = {}, None
+        for currency_pair in currency_pairs:
+            # Simple example on getting the order book for the currency from 2 exchanges: Gatecoin and Bittrex
+            logger.info("Getting the Primary exchange clean orderbook")
+            book_request = (currency_pair['Primary_exchange'], currency_pair['Primary_exchange_currencypair'])
+            orderbooks[book_request] = exchange[book_request[0]].clean_orderbook(book_request[1])
+            logger.info("Getting the Secondary exchange clean orderbook")
+            book_request = (currency_pair['Secondary_exchange'], currency_pair['Secondary_exchange_currencypair'])
+            orderbooks[book_request] = exchange[book_request[0]].clean_orderbook(book_request[1])
+
+    if book_recorder is not None:
+        for book_request, book in orderbooks.items():
+            book_recorder.record_orderbook(book_request[0], book_request[1], book, timestamp)
+
+    if verbose:
+        for book_request in orderbooks:
+            pprint(book_request)
+            pprint(orderbooks[book_request])
+
+    opportunities = scanner.scan(orderbooks, timestamp)
+    for opportunity in opportunities:
+        logger.info("Arbitrage opportunity: %s", opportunity)
+        if verbose:
+            pprint(opportunity)
+
+    return orderbooks, opportunities
+
+
+def run_daemon(exchange, currency_pairs, scanner, book_recorder=None):
+    """
+    Keep polling every configured orderbook, scanning for arbitrage when a top of book moves
+
+    A single feed polls the books (and trades), or reads them from the gateway_socket of
+    a market data gateway, and publishes them on a bus: the scanner
+    consumes the latest books only, the book_recorder, when one is given, every update.
+    """
+    from common import bus
+    market_data = bus.Bus()
+    if strategy_config.gateway_socket:
+        # The books are polled by the market data gateway (python3 -m common.gateway)
+        from common import gateway
+        book_requests = snapshot.snapshot_requests(currency_pairs)
+        feed = gateway.GatewayFeed(strategy_config.gateway_socket, market_data,
+                                   sorted({exchange_name for exchange_name, market in book_requests}),
+                                   sorted({market for exchange_name, market in book_requests}))
+    else:
+        feed = bus.MarketDataFeed(
+            exchange,
+            snapshot.snapshot_requests(currency_pairs),
+            market_data,
+            min_interval=strategy_config.poll_min_interval,
+            max_interval=strategy_config.poll_max_interval,
+            trade_interval=strategy_config.trade_poll_interval)
+
+    # Latest book of each (exchange_name, currency_pair) seen by the scanner
+    books = {}
+
+    def on_book(message):
+        books[(message.exchange_name, message.market)] = message.data
+        if not message.top_changed:
+            return
+        for opportunity in scanner.scan(books, time.time()):
+            logger.info("Arbitrage opportunity: %s", opportunity)
+
+    def on_record(message):
+        if message.kind == bus.BOOK:
+            book_recorder.record_orderbook(message.exchange_name, message.market, message.data, message.timestamp)
+        else:
+            book_recorder.record_trades(message.exchange_name, message.market, message.data, message.timestamp)
+
+    subscriptions = [market_data.subscribe(kinds=(bus.BOOK,), max_size=strategy_config.bus_queue_size).start(on_book, "Scanner")]
+    if book_recorder is not None:
+        subscriptions.append(market_data.subscribe(max_size=strategy_config.bus_queue_size, conflate=False).start(on_record, "BookRecorder"))
+
+    feed.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Poller - Interrupted")
+    finally:
+        feed.stop()
+        for subscription in subscriptions:
+            subscription.close()
+        logger.info("Bus - %s", market_data.statistics())
+
 
 if __name__ == "__main__":
 
+    setup_logging()
+
     logger.info("------------------------------------------------------------------------------")
     logger.info("------------------------------- CONFIGURATION --------------------------------")
     logger.info("------------------------------------------------------------------------------")
 
-    exchange = {}
-    orderbook = {}
-    orderbook_raw = {}
-    exchange['Gatecoin'] = gatecoin.Gatecoin(
-        "https://api.gatecoin.com",
-        strategy_config.gatecoin['public'],
-        strategy_config.gatecoin['private'])
-    orderbook['Gatecoin'] = {}
-
-    exchange['Bittrex'] = bittrex.Bittrex(
-        strategy_config.bittrex['public'],
-        strategy_config.bittrex['private'])
-    orderbook['Bittrex'] = {}
-
-    exchange['Liqui'] = liqui.Liqui(
-        strategy_config.liqui['public'],
-        strategy_config.liqui['private'])
-    orderbook['Liqui'] = {}
+    request_metrics = None
+    metrics_server = None
+    metrics_dumper = None
+    if strategy_config.metrics_port is not None or strategy_config.metrics_dump_interval:
+        from common import metrics
+        request_metrics = metrics.Metrics()
+        if strategy_config.metrics_port is not None:
+            metrics_server = metrics.MetricsServer(request_metrics, port=strategy_config.metrics_port).start()
+        if strategy_config.metrics_dump_interval:
+            metrics_dumper = metrics.MetricsDumper(request_metrics, strategy_config.metrics_dump_interval).start()
+
+    order_store = None
+    if strategy_config.order_reconcile_interval:
+        from common import orders
+        order_store = orders.OrderStore()
+
+    exchange = create_exchanges(order_store=order_store, request_metrics=request_metrics)
 
     currency_pairs = strategy_config.currency_pairs
     one_bp_in_pourcent = strategy_config.one_bp_in_pourcent
+    scanner = arbitrage.Scanner(currency_pairs, strategy_config.fees, one_bp_in_pourcent, strategy_config.min_spread_bps)
+
+    runner = None
+    if strategy_config.workers > 1:
+        from common import sharding
+        runner = sharding.ShardedRunner(
+            currency_pairs,
+            scanner,
+            registry.rate_limits(exchange),
+            strategy_config.workers,
+            strategy_config.poll_min_interval,
+            strategy_config.poll_max_interval,
+            strategy_config.record_directory)
+        # The requests of this process count against the budget of the workers
+        runner.share_budget(exchange)
+
+    reconciler = None
+    balances = None
+    if order_store is not None:
+        # Balance table kept up to date by the orders the clients record, refreshed after each reconciliation
+        from common import portfolio
+        balances = portfolio.Portfolio(exchange, currency_pairs, strategy_config.fees)
+        order_store.add_listener(balances)
+        balances.refresh()
+        reconciler = orders.Reconciler(order_store, exchange, strategy_config.order_reconcile_interval, balances).start()
 
     logger.info("------------------------------------------------------------------------------")
     logger.info("-------------------------------- PROCESSING ----------------------------------")
     logger.info("------------------------------------------------------------------------------")
 
-    for currency_pair in currency_pairs:
-        # Simple example on getting the order book for the currency from 2 exchanges: Gatecoin and Bittrex
-        logger.info("Getting the Primary exchange clean orderbook")
-        orderbook[currency_pair['Primary_exchange']] = exchange[currency_pair['Primary_exchange']].clean_orderbook(currency_pair['Primary_exchange_currencypair'])
-        pprint(orderbook[currency_pair['Primary_exchange']])
-        logger.info("Getting the Secondary exchange clean orderbook")
-        orderbook[currency_pair['Secondary_exchange']] = exchange[currency_pair['Secondary_exchange']].clean_orderbook(currency_pair['Secondary_exchange_currencypair'])
-        pprint(orderbook[currency_pair['Secondary_exchange']])
+    book_recorder = None
+    # The workers of a sharded run record their own books
+    if strategy_config.record_directory and strategy_config.workers <= 1:
+        from common import recorder
+        book_recorder = recorder.Recorder(strategy_config.record_directory).start()
+
+    try:
+        if runner is not None:
+            runner.run(once=not strategy_config.daemon)
+        elif strategy_config.daemon:
+            run_daemon(exchange, currency_pairs, scanner, book_recorder)
+        else:
+            run_cycle(exchange, currency_pairs, scanner, strategy_config.concurrent_snapshot, book_recorder=book_recorder)
+    finally:
+        if reconciler is not None:
+            reconciler.stop()
+            balances.close()
+        if book_recorder is not None:
+            book_recorder.stop()
+        if metrics_dumper is not None:
+            metrics_dumper.stop()
+            metrics_dumper.dump()
+        if metrics_server is not None:
+            metrics_server.stop()
 
     quit()